@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import BaseModel, ValidationError
+
+from backend.core.config import settings
+from backend.core.metrics import metrics
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# Ids, timestamps and object addresses differ between runs of the same corpus
+_VOLATILE = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    r"|\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:[+-]\d{2}:?\d{2}|Z)?"
+    r"| at 0x[0-9a-f]+",
+    re.IGNORECASE,
+)
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded response for a call."""
+
+
+def request_key(model: str, messages, stop=None, kwargs: Optional[dict] = None) -> str:
+    """Hash of everything that shapes a call's response, with run-specific values masked."""
+    payload = json.dumps({
+        "model": model,
+        "messages": [[m.type, str(m.content)] for m in messages],
+        "stop": stop,
+        "kwargs": kwargs or {},
+    }, sort_keys=True, default=repr)
+    return hashlib.blake2b(_VOLATILE.sub("*", payload).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Cassette:
+    """
+    Recorded LLM responses for deterministic runs.
+
+    In record mode every completed call is appended to the file as one JSON
+    line: the request key, task, model, response message, token usage and
+    latency. A `.gz` path is gzip-compressed. In replay mode calls are
+    answered from the file without touching the provider, matched by request
+    key; repeats of a key are served in recorded order and the last one is
+    reused after that. A call whose prompt changed since recording is served
+    the next unused response of the same task and model (counted in
+    `llm_cassette_misses`) unless `strict` is set, and its input tokens are
+    scaled by the change in estimated prompt size, so prompt growth shows up
+    in token counts. `latency` is "recorded" to sleep for the recorded time
+    or "zero" to return immediately.
+    """
+
+    def __init__(self, path: str, mode: str, latency: str = "zero", strict: bool = False):
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if latency not in ("recorded", "zero"):
+            raise ValueError(f"Unknown cassette latency: {latency}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, List[dict]] = defaultdict(list)
+        self._by_model: Dict[Tuple[str, str], List[dict]] = defaultdict(list)
+        self._served: Dict[str, int] = defaultdict(int)
+        self._used = set()
+        self.misses = 0
+        # Per task: calls, input (and cached input)/output tokens and (replayed) latency seen in this run
+        self.stats: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        if mode == MODE_REPLAY:
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    def record(self, task: str, model: str, messages, stop, kwargs: dict, result: ChatResult,
+               latency: float, prompt_estimate: int):
+        message = result.generations[0].message
+        data = message_to_dict(message)
+        # Response headers are only used by the live rate limiter; a parsed
+        # structured output is rebuilt from the content on replay
+        data["data"].get("response_metadata", {}).pop("headers", None)
+        data["data"].get("additional_kwargs", {}).pop("parsed", None)
+        entry = {
+            "key": request_key(model, messages, stop, kwargs),
+            "task": task,
+            "model": model,
+            "message": data,
+            "llm_output": _jsonable(result.llm_output),
+            "latency": round(latency, 4),
+            "prompt_estimate": prompt_estimate,
+        }
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            opener = gzip.open if self.path.endswith(".gz") else open
+            with opener(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            self._count(task, message, latency)
+
+    def replay(self, task: str, model: str, messages, stop, kwargs: dict, prompt_estimate: int) -> ChatResult:
+        key = request_key(model, messages, stop, kwargs)
+        with self._lock:
+            entry = self._match(key, task, model)
+        if entry is None:
+            raise CassetteMiss(f"No recorded {task} response for model {model} (key {key})")
+
+        message = messages_from_dict([json.loads(json.dumps(entry["message"]))])[0]
+        usage = getattr(message, "usage_metadata", None)
+        if usage and entry["key"] != key and entry.get("prompt_estimate"):
+            input_tokens = round(usage.get("input_tokens", 0) * prompt_estimate / entry["prompt_estimate"])
+            message.usage_metadata = {
+                **usage,
+                "input_tokens": input_tokens,
+                "total_tokens": input_tokens + usage.get("output_tokens", 0),
+            }
+            details = usage.get("input_token_details") or {}
+            if details.get("cache_read"):
+                message.usage_metadata["input_token_details"] = {
+                    **details, "cache_read": min(details["cache_read"], input_tokens)
+                }
+
+        _parse_structured_output(message, kwargs.get("response_format"))
+
+        latency = entry["latency"] if self.latency == "recorded" else 0.0
+        if latency:
+            time.sleep(latency)
+        with self._lock:
+            self._count(task, message, latency)
+        metrics.incr("llm_cassette_replays", task=task)
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output=entry.get("llm_output"))
+
+    def _match(self, key: str, task: str, model: str) -> Optional[dict]:
+        recorded = self._by_key.get(key)
+        if recorded:
+            index = min(self._served[key], len(recorded) - 1)
+            self._served[key] += 1
+            entry = recorded[index]
+            self._used.add(id(entry))
+            return entry
+        if self.strict:
+            return None
+        self.misses += 1
+        metrics.incr("llm_cassette_misses", task=task)
+        for entry in self._by_model.get((task, model), []):
+            if id(entry) not in self._used:
+                self._used.add(id(entry))
+                return entry
+        return None
+
+    def _count(self, task: str, message, latency: float):
+        usage = getattr(message, "usage_metadata", None) or {}
+        stats = self.stats[task]
+        stats["calls"] += 1
+        stats["input_tokens"] += usage.get("input_tokens", 0)
+        stats["cached_input_tokens"] += (usage.get("input_token_details") or {}).get("cache_read") or 0
+        stats["output_tokens"] += usage.get("output_tokens", 0)
+        stats["latency"] += latency
+
+    def _load(self):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._by_key[entry["key"]].append(entry)
+                self._by_model[(entry["task"], entry["model"])].append(entry)
+
+
+def _parse_structured_output(message, response_format):
+    # ChatOpenAI attaches the parsed object for pydantic response formats (json_schema structured output)
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel) and message.content:
+        try:
+            message.additional_kwargs["parsed"] = response_format.model_validate_json(message.content)
+        except ValidationError:
+            pass
+
+
+def _jsonable(value):
+    return json.loads(json.dumps(value, default=str)) if value is not None else None
+
+
+_active: Optional[Cassette] = None
+_configured = False
+_active_lock = threading.Lock()
+
+
+def active_cassette() -> Optional[Cassette]:
+    """The cassette LLM calls go through, set up from LLM_CASSETTE_* on first use."""
+    global _active, _configured
+    if not _configured:
+        with _active_lock:
+            if not _configured:
+                if settings.LLM_CASSETTE_MODE != MODE_OFF:
+                    _active = Cassette(
+                        settings.LLM_CASSETTE_PATH, settings.LLM_CASSETTE_MODE, settings.LLM_CASSETTE_LATENCY
+                    )
+                _configured = True
+    return _active
+
+
+@contextmanager
+def use_cassette(cassette: Optional[Cassette]):
+    """Routes LLM calls through `cassette` (None: live) for the duration of the block."""
+    global _active
+    active_cassette()
+    with _active_lock:
+        previous, _active = _active, cassette
+    try:
+        yield cassette
+    finally:
+        with _active_lock:
+            _active = previous
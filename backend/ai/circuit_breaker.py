@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import openai
+
+from backend.core.config import settings
+from backend.core.metrics import metrics
+
+STATE_CLOSED = "closed"
+STATE_HALF_OPEN = "half_open"
+STATE_OPEN = "open"
+
+# Reported as the llm_circuit_state gauge
+_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while its circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"LLM provider {name} is unavailable; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+# Errors meaning the provider is down or hanging (as opposed to rejecting the request);
+# callers catch these to degrade instead of failing
+LLM_UNAVAILABLE_ERRORS = (CircuitOpenError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def is_outage(error: BaseException) -> bool:
+    """True for timeouts, connection failures and 5xx responses - the errors that trip the breaker."""
+    return isinstance(error, (openai.APIConnectionError, openai.InternalServerError))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one LLM provider endpoint.
+
+    Closed: calls go through; `failure_threshold` outages in a row open the
+    circuit. Open: calls fail immediately with CircuitOpenError for
+    `recovery_seconds`. Half-open: one probe call is let through; success
+    closes the circuit, another outage re-opens it. Any response from the
+    provider, including a 4xx, counts as success - the endpoint is reachable.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        recovery_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.LLM_CIRCUIT_FAILURE_THRESHOLD
+        self.recovery_seconds = recovery_seconds if recovery_seconds is not None else settings.LLM_CIRCUIT_RECOVERY_SECONDS
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._report()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a call may go to the provider now."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == STATE_CLOSED:
+                return
+            if self._state == STATE_HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            retry_after = max(0.0, self._opened_at + self.recovery_seconds - self._clock())
+        metrics.incr("llm_circuit_rejected", circuit=self.name)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != STATE_CLOSED:
+                self._state = STATE_CLOSED
+                self._report()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != STATE_OPEN:
+                    metrics.incr("llm_circuit_opened", circuit=self.name)
+                self._state = STATE_OPEN
+                self._opened_at = self._clock()
+                self._report()
+
+    def release(self):
+        """Ends a call that neither proved nor disproved the provider's health."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            retry_after = 0.0
+            if self._state == STATE_OPEN:
+                retry_after = max(0.0, self._opened_at + self.recovery_seconds - self._clock())
+            return {"state": self._state, "consecutive_failures": self._failures, "retry_after": round(retry_after, 1)}
+
+    def _maybe_half_open(self):
+        if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.recovery_seconds:
+            self._state = STATE_HALF_OPEN
+            self._probing = False
+            self._report()
+
+    def _report(self):
+        metrics.set_gauge("llm_circuit_state", _STATE_VALUES[self._state], circuit=self.name)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Returns the shared breaker for a provider endpoint (its base URL)."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def circuit_snapshot() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
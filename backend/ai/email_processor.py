@@ -1,11 +1,28 @@
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from backend.db.models import Email, Thread, EmailSummary
+from backend.db.database import recent_writes
+from backend.db.models import Attachment, Email, Thread, EmailSummary
 from backend.core.config import settings
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from backend.core.archive import restore_archived_thread
+from backend.core.metrics import metrics
+from backend.core.events import EMAIL, SUMMARY, event_bus
+from backend.core.sharding import processing_shards
+from backend.core.thread_documents import refresh_thread_documents
+from backend.core.thread_resolver import ThreadResolver, normalize_subject
+from backend.ai.thread_summarizer import ThreadSummarizer
+from backend.ai.llm import ModelRouter, get_chat_model, TASK_SUMMARY
+from backend.ai.prompts import SUMMARY_PROMPT, SUMMARY_PROMPT_VERSION, format_instructions_block
+from backend.ai.single_flight import cache_key, single_flight
+from backend.ai.scheduler import current_lane, lane_for_urgency, use_lane
+from backend.ai.speculative import invalidate_thread_drafts
+from backend.ai.circuit_breaker import LLM_UNAVAILABLE_ERRORS
+from backend.ai.summary_queue import defer_summary
 from langchain_core.output_parsers import JsonOutputParser
-from pydantic import BaseModel, Field
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
+import copy
 import json
 import uuid
 
@@ -58,77 +75,246 @@ class EmailSummaryModel(BaseModel):
 class EmailProcessor:
     def __init__(self, db: Session):
         self.db = db
-        self.llm = ChatOpenAI(
-            model=settings.OPENAI_MODEL,
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_BASE_URL
-        )
+        self.router = ModelRouter()
+        self.llm = self.router.chat_model(TASK_SUMMARY)
+
+    def process_email(self, email_data: dict, defer_on_outage: bool = False) -> EmailSummary:
+        new_email = self.store_email(email_data)
+        if not defer_on_outage:
+            return self.summarize_email(new_email)
+
+        email_id, thread_id = new_email.id, new_email.thread_id
+        try:
+            return self.summarize_email(new_email)
+        except LLM_UNAVAILABLE_ERRORS as e:
+            # Degraded mode: keep the email and queue its summary for the backfill worker.
+            # The returned placeholder is not persisted and has no summary_json.
+            defer_summary(self.db, email_id, e)
+            event_bus.publish(SUMMARY, thread_id, email_id, "queued")
+            return EmailSummary(email_id=email_id, summary_json=None)
 
-    def process_email(self, email_data: dict) -> EmailSummary:
+    def process_email_in_order(self, email_data: dict, defer_on_outage: bool = False) -> EmailSummary:
+        """
+        process_email on the conversation's processing shard: emails of one
+        thread are stored and summarised one at a time, in arrival order, so
+        none races to create the thread or is summarised without the other.
+        """
+        return processing_shards.run(ordering_key(email_data), self.process_email, email_data, defer_on_outage)
+
+    def store_email(self, email_data: dict) -> Email:
         # 1. Store Email
         email_id = str(uuid.uuid4())
         thread_id = email_data.get("thread_id")
         
         if not thread_id:
-            # Simple logic: create new thread if none provided
+            # Attach to an existing conversation when headers or subject match one
+            thread_id = ThreadResolver(self.db).resolve(email_data)
+
+        if not thread_id:
             thread_id = str(uuid.uuid4())
             thread = Thread(id=thread_id)
             self.db.add(thread)
         else:
-            thread = self.db.query(Thread).filter(Thread.id == thread_id).first()
+            # Locked: the archiver cannot move the thread out while this email goes in
+            thread = self.db.query(Thread).filter(Thread.id == thread_id).with_for_update().first()
             if not thread:
-                thread = Thread(id=thread_id)
-                self.db.add(thread)
+                # New mail for an archived thread brings its history back into the hot tables
+                thread = restore_archived_thread(self.db, thread_id)
+            if not thread:
+                thread = self._create_thread(thread_id)
         
         new_email = Email(
             id=email_id,
             thread_id=thread_id,
             sender=email_data["sender"],
             subject=email_data["subject"],
-            body=email_data["body"]
+            body=email_data["body"],
+            message_id=email_data.get("message_id"),
+            in_reply_to=email_data.get("in_reply_to"),
+            references=email_data.get("references"),
+            recipients=email_data.get("recipients"),
+            normalized_subject=normalize_subject(email_data["subject"])
         )
+        if email_data.get("received_at"):
+            new_email.received_at = email_data["received_at"]
         self.db.add(new_email)
+        for attachment in email_data.get("attachments") or []:
+            self.db.add(Attachment(email_id=email_id, **attachment))
+        # Speculative drafts for earlier emails no longer answer the latest message
+        invalidate_thread_drafts(self.db, thread_id)
+        # The stored GET /threads/{id} document is committed together with the email
+        refresh_thread_documents(self.db, [thread_id])
         self.db.commit()
+        # Reads of this email/thread stay on the primary until replicas have caught up
+        recent_writes.note(email_id, thread_id)
+        event_bus.publish(EMAIL, thread_id, email_id, "stored")
         self.db.refresh(new_email)
+        return new_email
 
-        # 2. Build Context (Fetch Thread)
-        thread_emails = self.db.query(Email).filter(Email.thread_id == thread_id).order_by(Email.received_at).all()
-        thread_context = "\n\n".join([f"From: {e.sender}\nSubject: {e.subject}\nBody: {e.body}" for e in thread_emails])
+    def _create_thread(self, thread_id: str) -> Thread:
+        # Ordering per thread is per process; another API process or an import may create the row first
+        try:
+            with self.db.begin_nested():
+                thread = Thread(id=thread_id)
+                self.db.add(thread)
+        except IntegrityError:
+            metrics.incr("thread_create_conflicts")
+            thread = self.db.query(Thread).filter(Thread.id == thread_id).one()
+        return thread
 
-        # 3. Summarize using LLM
-        summary_data = self._generate_summary(new_email, thread_context, len(thread_emails))
+    def summarize_email(self, new_email: Email) -> EmailSummary:
+        summary_data = self.build_summary(new_email)
         
         # 4. Store Summary
         email_summary = EmailSummary(
-            email_id=email_id,
-            summary_json=summary_data.dict()
+            email_id=new_email.id,
+            summary_json=summary_data.model_dump(),
+            **self.summary_stamp()
         )
+        email_id, thread_id = new_email.id, new_email.thread_id
         self.db.add(email_summary)
         self.db.commit()
+        recent_writes.note(email_id, thread_id)
+        event_bus.publish(SUMMARY, thread_id, email_id, "ready")
         
         return email_summary
 
+    def summary_stamp(self) -> dict:
+        """Model and prompt version recorded with a summary; a change of either makes it stale."""
+        # The configured model, not an escalation picked for a single call
+        return {"model": self.router.base_model(TASK_SUMMARY), "prompt_version": SUMMARY_PROMPT_VERSION}
+
+    def build_summary(self, email: Email, up_to_email: bool = False) -> EmailSummaryModel:
+        """
+        Summarises `email` in the context of its thread without storing it.
+        With `up_to_email`, later emails of the thread are left out of the
+        context, as when the email was first summarised.
+        """
+        # 2. Build Context (Fetch Thread)
+        query = self.db.query(Email).filter(Email.thread_id == email.thread_id)
+        if up_to_email:
+            query = query.filter(Email.received_at <= email.received_at)
+        thread_emails = query.order_by(Email.received_at, Email.id).all()
+        # Background work on a thread already flagged urgent is scheduled ahead of bulk work
+        previous = [e for e in thread_emails if e.id != email.id and e.summary is not None]
+        urgency = previous[-1].summary.summary_json.get("urgency", {}).get("level") if previous else None
+
+        with use_lane(lane_for_urgency(urgency, current_lane())):
+            # Long threads are condensed chunk by chunk (map-reduce) with cached chunk summaries
+            thread_context = ThreadSummarizer(self.db, self.llm).build_context(thread_emails)
+
+            # 3. Summarize using LLM
+            return self._generate_summary(email, thread_context, len(thread_emails))
+
     def _generate_summary(self, email: Email, thread_context: str, email_count: int) -> EmailSummaryModel:
+        # Concurrent summaries of the same content (double submits, webhook retries) share one LLM call
+        key = cache_key(TASK_SUMMARY, SUMMARY_PROMPT_VERSION, self.router.base_model(TASK_SUMMARY),
+                        email.sender, thread_context, email_count)
+        result = copy.deepcopy(single_flight.do(key, lambda: self._invoke_summary(email, thread_context, email_count)))
+
+        result['email_id'] = email.id
+        result['thread_info']['thread_id'] = email.thread_id
+        return EmailSummaryModel(**result)
+
+    def _invoke_summary(self, email: Email, thread_context: str, email_count: int) -> dict:
         parser = JsonOutputParser(pydantic_object=EmailSummaryModel)
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are an expert email analyst. Analyze the following email and its thread context to produce a structured summary."),
-            ("user", "Email ID: {email_id}\nTimestamp: {timestamp}\nSender: {sender}\n\nThread Context:\n{thread_context}\n\nAnalyze this email and return the result in JSON format.\n{format_instructions}")
-        ])
+        structured = self._use_structured_output()
+        mode = "structured" if structured else "json"
 
-        chain = prompt | self.llm | parser
+        prompt = SUMMARY_PROMPT
 
-        result = chain.invoke({
+        inputs = {
             "email_id": email.id,
             "timestamp": str(email.received_at),
             "sender": email.sender,
             "thread_context": thread_context,
-            "format_instructions": parser.get_format_instructions()
-        })
-        
-        # Ensure thread info is accurate based on DB
-        result['thread_info']['is_thread'] = email_count > 1
-        result['thread_info']['email_count'] = email_count
-        result['thread_info']['thread_id'] = email.thread_id
-        
-        return EmailSummaryModel(**result)
+            # With native structured output the schema travels as a tool/response format instead
+            "format_instructions": format_instructions_block("" if structured else parser.get_format_instructions()),
+            "repair": []
+        }
+        if structured:
+            metrics.observe("summary_prompt_tokens_saved", _count_tokens(self.llm, parser.get_format_instructions()))
+
+        # Bounded repair loop: feed the validation error back to the model
+        for attempt in range(settings.SUMMARY_MAX_REPAIRS + 1):
+            llm = self._llm_for(email_count, failed_validation=attempt > 0)
+            # A provider response that breaks before `raw` is read still gets a repair turn
+            raw = None
+            try:
+                if structured:
+                    chain = prompt | llm.with_structured_output(
+                        EmailSummaryModel, method=settings.SUMMARY_STRUCTURED_METHOD, include_raw=True
+                    )
+                    output = chain.invoke(inputs)
+                    raw = output["raw"]
+                    if output.get("parsing_error") or output.get("parsed") is None:
+                        raise OutputParserException(str(output.get("parsing_error") or "No structured output returned"))
+                    result = output["parsed"].model_dump()
+                else:
+                    raw = (prompt | llm).invoke(inputs)
+                    result = parser.parse(raw.content)
+
+                # Ensure thread info is accurate based on DB
+                result['thread_info']['is_thread'] = email_count > 1
+                result['thread_info']['email_count'] = email_count
+                result['thread_info']['thread_id'] = email.thread_id
+
+                summary = EmailSummaryModel(**result)
+            except (OutputParserException, ValidationError, KeyError, TypeError) as e:
+                metrics.incr("summary_parse_failures", mode=mode)
+                if attempt >= settings.SUMMARY_MAX_REPAIRS:
+                    raise
+                inputs["repair"] = [
+                    _as_ai_message(raw),
+                    HumanMessage(content=f"That output failed validation: {e}\nReturn the complete, corrected summary.")
+                ]
+                continue
+
+            usage = getattr(raw, "usage_metadata", None)
+            if usage:
+                metrics.observe("summary_prompt_tokens", usage.get("input_tokens", 0), mode=mode)
+            if attempt:
+                metrics.incr("summary_repairs_succeeded", mode=mode)
+            return summary.model_dump()
+
+    def _llm_for(self, email_count: int, failed_validation: bool = False):
+        # Long threads and failed repairs are escalated to the stronger model
+        model = self.router.select(TASK_SUMMARY, thread_length=email_count, failed_validation=failed_validation)
+        if model == self.router.base_model(TASK_SUMMARY):
+            return self.llm
+        return get_chat_model(TASK_SUMMARY, model)
+
+    def _use_structured_output(self) -> bool:
+        mode = settings.SUMMARY_STRUCTURED_OUTPUT
+        if mode == "on":
+            return True
+        if mode == "auto":
+            model = settings.SUMMARY_MODEL.lower()
+            return any(model.startswith(prefix) for prefix in settings.STRUCTURED_OUTPUT_MODELS)
+        return False
+
+
+def ordering_key(email_data: dict) -> str:
+    """Shard key for an email whose thread may not be resolved yet."""
+    if email_data.get("thread_id"):
+        return email_data["thread_id"]
+    # Replies resolved through headers share the normalised subject too
+    subject = normalize_subject(email_data.get("subject") or "")
+    return f"subject:{subject}" if subject else str(uuid.uuid4())
+
+
+def _as_ai_message(raw) -> AIMessage:
+    # Tool-call outputs are replayed as plain content so the repair turn stays a simple chat exchange
+    if isinstance(raw, AIMessage) and raw.content:
+        return AIMessage(content=raw.content)
+    if isinstance(raw, AIMessage) and raw.tool_calls:
+        return AIMessage(content=json.dumps(raw.tool_calls[0]["args"]))
+    return AIMessage(content=str(getattr(raw, "content", raw) or ""))
+
+
+def _count_tokens(llm, text: str) -> int:
+    try:
+        return llm.get_num_tokens(text)
+    except Exception:
+        # Tokenizer files unavailable (offline) or non-OpenAI model: ~4 chars per token
+        return len(text) // 4
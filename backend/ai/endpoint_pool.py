@@ -0,0 +1,246 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+
+from backend.ai.circuit_breaker import CircuitOpenError, get_breaker, is_outage
+from backend.core.config import settings
+from backend.core.metrics import metrics
+
+
+def _fails_over(error: BaseException) -> bool:
+    """Errors another endpoint may not have: outages, open circuits, overload and rate limits."""
+    if isinstance(error, CircuitOpenError) or is_outage(error):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+class Endpoint:
+    """One OpenAI-compatible server in the pool, with its recent latency and in-flight calls."""
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None, weight: float = 1.0,
+                 name: Optional[str] = None, models: Optional[Dict[str, str]] = None):
+        self.base_url = base_url
+        self.api_key = api_key or settings.OPENAI_API_KEY
+        self.weight = max(float(weight), 0.01)
+        self.name = name or base_url
+        # Model names as served by this endpoint, e.g. {"gpt-4o-mini": "meta-llama/Llama-3.1-8B-Instruct"}
+        self.models = models or {}
+        self.breaker = get_breaker(base_url)
+        self.ewma: Optional[float] = None
+        self.in_flight = 0
+        self.latencies = deque(maxlen=200)
+        self._clients: Dict[str, ChatOpenAI] = {}
+
+    def score(self) -> float:
+        # Expected wait: recent latency scaled by queue depth, discounted by capacity (weight).
+        # Endpoints without results score 0 so they get measured first; failures count as slow results.
+        return (self.ewma or 0.0) * (1 + self.in_flight) / self.weight
+
+    def observe(self, latency: float, alpha: float):
+        self._average(latency, alpha)
+        self.latencies.append(latency)
+        metrics.observe("llm_endpoint_latency_seconds", latency, endpoint=self.name)
+
+    def observe_failure(self, latency: float, alpha: float, penalty: float):
+        # A fast 429/5xx must not make the endpoint look fast; hedge delays use successes only
+        self._average(latency + penalty, alpha)
+        metrics.incr("llm_endpoint_errors", endpoint=self.name)
+
+    def _average(self, latency: float, alpha: float):
+        self.ewma = latency if self.ewma is None else alpha * latency + (1 - alpha) * self.ewma
+        metrics.set_gauge("llm_endpoint_ewma_seconds", round(self.ewma, 4), endpoint=self.name)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def client(self, model: str) -> ChatOpenAI:
+        if model not in self._clients:
+            self._clients[model] = ChatOpenAI(
+                model=self.models.get(model, model),
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                timeout=httpx.Timeout(settings.LLM_READ_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+                include_response_headers=True,
+            )
+        return self._clients[model]
+
+    def snapshot(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "weight": self.weight,
+            "ewma_seconds": round(self.ewma, 4) if self.ewma is not None else None,
+            "in_flight": self.in_flight,
+            "circuit": self.breaker.state,
+        }
+
+
+class EndpointPool:
+    """
+    Spreads chat completions over several OpenAI-compatible endpoints.
+
+    Each call goes to the endpoint with the lowest score (EWMA latency times
+    in-flight calls, divided by weight); endpoints whose circuit is open go
+    last. Calls that fail over count toward the EWMA with `failure_penalty`
+    seconds added, so an endpoint answering 429s is not kept in first place. Outages, 5xx and 429 responses fail over to the next endpoint at
+    once. With hedging on, a call still running after the primary's recent
+    `hedge_quantile` latency (at least `hedge_min_delay`) is duplicated to the
+    next endpoint; the first response wins and the other request is cancelled.
+
+    Calls run as asyncio tasks on a private event loop thread, which is what
+    makes the losing request cancellable; `generate` blocks the caller.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        ewma_alpha: float = 0.3,
+        failure_penalty: float = 2.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.2,
+        hedge_min_samples: int = 20,
+    ):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.ewma_alpha = ewma_alpha
+        self.failure_penalty = failure_penalty
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self._rotation = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    def generate(self, model: str, messages, stop=None, **kwargs):
+        """ChatResult for `messages` from the best available endpoint."""
+        future = asyncio.run_coroutine_threadsafe(self._race(model, messages, stop, kwargs), self._event_loop())
+        return future.result()
+
+    def rank(self) -> List[Endpoint]:
+        # Ties rotate, so equal endpoints share the load
+        offset = next(self._rotation) % len(self.endpoints)
+        rotated = self.endpoints[offset:] + self.endpoints[:offset]
+        return sorted(rotated, key=lambda e: (e.breaker.state != "closed", e.score()))
+
+    def hedge_delay(self, endpoint: Endpoint) -> Optional[float]:
+        if not self.hedge or len(self.endpoints) < 2 or len(endpoint.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, endpoint.quantile(self.hedge_quantile))
+
+    def snapshot(self) -> dict:
+        return {endpoint.name: endpoint.snapshot() for endpoint in self.endpoints}
+
+    async def _race(self, model: str, messages, stop, kwargs: dict):
+        ranked = iter(self.rank())
+        pending: Dict[asyncio.Task, Endpoint] = {}
+        last_error: Optional[BaseException] = None
+
+        def start(endpoint: Endpoint):
+            pending[asyncio.ensure_future(self._attempt(endpoint, model, messages, stop, kwargs))] = endpoint
+
+        first = next(ranked)
+        start(first)
+        delay = self.hedge_delay(first)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slower than its usual tail: duplicate to the next endpoint, once
+                    delay = None
+                    backup = next(ranked, None)
+                    if backup is not None:
+                        metrics.incr("llm_hedged_requests", endpoint=backup.name)
+                        start(backup)
+                    continue
+                for task in done:
+                    endpoint = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if endpoint is not first:
+                            metrics.incr("llm_hedge_wins" if pending else "llm_failover_wins", endpoint=endpoint.name)
+                        return task.result()
+                    if not _fails_over(error):
+                        raise error
+                    last_error = error
+                    if not pending:
+                        backup = next(ranked, None)
+                        if backup is not None:
+                            metrics.incr("llm_endpoint_failovers", endpoint=endpoint.name)
+                            start(backup)
+            raise last_error
+        finally:
+            # The loser of a hedge (or anything left after an error) is cancelled, closing its connection
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _attempt(self, endpoint: Endpoint, model: str, messages, stop, kwargs: dict):
+        endpoint.breaker.before_call()
+        endpoint.in_flight += 1
+        start = time.perf_counter()
+        try:
+            result = await endpoint.client(model)._agenerate(messages, stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            endpoint.breaker.release()
+            metrics.incr("llm_hedge_cancelled", endpoint=endpoint.name)
+            raise
+        except Exception as e:
+            if is_outage(e):
+                endpoint.breaker.record_failure()
+            elif isinstance(e, openai.APIStatusError):
+                endpoint.breaker.record_success()
+            else:
+                endpoint.breaker.release()
+            if _fails_over(e):
+                endpoint.observe_failure(time.perf_counter() - start, self.ewma_alpha, self.failure_penalty)
+            raise
+        finally:
+            endpoint.in_flight -= 1
+        endpoint.breaker.record_success()
+        endpoint.observe(time.perf_counter() - start, self.ewma_alpha)
+        metrics.incr("llm_endpoint_requests", endpoint=endpoint.name)
+        return result
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-endpoint-pool", daemon=True).start()
+            return self._loop
+
+
+_pool: Optional[EndpointPool] = None
+_pool_configured = False
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[EndpointPool]:
+    """The pool built from LLM_ENDPOINTS, or None when a single OPENAI_BASE_URL is used."""
+    global _pool, _pool_configured
+    if not _pool_configured:
+        with _pool_lock:
+            if not _pool_configured:
+                if settings.LLM_ENDPOINTS:
+                    _pool = EndpointPool(
+                        [Endpoint(**endpoint) for endpoint in settings.LLM_ENDPOINTS],
+                        ewma_alpha=settings.LLM_EWMA_ALPHA,
+                        failure_penalty=settings.LLM_ENDPOINT_FAILURE_PENALTY,
+                        hedge=settings.LLM_HEDGE_ENABLED,
+                        hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+                        hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+                    )
+                _pool_configured = True
+    return _pool
@@ -0,0 +1,254 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+import openai
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_openai import ChatOpenAI
+
+from backend.ai.cassette import active_cassette
+from backend.ai.circuit_breaker import get_breaker, is_outage
+from backend.ai.endpoint_pool import get_pool
+from backend.ai.rate_limiter import backoff_delay, get_limiter, parse_reset_duration
+from backend.ai.scheduler import current_lane
+from backend.core.config import settings
+from backend.core.metrics import metrics
+
+TASK_PARSE = "parse"
+TASK_SUMMARY = "summary"
+TASK_REPLY = "reply"
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Records latency, token usage and estimated cost per task and model."""
+
+    def __init__(self, task: str, model: str):
+        self.task = task
+        self.model = model
+        self._starts: Dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            metrics.observe("llm_latency_seconds", time.perf_counter() - start, task=self.task, model=self.model)
+
+        input_tokens, output_tokens = extract_token_usage(response)
+        cached_tokens = extract_cached_tokens(response)
+        metrics.incr("llm_input_tokens", input_tokens, task=self.task, model=self.model)
+        metrics.incr("llm_output_tokens", output_tokens, task=self.task, model=self.model)
+        # Prompt tokens served from the provider's prefix cache vs. processed from scratch
+        metrics.incr("llm_cached_input_tokens", cached_tokens, task=self.task, model=self.model)
+        metrics.incr("llm_uncached_input_tokens", input_tokens - cached_tokens, task=self.task, model=self.model)
+        if input_tokens:
+            metrics.observe("llm_prompt_cache_hit_ratio", cached_tokens / input_tokens, task=self.task, model=self.model)
+        metrics.observe(
+            "llm_cost_usd", estimate_cost(self.model, input_tokens, output_tokens, cached_tokens),
+            task=self.task, model=self.model
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+        metrics.incr("llm_errors", task=self.task, model=self.model)
+
+
+def extract_token_usage(response) -> Tuple[int, int]:
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+
+
+def extract_cached_tokens(response) -> int:
+    """Prompt tokens the provider served from its prefix cache (0 when not reported)."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return (usage.get("input_token_details") or {}).get("cache_read") or 0
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    return (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    # MODEL_PRICES holds [input, output] or [input, output, cached input] USD per million tokens
+    prices = settings.MODEL_PRICES.get(model)
+    if not prices:
+        return 0.0
+    cached_price = prices[2] if len(prices) > 2 else prices[0]
+    return ((input_tokens - cached_tokens) * prices[0] + cached_tokens * cached_price + output_tokens * prices[1]) / 1_000_000
+
+
+def estimate_prompt_tokens(messages) -> int:
+    # ~4 characters per token plus per-message overhead; corrected after the call from actual usage
+    return sum(len(str(m.content)) // 4 + 4 for m in messages)
+
+
+def _is_retryable(error: Exception) -> bool:
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def _retry_after(error: openai.APIStatusError) -> Optional[float]:
+    headers = error.response.headers if error.response is not None else {}
+    return parse_reset_duration(headers.get("retry-after")) or parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+
+
+class GovernedChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI that passes every call through the model's shared rate limiter
+    (in the caller's scheduling lane) and retries 429/5xx responses with
+    jittered backoff. The client's own
+    retries are disabled (`max_retries=0`) so backoff is coordinated here.
+    Every attempt also goes through the endpoint's circuit breaker, so an
+    unreachable or hanging provider fails fast instead of tying up workers.
+    With LLM_ENDPOINTS configured, attempts go to the endpoint pool instead
+    of the single OPENAI_BASE_URL.
+    With an active LLM cassette, calls are recorded to it or replayed from it.
+    """
+
+    # Task the instance serves (parse, summary, reply), used to file cassette entries
+    task: str = ""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        cassette = active_cassette()
+        if cassette is None:
+            return self._governed_generate(messages, stop, run_manager, **kwargs)
+        if cassette.replaying:
+            # No provider involved: rate limiter and circuit breaker are skipped
+            return cassette.replay(self.task, self.model_name, messages, stop, kwargs, estimate_prompt_tokens(messages))
+        start = time.perf_counter()
+        result = self._governed_generate(messages, stop, run_manager, **kwargs)
+        cassette.record(self.task, self.model_name, messages, stop, kwargs, result,
+                        time.perf_counter() - start, estimate_prompt_tokens(messages))
+        return result
+
+    def _governed_generate(self, messages, stop=None, run_manager=None, **kwargs):
+        limiter = get_limiter(self.model_name)
+        # With an endpoint pool each endpoint has its own breaker, handled by the pool
+        pool = get_pool()
+        breaker = None if pool else get_breaker(self.openai_api_base or settings.OPENAI_BASE_URL)
+        estimate = estimate_prompt_tokens(messages) + settings.LLM_EXPECTED_OUTPUT_TOKENS
+        lane = current_lane()
+        start = time.perf_counter()
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            # Checked before queueing in the limiter, so an open circuit costs nothing
+            if breaker:
+                breaker.before_call()
+            limiter.acquire(estimate, lane)
+            try:
+                if pool:
+                    result = pool.generate(self.model_name, messages, stop, **kwargs)
+                else:
+                    result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                limiter.release(estimate, 0)
+                if breaker:
+                    if is_outage(e):
+                        breaker.record_failure()
+                    elif isinstance(e, openai.APIStatusError):
+                        breaker.record_success()
+                    else:
+                        breaker.release()
+                if not _is_retryable(e) or attempt >= settings.LLM_MAX_RETRIES:
+                    raise
+                retry_after = _retry_after(e)
+                delay = backoff_delay(attempt, retry_after)
+                if e.status_code == 429:
+                    # Everyone waiting on this model backs off, not just this caller
+                    limiter.pause(delay)
+                metrics.incr("llm_retries", model=self.model_name, status=e.status_code)
+                time.sleep(delay)
+                continue
+
+            if breaker:
+                breaker.record_success()
+            limiter.release(estimate, _total_tokens(result))
+            limiter.update_from_headers(_response_headers(result))
+            # Queueing + provider time, per scheduling lane
+            metrics.observe("llm_lane_latency_seconds", time.perf_counter() - start, lane=lane)
+            return result
+
+
+def _total_tokens(result) -> Optional[int]:
+    for generation in result.generations:
+        usage = getattr(generation.message, "usage_metadata", None)
+        if usage:
+            return usage.get("total_tokens")
+    return (result.llm_output or {}).get("token_usage", {}).get("total_tokens")
+
+
+def _response_headers(result) -> Optional[dict]:
+    for generation in result.generations:
+        headers = generation.message.response_metadata.get("headers")
+        if headers:
+            return headers
+    return None
+
+
+_models: Dict[Tuple[str, str], ChatOpenAI] = {}
+_models_lock = threading.Lock()
+
+
+def get_chat_model(task: str, model: str) -> ChatOpenAI:
+    """Returns a shared chat model instance for (task, model), instrumented with a UsageTracker."""
+    key = (task, model)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = GovernedChatOpenAI(
+                task=task,
+                model=model,
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                max_retries=0,
+                # Without a timeout a hanging provider holds the request thread indefinitely
+                timeout=httpx.Timeout(settings.LLM_READ_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+                include_response_headers=True,
+                callbacks=[UsageTracker(task, model)]
+            )
+        return _models[key]
+
+
+class ModelRouter:
+    """
+    Picks the model for each task: a cheap model for parsing, dedicated summary
+    and reply models, and an escalation model when a rule fires (high urgency,
+    long thread, or a previous attempt that failed validation).
+    """
+
+    def base_model(self, task: str) -> str:
+        return {
+            TASK_PARSE: settings.PARSE_MODEL,
+            TASK_SUMMARY: settings.SUMMARY_MODEL,
+            TASK_REPLY: settings.REPLY_MODEL,
+        }[task]
+
+    def select(
+        self,
+        task: str,
+        urgency: Optional[str] = None,
+        thread_length: Optional[int] = None,
+        failed_validation: bool = False,
+    ) -> str:
+        if failed_validation and settings.ESCALATE_ON_VALIDATION_FAILURE:
+            return self._escalate(task, "validation")
+        if urgency and urgency.lower() in settings.ESCALATE_URGENCY_LEVELS:
+            return self._escalate(task, "urgency")
+        if settings.ESCALATE_THREAD_LENGTH and thread_length and thread_length >= settings.ESCALATE_THREAD_LENGTH:
+            return self._escalate(task, "thread_length")
+        return self.base_model(task)
+
+    def chat_model(self, task: str, **signals) -> ChatOpenAI:
+        return get_chat_model(task, self.select(task, **signals))
+
+    def _escalate(self, task: str, reason: str) -> str:
+        model = settings.ESCALATION_MODEL
+        if model != self.base_model(task):
+            metrics.incr("llm_escalations", task=task, reason=reason)
+        return model
@@ -0,0 +1,66 @@
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+# Prompts are laid out for provider-side prefix caching (OpenAI, vLLM): the
+# system message is identical on every call and everything that varies per
+# request comes last, least variable first. Bump a version whenever its
+# static prefix changes; versions are part of the single-flight cache keys.
+SUMMARY_PROMPT_VERSION = "summary-v2"
+REPLY_PROMPT_VERSION = "reply-v2"
+PARSE_PROMPT_VERSION = "parse-v3"
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are an expert email analyst. Analyze the email described at the end of the user message, "
+               "using its thread context, to produce a structured summary. Return the result in JSON format."
+               "{format_instructions}"),
+    # Thread context is shared by every email of the thread, so it goes before the per-email fields
+    ("user", "Thread Context:\n{thread_context}\n\nEmail ID: {email_id}\nTimestamp: {timestamp}\nSender: {sender}"),
+    MessagesPlaceholder("repair", optional=True)
+])
+
+REPLY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a professional email assistant. Write a reply to the customer email summarised in the user message.
+
+INSTRUCTIONS:
+- Write the reply in the tone given at the end of the user message.
+- Address all questions.
+- Be specific and helpful.
+- Follow any additional user instructions given at the end of the user message."""),
+    ("user", """CONTEXT:
+- Intent: {intent}
+- Sentiment: {sentiment}
+- Urgency: {urgency}
+- Thread Summary: {thread_summary}
+
+CUSTOMER EMAIL SUMMARY:
+Main Topic: {main_topic}
+Questions: {questions}
+Action Items: {action_items}
+
+TONE: {tone}{instructions}""")
+])
+
+PARSE_PROMPT = ChatPromptTemplate.from_messages([
+    # Safety is checked locally (backend.core.safety) before and after parsing, not by the model
+    ("system", """You are an expert email parser. Extract the sender email address, subject, and body from raw email content.
+
+Rules:
+- If you find "From:" or similar headers, extract the email address
+- If you find "Subject:" extract the subject line
+- The body is the main message content
+- If no clear sender is found, use "unknown@example.com"
+- If no clear subject is found, use the first line or "No Subject"
+- Always extract the complete body content
+- Handle various email formats (Gmail, Outlook, plain text, etc.)
+
+{format_instructions}"""),
+    ("user", "Parse this raw email content:\n\n{raw_content}")
+])
+
+
+def format_instructions_block(instructions: str) -> str:
+    return f"\n\n{instructions}" if instructions else ""
+
+
+def additional_instructions_block(instructions) -> str:
+    # Passed as a value, never spliced into the template: user text may contain braces
+    return f"\nADDITIONAL USER INSTRUCTIONS: {instructions}" if instructions else ""
@@ -0,0 +1,181 @@
+import random
+import re
+import threading
+import time
+from typing import Dict, Mapping, Optional
+
+from backend.ai.scheduler import current_lane, new_lane_queue
+from backend.core.config import settings
+from backend.core.metrics import metrics
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parses OpenAI-style reset values such as "20ms", "1s" or "6m0s" into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    ceiling = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class TokenBucketLimiter:
+    """
+    Client-side limiter for one model: a requests/min bucket, a tokens/min
+    bucket and a cap on in-flight calls.
+
+    Only the head of the wait queue may take capacity. The queue is a
+    weighted fair queue over the interactive/urgent/bulk lanes (FIFO within a
+    lane), so a backfill cannot starve interactive callers and bulk work still
+    progresses. Rate-limit headers from the provider correct the local
+    buckets, and a 429 pauses the whole queue until the provider's reset time.
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int, max_concurrency: int):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._queue = new_lane_queue()
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._updated = time.monotonic()
+
+    def acquire(self, tokens: int, lane: Optional[str] = None) -> float:
+        """Blocks until the call may proceed; returns the seconds spent waiting."""
+        ticket = object()
+        start = time.monotonic()
+        dispatched = False
+        with self._cond:
+            lane = self._queue.push(ticket, lane or current_lane())
+            self._report_depth(lane)
+            try:
+                while True:
+                    if self._queue.head() is ticket:
+                        wait = self._wait_time(tokens)
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        # Aging can make this caller the head without anyone notifying it
+                        self._cond.wait(self._queue.next_aging())
+                if self.rpm:
+                    self._requests -= 1
+                if self.tpm:
+                    self._tokens -= min(tokens, self.tpm)
+                self._in_flight += 1
+                dispatched = True
+            finally:
+                self._queue.remove(ticket, lane, dispatched)
+                self._report_depth(lane)
+                self._cond.notify_all()
+
+        waited = time.monotonic() - start
+        metrics.observe("llm_limiter_wait_seconds", waited, model=self.model)
+        metrics.observe("llm_lane_wait_seconds", waited, lane=lane)
+        return waited
+
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int] = None):
+        """Ends a call; refunds (or charges) the gap between the token estimate and actual usage."""
+        with self._cond:
+            self._in_flight -= 1
+            if self.tpm and actual_tokens is not None:
+                self._tokens = min(self.tpm, self._tokens + min(estimated_tokens, self.tpm) - actual_tokens)
+            metrics.set_gauge("llm_in_flight", self._in_flight, model=self.model)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def update_from_headers(self, headers: Optional[Mapping[str, str]]):
+        """Aligns the local buckets with x-ratelimit-* headers from the provider."""
+        if not headers:
+            return
+        headers = {k.lower(): v for k, v in headers.items()}
+        with self._cond:
+            self._refill()
+            for kind in ("requests", "tokens"):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                if kind == "requests" and self.rpm:
+                    self._requests = min(self._requests, remaining)
+                elif kind == "tokens" and self.tpm:
+                    self._tokens = min(self._tokens, remaining)
+                if remaining <= 0:
+                    reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if reset:
+                        self._paused_until = max(self._paused_until, time.monotonic() + reset)
+
+    def _wait_time(self, tokens: int) -> float:
+        self._refill()
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.max_concurrency and self._in_flight >= self.max_concurrency:
+            # Woken by release()
+            return 60.0
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+        needed = min(tokens, self.tpm)
+        if self.tpm and self._tokens < needed:
+            wait = max(wait, (needed - self._tokens) * 60.0 / self.tpm)
+        return wait
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _report_depth(self, lane: str):
+        metrics.set_gauge("llm_limiter_queue_depth", len(self._queue), model=self.model)
+        metrics.set_gauge("llm_lane_queue_depth", self._queue.depth(lane), model=self.model, lane=lane)
+
+
+_limiters: Dict[str, TokenBucketLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model: str) -> TokenBucketLimiter:
+    """Returns the shared limiter for a model, configured from LLM_RATE_LIMITS or the defaults."""
+    with _limiters_lock:
+        if model not in _limiters:
+            limits = settings.LLM_RATE_LIMITS.get(model, {})
+            _limiters[model] = TokenBucketLimiter(
+                model,
+                rpm=int(limits.get("rpm", settings.LLM_DEFAULT_RPM)),
+                tpm=int(limits.get("tpm", settings.LLM_DEFAULT_TPM)),
+                max_concurrency=int(limits.get("concurrency", settings.LLM_MAX_CONCURRENCY)),
+            )
+        return _limiters[model]
@@ -1,10 +1,10 @@
 from typing import TypedDict, Optional
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from backend.core.config import settings
 from backend.core.security import check_safety
+from backend.ai.llm import ModelRouter, TASK_REPLY
+from backend.ai.prompts import REPLY_PROMPT, REPLY_PROMPT_VERSION, additional_instructions_block
+from backend.ai.single_flight import cache_key, single_flight
 import json
 
 class ReplyState(TypedDict):
@@ -18,11 +18,8 @@ class ReplyState(TypedDict):
 
 class ReplyGenerator:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=settings.OPENAI_MODEL,
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_BASE_URL
-        )
+        self.router = ModelRouter()
+        self.llm = self.router.chat_model(TASK_REPLY)
         self.workflow = self._build_workflow()
 
     def _build_workflow(self):
@@ -53,33 +50,16 @@ class ReplyGenerator:
         retries = state.get("retries", 0)
         
         # If retrying, maybe adjust prompt? For now, just retry.
-        
-        prompt_text = """
-        You are a professional email assistant.
-        
-        CONTEXT:
-        - Intent: {intent}
-        - Sentiment: {sentiment}
-        - Urgency: {urgency}
-        - Thread Summary: {thread_summary}
-        
-        CUSTOMER EMAIL SUMMARY:
-        Main Topic: {main_topic}
-        Questions: {questions}
-        Action Items: {action_items}
-        
-        INSTRUCTIONS:
-        - Write a {tone} email reply.
-        - Address all questions.
-        - Be specific and helpful.
-        """
-        
-        if instructions:
-            prompt_text += f"\n        - ADDITIONAL USER INSTRUCTIONS: {instructions}\n"
-            
-        prompt = ChatPromptTemplate.from_template(prompt_text)
-        
-        chain = prompt | self.llm | StrOutputParser()
+        prompt = REPLY_PROMPT
+        
+        # Urgent emails, long threads and retries after a failed validation use the stronger model
+        llm = self.router.chat_model(
+            TASK_REPLY,
+            urgency=summary['urgency']['level'],
+            thread_length=summary['thread_info'].get('email_count'),
+            failed_validation=retries > 0
+        )
+        chain = prompt | llm | StrOutputParser()
         
         reply = chain.invoke({
             "intent": summary['classification']['intent'],
@@ -89,7 +69,8 @@ class ReplyGenerator:
             "main_topic": summary['content_analysis']['main_topic'],
             "questions": "\n".join(summary['content_analysis']['questions']),
             "action_items": "\n".join(summary['content_analysis']['action_items']),
-            "tone": tone
+            "tone": tone,
+            "instructions": additional_instructions_block(instructions)
         })
         
         return {"reply": reply, "retries": retries + 1}
@@ -137,6 +118,11 @@ class ReplyGenerator:
         return "retry"
 
     def generate(self, summary: dict, tone: str = "professional", instructions: Optional[str] = None) -> dict:
+        # Double-clicked "Generate Reply" and retried requests share one workflow run
+        key = cache_key(TASK_REPLY, REPLY_PROMPT_VERSION, self.router.base_model(TASK_REPLY), summary, tone, instructions)
+        return dict(single_flight.do(key, lambda: self._run_workflow(summary, tone, instructions)))
+
+    def _run_workflow(self, summary: dict, tone: str, instructions: Optional[str]) -> dict:
         initial_state = ReplyState(
             summary=summary,
             tone=tone,
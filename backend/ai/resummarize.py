@@ -0,0 +1,209 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from backend.ai.circuit_breaker import LLM_UNAVAILABLE_ERRORS
+from backend.ai.llm import ModelRouter, TASK_SUMMARY
+from backend.ai.prompts import SUMMARY_PROMPT_VERSION
+from backend.ai.scheduler import LANE_BULK, use_lane
+from backend.core.config import settings
+from backend.core.metrics import metrics
+from backend.db.models import Email, EmailSummary, GeneratedReply
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_RECENT = "recent"
+PRIORITY_UNREPLIED = "unreplied"
+PRIORITY_OLDEST = "oldest"
+PRIORITIES = (PRIORITY_RECENT, PRIORITY_UNREPLIED, PRIORITY_OLDEST)
+
+DONE, SKIPPED, FAILED = "done", "skipped", "failed"
+
+
+def current_stamp() -> Tuple[str, str]:
+    """(prompt_version, model) that fresh summaries are written with."""
+    return SUMMARY_PROMPT_VERSION, ModelRouter().base_model(TASK_SUMMARY)
+
+
+def stale_condition(db: Session):
+    """
+    Filter matching summaries not written with the current stamp, or None if
+    there are none. The distinct stamps are read from the
+    (prompt_version, model) index first, so the filter is a few equality
+    lookups on that index rather than a scan for "not equal".
+    """
+    current = current_stamp()
+    stamps = db.execute(select(EmailSummary.prompt_version, EmailSummary.model).distinct()).all()
+    conditions = [
+        and_(
+            EmailSummary.prompt_version.is_(None) if prompt_version is None else EmailSummary.prompt_version == prompt_version,
+            EmailSummary.model.is_(None) if model is None else EmailSummary.model == model,
+        )
+        for prompt_version, model in stamps
+        if (prompt_version, model) != current
+    ]
+    return or_(*conditions) if conditions else None
+
+
+class Resummarizer:
+    """
+    Rewrites summaries written by another model or prompt version, in
+    parallel batches in the bulk lane (so interactive traffic and the LLM rate
+    limits keep precedence).
+
+    Each summary is regenerated from its thread as it was when the email
+    arrived and written back in a single UPDATE that checks the row's
+    `version`, so a summary rewritten concurrently is left alone. Progress
+    needs no checkpoint: a rewritten row is no longer stale, so an
+    interrupted run is resumed by running it again. A pass stops early when
+    the provider is unavailable.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        priority: str = PRIORITY_RECENT,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        self.session_factory = session_factory
+        self.priority = priority
+        self.concurrency = max(1, concurrency or settings.RESUMMARIZE_CONCURRENCY)
+        self.batch_size = batch_size or settings.RESUMMARIZE_BATCH_SIZE
+        self.stats = {DONE: 0, SKIPPED: 0, FAILED: 0}
+        self.stale = 0
+        self._stop = threading.Event()
+
+    def count_stale(self) -> int:
+        db = self.session_factory()
+        try:
+            condition = stale_condition(db)
+            count = db.scalar(select(func.count(EmailSummary.id)).where(condition)) if condition is not None else 0
+            metrics.set_gauge("summaries_stale", count)
+            return count
+        finally:
+            db.close()
+
+    def run(self, limit: Optional[int] = None, on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Rewrites up to `limit` stale summaries (all by default) and returns the final report."""
+        start = time.perf_counter()
+        self.stale = self.count_stale()
+        failed: Set[int] = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self._stop.is_set():
+                remaining = None if limit is None else limit - sum(self.stats.values())
+                if remaining is not None and remaining <= 0:
+                    break
+                batch = self._next_batch(min(self.batch_size, remaining or self.batch_size), failed)
+                if not batch:
+                    break
+                unavailable = None
+                for item, future in [(item, pool.submit(self._resummarize, item)) for item in batch]:
+                    try:
+                        outcome = future.result()
+                    except LLM_UNAVAILABLE_ERRORS as e:
+                        unavailable = e
+                        continue
+                    self.stats[outcome] += 1
+                    if outcome != DONE:
+                        failed.add(item[0])
+                if on_progress:
+                    on_progress(self._report(start))
+                if unavailable is not None:
+                    # Rows not rewritten yet stay stale for the next run
+                    logger.warning("Re-summarisation paused, LLM unavailable: %s", unavailable)
+                    break
+        report = self._report(start)
+        metrics.set_gauge("summaries_stale", report["remaining"])
+        return report
+
+    def stop(self):
+        self._stop.set()
+
+    def _next_batch(self, limit: int, exclude: Set[int]) -> List[Tuple[int, str, Optional[int]]]:
+        db = self.session_factory()
+        try:
+            condition = stale_condition(db)
+            if condition is None:
+                return []
+            query = (
+                select(EmailSummary.id, EmailSummary.email_id, EmailSummary.version)
+                .join(Email, Email.id == EmailSummary.email_id)
+                .where(condition)
+            )
+            if exclude:
+                query = query.where(EmailSummary.id.notin_(exclude))
+            if self.priority == PRIORITY_UNREPLIED:
+                # Emails still waiting for a reply first, newest first within each group
+                replied = select(GeneratedReply.id).where(GeneratedReply.email_id == Email.id).exists()
+                query = query.order_by(replied, Email.received_at.desc())
+            elif self.priority == PRIORITY_OLDEST:
+                query = query.order_by(Email.received_at)
+            else:
+                query = query.order_by(Email.received_at.desc())
+            return [tuple(row) for row in db.execute(query.order_by(EmailSummary.id).limit(limit))]
+        finally:
+            db.close()
+
+    def _resummarize(self, item: Tuple[int, str, Optional[int]]) -> str:
+        summary_id, email_id, version = item
+        from backend.ai.email_processor import EmailProcessor
+
+        db = self.session_factory()
+        try:
+            email = db.get(Email, email_id)
+            processor = EmailProcessor(db)
+            with use_lane(LANE_BULK):
+                summary = processor.build_summary(email, up_to_email=True)
+            prompt_version, model = current_stamp()
+            rewritten = db.execute(
+                update(EmailSummary)
+                .where(
+                    EmailSummary.id == summary_id,
+                    EmailSummary.version.is_(None) if version is None else EmailSummary.version == version,
+                )
+                .values(
+                    summary_json=summary.model_dump(),
+                    model=model,
+                    prompt_version=prompt_version,
+                    version=(version or 1) + 1,
+                    updated_at=datetime.now(timezone.utc),
+                )
+            ).rowcount
+            db.commit()
+        except LLM_UNAVAILABLE_ERRORS:
+            db.rollback()
+            raise
+        except Exception as e:
+            logger.warning("Re-summarisation of %s failed: %s", email_id, e)
+            db.rollback()
+            metrics.incr("summaries_resummarize_failed")
+            return FAILED
+        finally:
+            db.close()
+
+        if not rewritten:
+            # Rewritten by someone else since this batch was read
+            return SKIPPED
+        metrics.incr("summaries_resummarized")
+        return DONE
+
+    def _report(self, start: float) -> dict:
+        elapsed = time.perf_counter() - start
+        return {
+            "stale": self.stale,
+            "resummarized": self.stats[DONE],
+            "skipped": self.stats[SKIPPED],
+            "failed": self.stats[FAILED],
+            "remaining": max(self.stale - self.stats[DONE] - self.stats[SKIPPED], 0),
+            "elapsed_seconds": round(elapsed, 2),
+            "summaries_per_second": round(self.stats[DONE] / elapsed, 2) if elapsed > 0 else 0.0,
+        }
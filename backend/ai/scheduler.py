@@ -0,0 +1,116 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from backend.core.config import settings
+
+LANE_INTERACTIVE = "interactive"
+LANE_URGENT = "urgent"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_URGENT, LANE_BULK)
+
+_current_lane: ContextVar[str] = ContextVar("llm_lane", default=LANE_INTERACTIVE)
+
+
+def current_lane() -> str:
+    return _current_lane.get()
+
+
+@contextmanager
+def use_lane(lane: str):
+    """Runs the enclosed LLM calls in the given scheduling lane."""
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def lane_for_urgency(level: Optional[str], default: str) -> str:
+    """Background work on urgent emails is promoted to the urgent lane; interactive work stays interactive."""
+    if default != LANE_INTERACTIVE and level and level.lower() in settings.URGENT_LANE_LEVELS:
+        return LANE_URGENT
+    return default
+
+
+class LaneQueue:
+    """
+    Weighted fair queue of callers waiting for LLM capacity.
+
+    Each lane is FIFO. Between lanes, stride scheduling approximates weighted
+    fair queuing: every dispatch advances the lane's pass by 1/weight and the
+    non-empty lane with the lowest pass goes next, so with weights 8/4/1 the
+    interactive lane gets 8 slots for every bulk slot while bulk still
+    progresses. A lane that was idle re-enters at the current virtual time
+    rather than with banked credit. Aging: a caller that has waited longer
+    than `max_wait` seconds is served next regardless of lane.
+    """
+
+    def __init__(self, weights: Dict[str, float], max_wait: float):
+        invalid = [lane for lane, weight in weights.items() if not weight > 0]
+        if invalid:
+            # A zero weight would never advance the lane's pass (and divides by zero on dispatch)
+            raise ValueError(f"Lane weights must be > 0 (LANE_WEIGHT_*): {', '.join(invalid)}")
+        self.weights = weights
+        self.max_wait = max_wait
+        self._lanes = {lane: deque() for lane in weights}
+        self._pass = {lane: 0.0 for lane in weights}
+        self._vtime = 0.0
+
+    def push(self, ticket, lane: str):
+        if lane not in self._lanes:
+            lane = LANE_BULK
+        if not self._lanes[lane]:
+            self._pass[lane] = max(self._pass[lane], self._vtime)
+        self._lanes[lane].append((ticket, time.monotonic()))
+        return lane
+
+    def head(self):
+        heads = [(lane, entries[0]) for lane, entries in self._lanes.items() if entries]
+        if not heads:
+            return None
+        now = time.monotonic()
+        aged = [(enqueued, ticket) for _, (ticket, enqueued) in heads if now - enqueued >= self.max_wait]
+        if self.max_wait and aged:
+            return min(aged, key=lambda item: item[0])[1]
+        lane, (ticket, _) = min(heads, key=lambda item: (self._pass[item[0]], -self.weights[item[0]]))
+        return ticket
+
+    def next_aging(self) -> Optional[float]:
+        """Seconds until the next lane head ages past `max_wait` (and may become the head), or None."""
+        if not self.max_wait:
+            return None
+        now = time.monotonic()
+        deadlines = [entries[0][1] + self.max_wait - now for entries in self._lanes.values() if entries]
+        # Callers that have aged already are ordered by age; only a new one can reorder the queue
+        pending = [deadline for deadline in deadlines if deadline > 0]
+        return min(pending) if pending else None
+
+    def remove(self, ticket, lane: str, dispatched: bool):
+        entries = self._lanes[lane]
+        for i, (queued, _) in enumerate(entries):
+            if queued is ticket:
+                del entries[i]
+                break
+        if dispatched:
+            self._vtime = self._pass[lane]
+            self._pass[lane] += 1.0 / self.weights[lane]
+
+    def depth(self, lane: str) -> int:
+        return len(self._lanes[lane])
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._lanes.values())
+
+
+def new_lane_queue() -> LaneQueue:
+    return LaneQueue(
+        weights={
+            LANE_INTERACTIVE: settings.LANE_WEIGHT_INTERACTIVE,
+            LANE_URGENT: settings.LANE_WEIGHT_URGENT,
+            LANE_BULK: settings.LANE_WEIGHT_BULK,
+        },
+        max_wait=settings.LANE_MAX_WAIT_SECONDS,
+    )
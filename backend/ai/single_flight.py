@@ -0,0 +1,132 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from backend.core.config import settings
+from backend.core.metrics import metrics
+from backend.db.models import LLMResult
+
+
+def cache_key(task: str, *parts: Any) -> str:
+    """Stable key for an LLM call: the task plus a hash of everything that shapes its output."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return f"{task}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical LLM calls.
+
+    The first caller for a key runs the call; concurrent callers with the same
+    key wait on its future and get the same result. With
+    SINGLE_FLIGHT_ADVISORY_LOCK enabled, the leader also claims the key with a
+    placeholder row in `llm_results` and publishes the result there, so
+    leaders in other processes poll for it and reuse it instead of calling the
+    LLM again. Results must be JSON-serialisable for the cross-process path.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        task = key.split(":", 1)[0]
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            metrics.incr("llm_coalesced_calls", task=task, scope="process")
+            return future.result()
+
+        try:
+            result = self._run_leader(key, task, fn)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _run_leader(self, key: str, task: str, fn: Callable[[], Any]) -> Any:
+        from backend.db.database import engine
+
+        if not settings.SINGLE_FLIGHT_ADVISORY_LOCK:
+            return fn()
+
+        # No connection or transaction is held while the LLM call runs: the key is claimed
+        # with a placeholder row, and other processes poll for the published result
+        while True:
+            claimed_at, result = self._claim(engine, key)
+            if claimed_at is not None:
+                break
+            if result is not None:
+                metrics.incr("llm_coalesced_calls", task=task, scope="cluster")
+                return result
+            time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+
+        try:
+            result = fn()
+        except BaseException:
+            # Hand the key to the next caller instead of leaving it claimed until the timeout
+            with engine.begin() as conn:
+                conn.execute(delete(LLMResult).where(LLMResult.key == key, LLMResult.created_at == claimed_at))
+            raise
+        with engine.begin() as conn:
+            conn.execute(
+                update(LLMResult).where(LLMResult.key == key, LLMResult.created_at == claimed_at)
+                .values(result=result, created_at=datetime.now(timezone.utc))
+            )
+            conn.execute(delete(LLMResult).where(LLMResult.created_at < self._cutoff(
+                max(settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS, settings.SINGLE_FLIGHT_CLAIM_TIMEOUT_SECONDS))))
+        return result
+
+    def _claim(self, engine, key: str) -> Tuple[Optional[datetime], Any]:
+        """(claim time, None) when this caller now leads, (None, result) for a fresh result, else (None, None)."""
+        with engine.begin() as conn:
+            row = conn.execute(select(LLMResult.result, LLMResult.created_at).where(LLMResult.key == key)).first()
+            if row is not None:
+                done = row.result is not None
+                if done and _aware(row.created_at) >= self._cutoff(settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS):
+                    return None, row.result
+                if not done and _aware(row.created_at) >= self._cutoff(settings.SINGLE_FLIGHT_CLAIM_TIMEOUT_SECONDS):
+                    return None, None
+                # An expired result, or the claim of a leader that died
+                conn.execute(delete(LLMResult).where(LLMResult.key == key, LLMResult.created_at == row.created_at))
+
+        claimed_at = datetime.now(timezone.utc)
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(LLMResult).values(key=key, result=None, created_at=claimed_at))
+        except IntegrityError:
+            # Another process claimed it first
+            return None, None
+        return claimed_at, None
+
+    @staticmethod
+    def _cutoff(seconds: int) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=seconds)
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive timestamps
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,97 @@
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from backend.ai.reply_generator import ReplyGenerator
+from backend.ai.scheduler import LANE_BULK, lane_for_urgency, use_lane
+from backend.core.config import settings
+from backend.core.events import DRAFT, event_bus
+from backend.core.metrics import metrics
+from backend.core.thread_resolver import parse_addresses
+from backend.db.models import DraftReply, Email, EmailSummary
+
+
+def should_pre_generate(summary_json: dict, sender: str) -> bool:
+    """Applies the SPECULATIVE_* policy to a freshly stored summary."""
+    if not settings.SPECULATIVE_REPLIES or not isinstance(summary_json, dict):
+        return False
+
+    urgency = (summary_json.get("urgency") or {}).get("level", "").lower()
+    intent = (summary_json.get("classification") or {}).get("intent", "").lower()
+    addresses = parse_addresses(sender)
+    rules = [
+        (settings.SPECULATIVE_URGENCY_LEVELS, urgency in settings.SPECULATIVE_URGENCY_LEVELS),
+        (settings.SPECULATIVE_INTENTS, intent in settings.SPECULATIVE_INTENTS),
+        (settings.SPECULATIVE_SENDERS, any(
+            entry == addr or (entry.startswith("@") and addr.endswith(entry))
+            for entry in settings.SPECULATIVE_SENDERS for addr in addresses
+        )),
+    ]
+    configured = [matched for allowed, matched in rules if allowed]
+    return not configured or any(configured)
+
+
+def pre_generate_reply(email_id: str, session_factory=None):
+    """
+    Background task: drafts a reply in the summary's recommended tone and
+    stores it as a pending draft. Runs in the bulk lane (urgent for urgent
+    emails) so it never delays interactive requests.
+    """
+    if session_factory is None:
+        from backend.db.database import SessionLocal as session_factory
+
+    db = session_factory()
+    try:
+        summary = db.query(EmailSummary).filter(EmailSummary.email_id == email_id).first()
+        if not summary:
+            return
+        summary_json = summary.summary_json
+        tone = summary_json.get("recommended_tone") or "professional"
+        urgency = (summary_json.get("urgency") or {}).get("level")
+
+        with use_lane(lane_for_urgency(urgency, LANE_BULK)):
+            result = ReplyGenerator().generate(summary_json, tone=tone)
+        if result["status"] != "success":
+            metrics.incr("speculative_drafts", outcome="failed")
+            return
+
+        # A newer email may have arrived while we were drafting
+        email = db.get(Email, email_id)
+        latest = (
+            db.query(Email.id)
+            .filter(Email.thread_id == email.thread_id)
+            .order_by(Email.received_at.desc(), Email.id.desc())
+            .first()
+        )
+        if latest and latest[0] != email_id:
+            metrics.incr("speculative_drafts", outcome="stale")
+            return
+
+        thread_id = email.thread_id
+        db.add(DraftReply(email_id=email_id, thread_id=thread_id, tone=tone, reply_text=result["reply"]))
+        db.commit()
+        metrics.incr("speculative_drafts", outcome="stored")
+        event_bus.publish(DRAFT, thread_id, email_id, "ready")
+    finally:
+        db.close()
+
+
+def take_draft(db: Session, email_id: str, tone: str) -> Optional[DraftReply]:
+    """Returns the pending draft for this email and tone, marking it used."""
+    draft = (
+        db.query(DraftReply)
+        .filter(DraftReply.email_id == email_id, DraftReply.tone == tone, DraftReply.status == "pending")
+        .order_by(DraftReply.created_at.desc())
+        .first()
+    )
+    if draft:
+        draft.status = "used"
+        metrics.incr("speculative_draft_hits")
+    return draft
+
+
+def invalidate_thread_drafts(db: Session, thread_id: str):
+    """New mail in a thread makes its pending drafts obsolete. Caller commits."""
+    db.query(DraftReply).filter(
+        DraftReply.thread_id == thread_id, DraftReply.status == "pending"
+    ).update({DraftReply.status: "invalidated"}, synchronize_session=False)
@@ -0,0 +1,165 @@
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from backend.ai.circuit_breaker import LLM_UNAVAILABLE_ERRORS
+from backend.ai.scheduler import LANE_BULK, use_lane
+from backend.core.config import settings
+from backend.core.events import SUMMARY, event_bus
+from backend.core.metrics import metrics
+from backend.db.models import Email, PendingSummary
+
+logger = logging.getLogger(__name__)
+
+
+def defer_summary(db: Session, email_id: str, error: Exception) -> PendingSummary:
+    """Queues an already-stored email for summarisation later."""
+    # Drop whatever the failed summary attempt left in the session; the email itself is committed
+    db.rollback()
+    pending = db.get(PendingSummary, email_id) or PendingSummary(email_id=email_id)
+    pending.status = "pending"
+    pending.last_error = str(error)[:500]
+    db.add(pending)
+    db.commit()
+    metrics.incr("summaries_deferred")
+    return pending
+
+
+def is_pending(db: Session, email_id: str) -> bool:
+    return db.get(PendingSummary, email_id) is not None
+
+
+class SummaryBackfillWorker:
+    """
+    Summarises emails from `pending_summaries` in the bulk lane.
+
+    A pass stops at the first call that finds the provider still unavailable
+    (that does not count as an attempt), so an outage costs one fast-failing
+    call per poll. Other errors are retried with exponential backoff up to
+    SUMMARY_BACKFILL_MAX_ATTEMPTS, then the row is marked `failed`.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+
+    def run_once(self, batch_size: Optional[int] = None) -> int:
+        """Summarises one batch of due emails; returns how many were summarised."""
+        db = self.session_factory()
+        try:
+            email_ids = self._claim(db, batch_size or settings.SUMMARY_BACKFILL_BATCH_SIZE)
+            done = 0
+            for i, email_id in enumerate(email_ids):
+                outcome = self._summarize(db, email_id)
+                if outcome is None:
+                    # Provider still down: hand the rest of the batch back for the next poll
+                    self._release(db, email_ids[i:])
+                    break
+                done += outcome
+            metrics.set_gauge("summaries_pending", db.query(PendingSummary).filter(PendingSummary.status == "pending").count())
+            return done
+        finally:
+            db.close()
+
+    def run_forever(self, poll_interval: Optional[float] = None):
+        interval = poll_interval if poll_interval is not None else settings.SUMMARY_BACKFILL_INTERVAL
+        while not self._stop.is_set():
+            try:
+                done = self.run_once()
+            except Exception:
+                logger.exception("Summary backfill failed")
+                done = 0
+            if not done:
+                self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def _claim(self, db: Session, limit: int) -> list:
+        now = datetime.now(timezone.utc)
+        rows = (
+            db.query(PendingSummary)
+            .filter(PendingSummary.status == "pending", PendingSummary.next_attempt_at <= now)
+            .order_by(PendingSummary.next_attempt_at, PendingSummary.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        # Leased like the outbox, so concurrent workers don't summarise the same email
+        lease = now + timedelta(seconds=max(settings.LLM_READ_TIMEOUT * 2, 60))
+        email_ids = []
+        for row in rows:
+            row.next_attempt_at = lease
+            email_ids.append(row.email_id)
+        db.commit()
+        return email_ids
+
+    def _release(self, db: Session, email_ids: list):
+        (
+            db.query(PendingSummary)
+            .filter(PendingSummary.email_id.in_(email_ids))
+            .update({PendingSummary.next_attempt_at: datetime.now(timezone.utc)}, synchronize_session=False)
+        )
+        db.commit()
+
+    def _summarize(self, db: Session, email_id: str) -> Optional[int]:
+        """1 if summarised, 0 if skipped or failed, None if the provider is still unavailable."""
+        email = db.get(Email, email_id)
+        pending = db.get(PendingSummary, email_id)
+        if email is None or email.summary is not None:
+            db.delete(pending)
+            db.commit()
+            return 0
+
+        thread_id = email.thread_id
+        from backend.ai.email_processor import EmailProcessor
+        try:
+            with use_lane(LANE_BULK):
+                EmailProcessor(db).summarize_email(email)
+        except LLM_UNAVAILABLE_ERRORS:
+            db.rollback()
+            return None
+        except Exception as e:
+            logger.warning("Deferred summary of %s failed: %s", email_id, e)
+            db.rollback()
+            pending = db.get(PendingSummary, email_id)
+            pending.attempts += 1
+            pending.last_error = str(e)[:500]
+            failed = pending.attempts >= settings.SUMMARY_BACKFILL_MAX_ATTEMPTS
+            if failed:
+                pending.status = "failed"
+                metrics.incr("summaries_backfill_failed")
+            else:
+                delay = settings.SUMMARY_BACKFILL_INTERVAL * 2 ** pending.attempts
+                pending.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            db.commit()
+            if failed:
+                event_bus.publish(SUMMARY, thread_id, email_id, "failed")
+            return 0
+
+        db.delete(db.get(PendingSummary, email_id))
+        db.commit()
+        metrics.incr("summaries_backfilled")
+        return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise emails accepted while the LLM was unavailable.")
+    parser.add_argument("--once", action="store_true", help="Process one batch and exit")
+    args = parser.parse_args()
+
+    from backend.db.database import SessionLocal
+    logging.basicConfig(level=logging.INFO)
+    worker = SummaryBackfillWorker(SessionLocal)
+    if args.once:
+        print(f"Summarised {worker.run_once()} emails")
+    else:
+        worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.ai.scheduler import current_lane, use_lane
+from backend.core.config import settings
+from backend.db.models import ChunkSummary, Email
+
+# Bump when the prompts below change so cached chunk summaries are not reused
+CHUNK_PROMPT_VERSION = "1"
+
+MAP_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You summarise a consecutive slice of an email thread. Keep who said what, decisions, open questions, commitments, amounts and dates. Be concise; do not invent details."),
+    ("user", "Messages:\n\n{content}\n\nSummary:")
+])
+
+REDUCE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You merge consecutive partial summaries of one email thread, oldest first, into a single summary. Keep decisions, open questions, commitments, amounts and dates. Be concise; do not invent details."),
+    ("user", "Partial summaries:\n\n{content}\n\nMerged summary:")
+])
+
+# (hash, summary or source text, number of messages covered)
+Node = Tuple[str, str, int]
+
+
+def format_messages(emails: List[Email]) -> str:
+    return "\n\n".join([f"From: {e.sender}\nSubject: {e.subject}\nBody: {e.body}" for e in emails])
+
+
+class ThreadSummarizer:
+    """
+    Builds the thread context for the summary prompt.
+
+    Short threads are passed through verbatim. Long threads are split into
+    fixed-size chunks of older messages which are summarised in parallel (map)
+    and merged in fixed-size groups (reduce) until a handful remain. Every
+    summary is cached by content hash in `chunk_summaries`, so a new email
+    only costs the chunks it completes plus the final prompt, instead of the
+    whole history.
+    """
+
+    def __init__(self, db: Session, llm):
+        self.db = db
+        self.llm = llm
+        self.chunk_size = max(settings.SUMMARY_CHUNK_SIZE, 2)
+
+    def build_context(self, emails: List[Email]) -> str:
+        threshold = settings.SUMMARY_HIERARCHICAL_THRESHOLD
+        if threshold <= 0 or len(emails) <= threshold:
+            return format_messages(emails)
+
+        size = self.chunk_size
+        # The newest email and any incomplete chunk stay verbatim
+        n_full = (len(emails) - 1) // size
+        chunks = [emails[i * size:(i + 1) * size] for i in range(n_full)]
+        tail = emails[n_full * size:]
+
+        nodes = self._summarize_all(0, [
+            (self._hash(CHUNK_PROMPT_VERSION, *(f"{e.sender}\n{e.subject}\n{e.body}" for e in chunk)),
+             format_messages(chunk),
+             len(chunk))
+            for chunk in chunks
+        ])
+
+        level = 0
+        while len(nodes) > size:
+            level += 1
+            n_groups = len(nodes) // size
+            groups = [nodes[i * size:(i + 1) * size] for i in range(n_groups)]
+            merged = self._summarize_all(level, [
+                (self._hash(CHUNK_PROMPT_VERSION, f"L{level}", *(h for h, _, _ in group)),
+                 "\n\n".join(f"[{count} messages]\n{summary}" for _, summary, count in group),
+                 sum(count for _, _, count in group))
+                for group in groups
+            ])
+            nodes = merged + nodes[n_groups * size:]
+
+        earlier = "\n\n".join(f"[{count} messages]\n{summary}" for _, summary, count in nodes)
+        return (
+            f"Earlier messages ({len(emails) - len(tail)}, summarised oldest first):\n{earlier}"
+            f"\n\nRecent messages:\n\n{format_messages(tail)}"
+        )
+
+    def _summarize_all(self, level: int, items: List[Node]) -> List[Node]:
+        """Returns (hash, summary, count) for every item, using the cache and summarising misses in parallel."""
+        if not items:
+            return []
+        hashes = [h for h, _, _ in items]
+        cached = {
+            row.chunk_hash: row.summary
+            for row in self.db.query(ChunkSummary).filter(ChunkSummary.chunk_hash.in_(hashes)).all()
+        }
+
+        missing = [item for item in items if item[0] not in cached]
+        if missing:
+            prompt = MAP_PROMPT if level == 0 else REDUCE_PROMPT
+            chain = prompt | self.llm | StrOutputParser()
+            lane = current_lane()
+
+            def summarize(item: Node) -> str:
+                # Pool threads do not inherit the caller's scheduling lane
+                with use_lane(lane):
+                    return chain.invoke({"content": item[1]})
+
+            workers = max(1, min(settings.SUMMARY_MAP_CONCURRENCY, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                summaries = list(pool.map(summarize, missing))
+
+            for (chunk_hash, _, count), summary in zip(missing, summaries):
+                cached[chunk_hash] = summary
+                self.db.add(ChunkSummary(chunk_hash=chunk_hash, level=level, message_count=count, summary=summary))
+            try:
+                self.db.commit()
+            except IntegrityError:
+                # Another worker cached the same chunk first; the content is equivalent
+                self.db.rollback()
+
+        return [(h, cached[h], count) for h, _, count in items]
+
+    @staticmethod
+    def _hash(*parts: str) -> str:
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
@@ -0,0 +1,37 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from backend.core.analytics import query_analytics, refresh_rollups
+from backend.core.config import settings
+from backend.db.database import get_db
+
+router = APIRouter()
+
+@router.get("")
+def get_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: Literal["day", "sender"] = "day",
+    sender: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    refresh: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Intent mix, sentiment, urgency distribution and reply turnaround per day
+    or per sender, read from the daily rollup table. The rollups are kept
+    current by a background worker (ANALYTICS_REFRESH_INTERVAL); `refresh`
+    brings them up to date first (only days with new summaries or replies
+    are rebuilt).
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=settings.ANALYTICS_DEFAULT_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    
+    if refresh:
+        refresh_rollups(db)
+    return query_analytics(db, start, end, group_by=group_by, sender=sender, limit=limit)
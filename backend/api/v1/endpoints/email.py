@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from backend.db.database import get_db
-from backend.db.models import EmailSummary, GeneratedReply
+from backend.db.database import get_db, get_read_db, recent_writes
+from backend.db.models import Email, EmailSummary, GeneratedReply
+from backend.ai.circuit_breaker import LLM_UNAVAILABLE_ERRORS, CircuitOpenError
 from backend.ai.email_processor import EmailProcessor
 from backend.ai.reply_generator import ReplyGenerator
+from backend.ai.scheduler import LANE_INTERACTIVE, use_lane
+from backend.ai.speculative import pre_generate_reply, should_pre_generate, take_draft
+from backend.ai.summary_queue import is_pending
+from backend.mail.outbound import ReplyAlreadySent, enqueue_reply
 from pydantic import BaseModel
 from typing import Optional
 
@@ -14,6 +21,11 @@ class EmailSubmitRequest(BaseModel):
     body: str
     sender: str
     thread_id: Optional[str] = None
+    # Optional threading headers, used to find the thread when thread_id is not given
+    message_id: Optional[str] = None
+    in_reply_to: Optional[str] = None
+    references: Optional[str] = None
+    recipients: Optional[str] = None
 
 class GenerateReplyRequest(BaseModel):
     tone: str = "professional"
@@ -24,90 +36,152 @@ class RawEmailRequest(BaseModel):
     raw_content: str
     thread_id: Optional[str] = None
 
+from backend.core.events import REPLY, event_bus
 from backend.core.security import validate_content
+from backend.core.thread_documents import refresh_thread_documents
+from backend.core.thread_resolver import extract_threading_headers
+from backend.core.config import settings
+from backend.mail.mime import (
+    MimeSizeError,
+    MimeStreamParser,
+    ParsedMime,
+    iter_text_chunks,
+    looks_like_message,
+    parse_stream,
+)
 
 @router.post("/webhook")
-def process_raw_email(request: RawEmailRequest, db: Session = Depends(get_db)):
+def process_raw_email(request: RawEmailRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Webhook endpoint to process raw email content pasted by users.
     Uses LLM to intelligently parse the raw text to extract sender, subject, and body.
     """
-    raw_text = request.raw_content.strip()
+    raw_text = request.raw_content
     
-    if not raw_text:
+    if not raw_text or raw_text.isspace():
         raise HTTPException(status_code=400, detail="Raw content cannot be empty")
     
+    # MIME input is reduced to its text parts; attachments are staged for the store, not put in the prompt
+    mime = None
+    if looks_like_message(raw_text):
+        try:
+            mime = parse_stream(iter_text_chunks(raw_text), stage=True)
+        except MimeSizeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        if not mime.is_message():
+            # A paste that merely starts with "Note: ..." is not a header block
+            mime.discard_attachments()
+            mime = None
+    return _ingest_raw_email(db, background_tasks, mime, raw_text, request.thread_id)
+
+@router.post("/webhook/raw")
+async def process_raw_message(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    thread_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Streaming variant of /webhook for a raw RFC 822 message sent as the request body
+    (e.g. Content-Type: message/rfc822). The body is parsed chunk by chunk as it
+    arrives and is never held in memory as a whole.
+    """
+    parser = MimeStreamParser(stage=True)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(parser.feed, chunk)
+        mime = await run_in_threadpool(parser.close)
+    except MimeSizeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        # e.g. the client disconnected mid-upload
+        parser.discard()
+        raise
+    if not mime.is_message():
+        mime.discard_attachments()
+        raise HTTPException(status_code=400, detail="Body is not an RFC 822 message")
+    return await run_in_threadpool(_ingest_raw_email, db, background_tasks, mime, None, thread_id)
+
+def _ingest_raw_email(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    mime: Optional[ParsedMime],
+    raw_text: Optional[str],
+    thread_id: Optional[str]
+) -> dict:
+    """Safety check, LLM parse and storage shared by the raw email endpoints."""
+    try:
+        return _parse_and_store(db, background_tasks, mime, raw_text, thread_id)
+    finally:
+        # A rejected message keeps none of its attachments; an accepted one has saved them already
+        if mime:
+            mime.discard_attachments()
+
+def _parse_and_store(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    mime: Optional[ParsedMime],
+    raw_text: Optional[str],
+    thread_id: Optional[str]
+) -> dict:
+    # A plain paste is capped like MIME text so the prompt (and every copy below) stays bounded
+    text = mime.text if mime else raw_text[:settings.MIME_MAX_TEXT_BYTES].strip()
+    prompt_text = mime.prompt_text() if mime else text
+    
+    # Unsafe content is rejected locally before it costs an LLM call
+    validate_content("", prompt_text)
+    
     # Use LLM to parse the raw email content
-    from langchain_openai import ChatOpenAI
-    from langchain_core.prompts import ChatPromptTemplate
+    from backend.ai.prompts import PARSE_PROMPT, PARSE_PROMPT_VERSION
     from langchain_core.output_parsers import JsonOutputParser
     from pydantic import BaseModel as PydanticBaseModel, Field
-    from backend.core.config import settings
+    from backend.ai.llm import ModelRouter, get_chat_model, TASK_PARSE
+    from backend.ai.single_flight import cache_key, single_flight
     
     class ParsedEmail(PydanticBaseModel):
         sender: str = Field(description="Email address of the sender")
         subject: str = Field(description="Subject line of the email")
         body: str = Field(description="Main body content of the email")
     
-    llm = ChatOpenAI(
-        model=settings.OPENAI_MODEL,
-        api_key=settings.OPENAI_API_KEY,
-        base_url=settings.OPENAI_BASE_URL
-    )
+    # Parsing goes to the cheap parse model; the escalation model gets one try if it fails
+    router = ModelRouter()
     
     parser = JsonOutputParser(pydantic_object=ParsedEmail)
     
-    # Get guardrail rules from security module
-    from backend.core.security import UNSAFE_KEYWORDS
-    guardrail_rules = ", ".join(UNSAFE_KEYWORDS)
+    prompt = PARSE_PROMPT
     
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are an expert email parser with built-in safety filters. Extract the sender email address, subject, and body from raw email content.
-
-SAFETY GUARDRAILS:
-Before parsing, check if the content contains any of these unsafe patterns: {guardrail_rules}
-
-If the content contains ANY of these patterns, you MUST:
-1. Set subject to "UNSAFE_CONTENT_DETECTED"
-2. Set body to "This email was blocked due to safety concerns"
-3. Set sender to "blocked@security.system"
-
-Rules for safe content:
-- If you find "From:" or similar headers, extract the email address
-- If you find "Subject:" extract the subject line
-- The body is the main message content
-- If no clear sender is found, use "unknown@example.com"
-- If no clear subject is found, use the first line or "No Subject"
-- Always extract the complete body content
-- Handle various email formats (Gmail, Outlook, plain text, etc.)"""),
-        ("user", "Parse this raw email content:\n\n{raw_content}\n\n{format_instructions}")
-    ])
-    
-    chain = prompt | llm | parser
+    parse_inputs = {
+        "raw_content": prompt_text,
+        "format_instructions": parser.get_format_instructions()
+    }
+    
+    def parse_raw():
+        try:
+            return (prompt | router.chat_model(TASK_PARSE) | parser).invoke(parse_inputs)
+        except Exception:
+            escalated = router.select(TASK_PARSE, failed_validation=True)
+            if escalated == router.base_model(TASK_PARSE):
+                raise
+            return (prompt | get_chat_model(TASK_PARSE, escalated) | parser).invoke(parse_inputs)
     
     try:
-        parsed = chain.invoke({
-            "raw_content": raw_text,
-            "format_instructions": parser.get_format_instructions(),
-            "guardrail_rules": guardrail_rules
-        })
+        # A webhook retried while the first delivery is still parsing shares its LLM call
+        parsed = single_flight.do(cache_key(TASK_PARSE, PARSE_PROMPT_VERSION, router.base_model(TASK_PARSE), prompt_text), parse_raw)
         
         sender = parsed.get('sender', 'unknown@example.com')
         subject = parsed.get('subject', 'No Subject')
-        body = parsed.get('body', raw_text)
+        body = parsed.get('body', text)
         
-        # Check if LLM detected unsafe content
-        if subject == "UNSAFE_CONTENT_DETECTED":
-            raise HTTPException(status_code=400, detail="Content blocked by AI safety filters")
-        
-    except HTTPException:
-        raise  # Re-raise HTTP exceptions
     except Exception as e:
         # Fallback to simple extraction if LLM fails
-        lines = raw_text.split('\n')
-        sender = "unknown@example.com"
-        subject = lines[0][:100] if lines else "No Subject"
-        body = raw_text
+        if mime:
+            sender = mime.header("From") or "unknown@example.com"
+            subject = mime.header("Subject") or "No Subject"
+        else:
+            sender = "unknown@example.com"
+            subject = text.split('\n', 1)[0][:100] or "No Subject"
+        body = text
     
     # Validate extracted content
     if not body:
@@ -120,36 +194,56 @@ Rules for safe content:
         "sender": sender,
         "subject": subject,
         "body": body,
-        "thread_id": request.thread_id
+        "thread_id": thread_id,
+        # Message-ID/In-Reply-To/References are read from the header block directly
+        **(mime.threading_headers() if mime else extract_threading_headers(raw_text)),
+        "attachments": mime.attachments if mime else []
     }
     
+    # Accepted: attachment blobs go into the store before the rows that point at them are committed
+    if mime:
+        mime.save_attachments()
     processor = EmailProcessor(db)
-    summary = processor.process_email(email_data)
+    summary = processor.process_email_in_order(email_data, defer_on_outage=True)
+    if summary.summary_json is not None and should_pre_generate(summary.summary_json, sender):
+        background_tasks.add_task(pre_generate_reply, summary.email_id)
     
     return {
-        "status": "success",
+        "status": "success" if summary.summary_json is not None else "queued",
         "email_id": summary.email_id,
         "summary": summary.summary_json,
         "parsed_data": {
             "sender": sender,
             "subject": subject,
             "body_preview": body[:200] + "..." if len(body) > 200 else body
-        }
+        },
+        "attachments": [
+            {key: a[key] for key in ("filename", "content_type", "size", "status")}
+            for a in email_data["attachments"]
+        ]
     }
 
 @router.post("/submit")
-def submit_email(email_request: EmailSubmitRequest, db: Session = Depends(get_db)):
+def submit_email(email_request: EmailSubmitRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     # Basic Guardrail
     validate_content(email_request.subject, email_request.body)
     
     processor = EmailProcessor(db)
-    summary = processor.process_email(email_request.model_dump())
+    summary = processor.process_email_in_order(email_request.model_dump(), defer_on_outage=True)
+    if summary.summary_json is None:
+        # Degraded mode: stored, summary queued until the LLM provider is back
+        return {"status": "queued", "email_id": summary.email_id, "summary": None}
+    if should_pre_generate(summary.summary_json, email_request.sender):
+        background_tasks.add_task(pre_generate_reply, summary.email_id)
     return {"status": "success", "email_id": summary.email_id, "summary": summary.summary_json}
 
 @router.get("/{email_id}/summary")
-def get_email_summary(email_id: str, db: Session = Depends(get_db)):
+def get_email_summary(email_id: str, db: Session = Depends(get_read_db)):
     summary = db.query(EmailSummary).filter(EmailSummary.email_id == email_id).first()
     if not summary:
+        if is_pending(db, email_id):
+            # Accepted in degraded mode; the backfill worker has not summarised it yet
+            return JSONResponse(status_code=202, content={"status": "pending", "summary": None})
         raise HTTPException(status_code=404, detail="Summary not found")
     return {"summary": summary.summary_json}
 
@@ -159,24 +253,39 @@ def generate_reply(email_id: str, request: GenerateReplyRequest, db: Session = D
     if not summary:
         raise HTTPException(status_code=404, detail="Summary not found")
     
-    generator = ReplyGenerator()
-    result = generator.generate(
-        summary.summary_json, 
-        tone=request.tone, 
-        instructions=request.instructions
-    )
-    
-    if result["status"] == "error":
-        # Do not save to DB
-        raise HTTPException(status_code=400, detail=f"Reply generation failed: {result['error']}")
-    
-    reply_text = result["reply"]
+    # A draft pre-generated at ingest time answers instantly when the tone matches
+    draft = take_draft(db, email_id, request.tone) if not request.instructions else None
+    if draft:
+        reply_text = draft.reply_text
+    else:
+        generator = ReplyGenerator()
+        # An agent is waiting on this one: schedule it ahead of background work
+        with use_lane(LANE_INTERACTIVE):
+            try:
+                result = generator.generate(
+                    summary.summary_json, 
+                    tone=request.tone, 
+                    instructions=request.instructions
+                )
+            except LLM_UNAVAILABLE_ERRORS as e:
+                retry_after = e.retry_after if isinstance(e, CircuitOpenError) else settings.LLM_CIRCUIT_RECOVERY_SECONDS
+                raise HTTPException(
+                    status_code=503,
+                    detail="Reply generation is temporarily unavailable",
+                    headers={"Retry-After": str(max(1, round(retry_after)))}
+                )
+        
+        if result["status"] == "error":
+            # Do not save to DB
+            raise HTTPException(status_code=400, detail=f"Reply generation failed: {result['error']}")
+        
+        reply_text = result["reply"]
     
     # Store reply
-    existing_reply = db.query(GeneratedReply).filter(GeneratedReply.email_id == email_id).first()
-    if existing_reply:
-        existing_reply.reply_text = reply_text
-        existing_reply.tone = request.tone
+    reply = db.query(GeneratedReply).filter(GeneratedReply.email_id == email_id).first()
+    if reply:
+        reply.reply_text = reply_text
+        reply.tone = request.tone
     else:
         reply = GeneratedReply(
             email_id=email_id,
@@ -185,13 +294,30 @@ def generate_reply(email_id: str, request: GenerateReplyRequest, db: Session = D
         )
         db.add(reply)
     
+    # auto_send hands the reply to the outbox; the sender worker delivers it
+    if request.auto_send:
+        try:
+            enqueue_reply(db, reply)
+        except ReplyAlreadySent as e:
+            # Keep the stored reply matching what the customer received
+            db.rollback()
+            raise HTTPException(status_code=409, detail=str(e))
+    
+    # The thread document shows the reply, so it is rewritten in the same transaction
+    email = db.get(Email, email_id)
+    email_thread_id = email.thread_id if email else None
+    refresh_thread_documents(db, [email_thread_id])
     db.commit()
     
     # Return thread_id, email_id along with reply
     thread_id = summary.summary_json.get("thread_info", {}).get("thread_id")
+    recent_writes.note(email_id, thread_id)
+    event_bus.publish(REPLY, email_thread_id or thread_id, email_id, "queued" if request.auto_send else "generated")
     
     return {
         "email_id": email_id,
         "thread_id": thread_id,
-        "reply": reply_text
+        "reply": reply_text,
+        "pre_generated": draft is not None,
+        "delivery_status": reply.delivery_status
     }
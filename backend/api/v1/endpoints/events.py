@@ -0,0 +1,53 @@
+from typing import Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from backend.core.config import settings
+from backend.core.events import RESYNC, event_bus
+
+router = APIRouter()
+ws_router = APIRouter()
+
+@router.get("/")
+def list_events(since: Optional[int] = None):
+    """
+    Change events after `since`, for clients that poll instead of holding a
+    WebSocket. Served from memory: no database reads. `resync` means events
+    were missed (or no `since` was given) and the client should reload what
+    it shows; `seq` is where to continue from.
+    """
+    events = event_bus.since(since) if since is not None else None
+    return {"seq": event_bus.last_seq, "resync": events is None, "events": events or []}
+
+@ws_router.websocket("/ws/events")
+async def stream_events(websocket: WebSocket, since: Optional[int] = None):
+    """
+    Pushes change events as JSON messages. With `since`, events missed after
+    that sequence number are sent first (or a resync event if they are gone).
+    A ping carrying the sequence number of the last event sent follows, and
+    is repeated whenever the socket is idle.
+    """
+    await websocket.accept()
+    # Subscribed before the backlog is read, so nothing published in between is lost
+    subscription = event_bus.subscribe()
+    try:
+        sent = event_bus.last_seq if since is None else since
+        if since is not None:
+            backlog = event_bus.since(since)
+            if backlog is None:
+                sent = event_bus.last_seq
+                await websocket.send_json({"type": RESYNC, "seq": sent})
+            for event in backlog or []:
+                await websocket.send_json(event)
+                sent = event["seq"]
+        await websocket.send_json({"type": "ping", "seq": sent})
+        while True:
+            event = await subscription.get(timeout=settings.EVENTS_PING_INTERVAL)
+            if event is None:
+                await websocket.send_json({"type": "ping", "seq": sent})
+            elif event["type"] == RESYNC or event["seq"] > sent:
+                await websocket.send_json(event)
+                sent = event["seq"]
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_bus.unsubscribe(subscription)
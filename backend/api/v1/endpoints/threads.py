@@ -1,46 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from backend.db.database import get_db
-from backend.db.models import Thread, Email
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
-from datetime import datetime
+from backend.core.archive import load_archived_thread
+from backend.core.thread_documents import ThreadResponse, load_thread_document, render_thread
+from backend.db.database import get_read_db
+from backend.db.models import Thread
+from typing import List
 
 router = APIRouter()
 
-class GeneratedReplyResponse(BaseModel):
-    id: int
-    reply_text: str
-    tone: str
-    created_at: datetime
-    
-    model_config = ConfigDict(from_attributes=True)
-
-class EmailResponse(BaseModel):
-    id: str
-    sender: str
-    subject: str
-    body: str
-    received_at: datetime
-    reply: Optional[GeneratedReplyResponse] = None
-    
-    model_config = ConfigDict(from_attributes=True)
-
-class ThreadResponse(BaseModel):
-    id: str
-    created_at: datetime
-    emails: List[EmailResponse]
-    
-    model_config = ConfigDict(from_attributes=True)
-
 @router.get("/", response_model=List[ThreadResponse])
-def list_threads(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def list_threads(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     threads = db.query(Thread).offset(skip).limit(limit).all()
     return threads
 
 @router.get("/{thread_id}", response_model=ThreadResponse)
-def get_thread(thread_id: str, db: Session = Depends(get_db)):
-    thread = db.query(Thread).filter(Thread.id == thread_id).first()
-    if not thread:
-        raise HTTPException(status_code=404, detail="Thread not found")
-    return thread
+def get_thread(thread_id: str, request: Request, db: Session = Depends(get_read_db)):
+    # Served from the pre-serialised document: no ORM hydration or response validation
+    document = load_thread_document(db, thread_id)
+    if document is None:
+        # Threads written before documents existed (or imported in bulk) are rendered on the fly
+        body = render_thread(db, thread_id)
+        if body is None:
+            # Idle threads live in the cold archive
+            body = load_archived_thread(db, thread_id)
+        if body is None:
+            raise HTTPException(status_code=404, detail="Thread not found")
+        return Response(content=body, media_type="application/json")
+
+    body, body_gzip, etag = document
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if body_gzip is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(content=body_gzip, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,125 @@
+import argparse
+import logging
+import sys
+
+from backend.mail.importer import FORMATS
+
+
+def _print_progress(report: dict):
+    print(
+        f"read {report['read']:>9,}  imported {report['imported']:>9,}  "
+        f"skipped {report['duplicate'] + report['unsafe'] + report['invalid']:>7,}  "
+        f"threads {report['threads']:>8,}  {report['messages_per_second']:>8,.0f} msg/s",
+        file=sys.stderr,
+    )
+
+
+def import_mail(args):
+    from backend.db.database import Base, SessionLocal, engine
+    from backend.mail.importer import MailImporter, summarize_threads
+
+    Base.metadata.create_all(bind=engine)
+    importer = MailImporter(SessionLocal, batch_size=args.batch_size)
+    # Only collected when they are summarised afterwards
+    thread_ids = set()
+    report = importer.run(args.path, fmt=args.format, limit=args.limit, restart=args.restart,
+                          on_progress=_print_progress, on_batch=thread_ids.update if args.summarize else None)
+    print(
+        f"Imported {report['imported']:,} of {report['read']:,} messages into {report['threads']:,} new threads "
+        f"in {report['elapsed_seconds']:.1f}s ({report['messages_per_second']:,.0f} msg/s); skipped "
+        f"{report['duplicate']:,} duplicate, {report['unsafe']:,} unsafe, {report['invalid']:,} unparseable"
+    )
+
+    if thread_ids:
+        print(f"Summarising {len(thread_ids):,} threads...", file=sys.stderr)
+        written = summarize_threads(SessionLocal, thread_ids, args.summary_concurrency)
+        print(f"Wrote {written:,} thread summaries")
+
+
+def _print_resummarize_progress(report: dict):
+    print(
+        f"resummarized {report['resummarized']:>9,} of {report['stale']:>9,}  failed {report['failed']:>6,}  "
+        f"remaining {report['remaining']:>9,}  {report['summaries_per_second']:>6,.2f} summaries/s",
+        file=sys.stderr,
+    )
+
+
+def resummarize(args):
+    from backend.ai.resummarize import Resummarizer, current_stamp
+    from backend.db.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    resummarizer = Resummarizer(SessionLocal, priority=args.priority, concurrency=args.concurrency,
+                                batch_size=args.batch_size)
+    prompt_version, model = current_stamp()
+    if args.dry_run:
+        print(f"{resummarizer.count_stale():,} summaries not written by {model} with {prompt_version}")
+        return
+    report = resummarizer.run(limit=args.limit, on_progress=_print_resummarize_progress)
+    print(
+        f"Re-summarised {report['resummarized']:,} of {report['stale']:,} stale summaries with {model} / "
+        f"{prompt_version} in {report['elapsed_seconds']:.1f}s ({report['summaries_per_second']:,.2f}/s); "
+        f"{report['failed']:,} failed, {report['remaining']:,} remaining"
+    )
+
+
+def archive_threads(args):
+    from backend.core.archive import ThreadArchiver
+    from backend.db.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    archiver = ThreadArchiver(SessionLocal, after_days=args.older_than, backend=args.backend)
+    archived = archiver.run_once()
+    print(f"Archived {archived:,} threads idle for more than {archiver.after_days} days ({archiver.backend})")
+
+
+def refresh_analytics(args):
+    from backend.core.analytics import RollupRefresher
+    from backend.db.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    days = RollupRefresher(SessionLocal).run_once(full=args.full)
+    print(f"Rebuilt analytics rollups for {days:,} days")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.cli", description="Maintenance commands.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Bulk-import an mbox file, Maildir or directory of .eml files")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=FORMATS, help="Detected from the path when omitted")
+    importer.add_argument("--batch-size", type=int, help="Messages per insert batch (IMPORT_BATCH_SIZE)")
+    importer.add_argument("--limit", type=int, help="Stop after this many messages; the next run resumes")
+    importer.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+    importer.add_argument("--summarize", action="store_true", help="Summarise the latest email of every imported thread")
+    importer.add_argument("--summary-concurrency", type=int, help="Parallel summaries (IMPORT_SUMMARY_CONCURRENCY)")
+    importer.set_defaults(func=import_mail)
+
+    resummarizer = commands.add_parser(
+        "resummarize", help="Rewrite summaries written by another summary model or prompt version"
+    )
+    resummarizer.add_argument("--priority", choices=["recent", "unreplied", "oldest"], default="recent",
+                              help="Order in which stale summaries are rewritten")
+    resummarizer.add_argument("--limit", type=int, help="Stop after this many summaries; the next run continues")
+    resummarizer.add_argument("--concurrency", type=int, help="Parallel summaries (RESUMMARIZE_CONCURRENCY)")
+    resummarizer.add_argument("--batch-size", type=int, help="Summaries per batch (RESUMMARIZE_BATCH_SIZE)")
+    resummarizer.add_argument("--dry-run", action="store_true", help="Only count the stale summaries")
+    resummarizer.set_defaults(func=resummarize)
+
+    archive = commands.add_parser("archive", help="Move idle threads out of the hot tables into the cold archive")
+    archive.add_argument("--older-than", type=int, help="Days since a thread's last email (ARCHIVE_AFTER_DAYS)")
+    archive.add_argument("--backend", choices=["table", "segments"], help="Where archived threads go (ARCHIVE_BACKEND)")
+    archive.set_defaults(func=archive_threads)
+
+    analytics = commands.add_parser("analytics-refresh", help="Bring the analytics rollups up to date")
+    analytics.add_argument("--full", action="store_true", help="Rebuild every day, not only the changed ones")
+    analytics.set_defaults(func=refresh_analytics)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
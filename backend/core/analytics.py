@@ -0,0 +1,226 @@
+import logging
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import and_, delete, distinct, func, insert, or_, select, union
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.db.models import AnalyticsRefreshState, DailyEmailRollup, Email, EmailSummary, GeneratedReply
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_STATE = "analytics_daily"
+# Summaries and replies committed while a refresh runs are picked up by the next one
+REFRESH_OVERLAP = timedelta(minutes=5)
+DIMENSIONS = ("intent", "sentiment", "urgency")
+GROUP_BY_DAY = "day"
+GROUP_BY_SENDER = "sender"
+
+
+def _label(path) -> object:
+    # Models are inconsistent about case ("Positive" / "positive"); missing values group as "unknown"
+    return func.lower(func.coalesce(EmailSummary.summary_json[path].as_string(), "unknown"))
+
+
+def _seconds_between(later, earlier, dialect: str):
+    if dialect == "postgresql":
+        return func.extract("epoch", later - earlier)
+    return (func.julianday(later) - func.julianday(earlier)) * 86400.0
+
+
+def _as_date(value) -> date:
+    # func.date() comes back as text on SQLite
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _received_on(days: List[date]):
+    """received_at filter for the given days, as ranges over contiguous runs so the index is usable."""
+    runs = []
+    for day in sorted(days):
+        if runs and runs[-1][1] == day:
+            runs[-1][1] = day + timedelta(days=1)
+        else:
+            runs.append([day, day + timedelta(days=1)])
+    return or_(*(
+        and_(Email.received_at >= datetime.combine(start, time.min), Email.received_at < datetime.combine(end, time.min))
+        for start, end in runs
+    ))
+
+
+def refresh_rollups(db: Session, full: bool = False) -> int:
+    """
+    Rebuilds the rollup rows of every day that gained a summary or a reply,
+    or had a summary rewritten, since the last refresh (all days on the
+    first run or with `full`).
+    The aggregation runs in the database over the summary JSON; each
+    refresh touches only the emails of the affected days, found through the
+    indexed timestamps. Returns the number of days rebuilt.
+    """
+    now = datetime.now(timezone.utc)
+    state = db.get(AnalyticsRefreshState, ROLLUP_STATE) or AnalyticsRefreshState(name=ROLLUP_STATE)
+    day = func.date(Email.received_at)
+
+    days: Optional[List[date]] = None
+    if not full and state.refreshed_at is not None:
+        since = state.refreshed_at - REFRESH_OVERLAP
+        # One indexed range scan per kind of change rather than an OR across joined tables
+        changed = union(
+            select(day).join(EmailSummary, EmailSummary.email_id == Email.id).where(EmailSummary.created_at >= since),
+            select(day).join(EmailSummary, EmailSummary.email_id == Email.id).where(EmailSummary.updated_at >= since),
+            select(day).join(GeneratedReply, GeneratedReply.email_id == Email.id).where(GeneratedReply.created_at >= since),
+        )
+        days = [_as_date(value) for value in db.scalars(changed) if value is not None]
+
+    if days is None:
+        db.execute(delete(DailyEmailRollup))
+    elif days:
+        db.execute(delete(DailyEmailRollup).where(DailyEmailRollup.day.in_(days)))
+
+    if days is None or days:
+        dialect = db.get_bind().dialect.name
+        turnaround = _seconds_between(GeneratedReply.created_at, Email.received_at, dialect)
+        intent = _label(("classification", "intent"))
+        sentiment = _label(("sentiment", "label"))
+        urgency = _label(("urgency", "level"))
+        rollup = (
+            select(
+                day,
+                Email.sender,
+                intent,
+                sentiment,
+                urgency,
+                func.count(Email.id),
+                func.coalesce(func.sum(EmailSummary.summary_json[("sentiment", "score")].as_float()), 0.0),
+                func.count(GeneratedReply.id),
+                func.coalesce(func.sum(turnaround), 0.0),
+            )
+            .join(EmailSummary, EmailSummary.email_id == Email.id)
+            .outerjoin(GeneratedReply, GeneratedReply.email_id == Email.id)
+            .group_by(day, Email.sender, intent, sentiment, urgency)
+        )
+        if days is not None:
+            rollup = rollup.where(_received_on(days))
+        db.execute(insert(DailyEmailRollup).from_select([
+            DailyEmailRollup.day,
+            DailyEmailRollup.sender,
+            DailyEmailRollup.intent,
+            DailyEmailRollup.sentiment,
+            DailyEmailRollup.urgency,
+            DailyEmailRollup.emails,
+            DailyEmailRollup.sentiment_score_sum,
+            DailyEmailRollup.replied,
+            DailyEmailRollup.turnaround_seconds_sum,
+        ], rollup))
+
+    state.refreshed_at = now
+    db.add(state)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent refresh rebuilt the same days first
+        db.rollback()
+        return 0
+    if days is None:
+        return db.scalar(select(func.count(distinct(DailyEmailRollup.day))))
+    return len(days)
+
+
+class RollupRefresher:
+    """Keeps the analytics rollups current in the background, so reading them never writes."""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+
+    def run_once(self, full: bool = False) -> int:
+        db = self.session_factory()
+        try:
+            return refresh_rollups(db, full=full)
+        finally:
+            db.close()
+
+    def run_forever(self, poll_interval: Optional[float] = None):
+        interval = poll_interval if poll_interval is not None else settings.ANALYTICS_REFRESH_INTERVAL
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Analytics rollup refresh failed")
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def query_analytics(
+    db: Session,
+    start: date,
+    end: date,
+    group_by: str = GROUP_BY_DAY,
+    sender: Optional[str] = None,
+    limit: int = 100,
+) -> dict:
+    """
+    Aggregates the rollup table (never the emails themselves) for a date
+    range: totals plus intent/sentiment/urgency mixes, per day or per sender.
+    """
+    filters = [DailyEmailRollup.day >= start, DailyEmailRollup.day <= end]
+    if sender:
+        filters.append(DailyEmailRollup.sender == sender)
+    key = DailyEmailRollup.day if group_by == GROUP_BY_DAY else DailyEmailRollup.sender
+
+    totals = (
+        func.sum(DailyEmailRollup.emails),
+        func.sum(DailyEmailRollup.replied),
+        func.sum(DailyEmailRollup.sentiment_score_sum),
+        func.sum(DailyEmailRollup.turnaround_seconds_sum),
+    )
+    grouped = select(key, *totals).where(*filters).group_by(key)
+    if group_by == GROUP_BY_DAY:
+        grouped = grouped.order_by(key)
+    else:
+        # Busiest senders first
+        grouped = grouped.order_by(func.sum(DailyEmailRollup.emails).desc(), key).limit(limit)
+
+    rows = {}
+    for value, emails, replied, sentiment_sum, turnaround_sum in db.execute(grouped):
+        rows[value] = _stats(emails, replied, sentiment_sum, turnaround_sum)
+    overall = _stats(*db.execute(select(*totals).where(*filters)).one())
+
+    for dimension in DIMENSIONS:
+        column = getattr(DailyEmailRollup, dimension)
+        mix = select(key, column, func.sum(DailyEmailRollup.emails)).where(*filters)
+        if group_by == GROUP_BY_SENDER:
+            mix = mix.where(key.in_(list(rows)))
+        for value, label, count in db.execute(mix.group_by(key, column)):
+            rows[value][dimension][label] = int(count)
+        for label, count in db.execute(select(column, func.sum(DailyEmailRollup.emails)).where(*filters).group_by(column)):
+            overall[dimension][label] = int(count)
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group_by": group_by,
+        "totals": overall,
+        "rows": [
+            {group_by: value.isoformat() if isinstance(value, date) else value, **stats}
+            for value, stats in rows.items()
+        ],
+    }
+
+
+def _stats(emails, replied, sentiment_sum, turnaround_sum) -> dict:
+    emails = int(emails or 0)
+    replied = int(replied or 0)
+    return {
+        "emails": emails,
+        "replied": replied,
+        "avg_sentiment": round(sentiment_sum / emails, 3) if emails and sentiment_sum is not None else None,
+        "avg_turnaround_seconds": round(turnaround_sum / replied, 1) if replied and turnaround_sum is not None else None,
+        "intent": {},
+        "sentiment": {},
+        "urgency": {},
+    }
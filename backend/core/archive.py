@@ -0,0 +1,403 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import zstandard
+from sqlalchemy import Date, DateTime, and_, delete, func, insert, or_, select, text, true
+from sqlalchemy.orm import Session, selectinload
+
+from backend.core.config import settings
+from backend.core.events import THREAD, event_bus
+from backend.core.metrics import metrics
+from backend.core.thread_documents import ThreadResponse
+from backend.db.models import (
+    ArchivedMessageId,
+    ArchivedThread,
+    Attachment,
+    DraftReply,
+    Email,
+    EmailSummary,
+    GeneratedReply,
+    OutboxMessage,
+    PendingSummary,
+    Thread,
+    ThreadDocument,
+)
+
+logger = logging.getLogger(__name__)
+
+BACKEND_TABLE = "table"
+BACKEND_SEGMENTS = "segments"
+
+
+class SegmentStore:
+    """
+    Append-only archive files, one per month (`2025-03.jsonl.zst`). Each
+    thread is one zstd frame holding one JSON line, so the file is valid
+    zstd-compressed JSONL and a single thread is read back by (offset,
+    length) without touching the rest of the segment.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def append(self, period: date, frames: List[bytes]) -> List[Tuple[str, int, int]]:
+        segment = f"{period:%Y-%m}.jsonl.zst"
+        os.makedirs(self.directory, exist_ok=True)
+        locations = []
+        with self._lock, open(os.path.join(self.directory, segment), "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            for frame in frames:
+                f.write(frame)
+                locations.append((segment, offset, len(frame)))
+                offset += len(frame)
+            f.flush()
+            # On disk before the hot rows are deleted; a crash in between leaves an unreferenced frame
+            os.fsync(f.fileno())
+        return locations
+
+    def truncate(self, locations: List[Tuple[str, int, int]]):
+        """
+        Drops frames appended by a batch that was rolled back. A segment is
+        cut back only when those frames are still at its end; otherwise they
+        stay behind, unreferenced.
+        """
+        ends: Dict[str, Tuple[int, int]] = {}
+        for segment, offset, length in locations:
+            start, end = ends.get(segment, (offset, offset))
+            ends[segment] = (min(start, offset), max(end, offset + length))
+        with self._lock:
+            for segment, (start, end) in ends.items():
+                path = os.path.join(self.directory, segment)
+                if os.path.exists(path) and os.path.getsize(path) == end:
+                    os.truncate(path, start)
+
+    def read(self, segment: str, offset: int, length: int) -> bytes:
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot archive {type(value).__name__}")
+
+
+def _columns(row) -> dict:
+    return {column.key: getattr(row, column.key) for column in row.__table__.columns}
+
+
+def thread_record(thread: Thread) -> dict:
+    """Everything kept about an archived thread, shaped as a superset of ThreadResponse."""
+    emails = []
+    for email in sorted(thread.emails, key=lambda e: (e.received_at, e.id)):
+        record = _columns(email)
+        record["summary"] = _columns(email.summary) if email.summary else None
+        record["reply"] = _columns(email.reply) if email.reply else None
+        record["attachments"] = [_columns(a) for a in email.attachments]
+        emails.append(record)
+    return {**_columns(thread), "emails": emails}
+
+
+def _compress(record: dict) -> bytes:
+    line = json.dumps(record, default=_json_default, separators=(",", ":")).encode() + b"\n"
+    return zstandard.ZstdCompressor(level=settings.ARCHIVE_ZSTD_LEVEL).compress(line)
+
+
+def _month(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _archived_record(db: Session, thread_id: str, directory: Optional[str] = None) -> Optional[dict]:
+    """
+    The archived record of a thread, or None. A thread archived more than
+    once (before restoring existed) has a row per archival; their emails are merged.
+    """
+    rows = db.execute(
+        select(ArchivedThread.payload, ArchivedThread.segment, ArchivedThread.offset, ArchivedThread.length)
+        .where(ArchivedThread.thread_id == thread_id)
+        .order_by(ArchivedThread.period, ArchivedThread.archived_at)
+    ).all()
+    if not rows:
+        return None
+    segments = SegmentStore(directory or settings.ARCHIVE_DIR)
+    records = []
+    for row in rows:
+        frame = row.payload if row.payload is not None else segments.read(row.segment, row.offset, row.length)
+        records.append(json.loads(zstandard.ZstdDecompressor().decompress(frame)))
+    return _merge_records(records)
+
+
+def _merge_records(records: List[dict]) -> dict:
+    emails = {email["id"]: email for record in records for email in record["emails"]}
+    return {**records[-1], "emails": sorted(emails.values(), key=_email_order)}
+
+
+def _email_order(email: dict):
+    # Archived records hold ISO strings, a thread being archived holds datetimes
+    received_at = email["received_at"]
+    return received_at.isoformat() if isinstance(received_at, datetime) else received_at or "", email["id"]
+
+
+def _restore_row(model, record: dict):
+    values = {}
+    for column in model.__table__.columns:
+        value = record.get(column.key)
+        # Timestamps come back from the JSON record as ISO strings
+        if isinstance(value, str) and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif isinstance(value, str) and isinstance(column.type, Date):
+            value = date.fromisoformat(value)
+        values[column.key] = value
+    return model(**values)
+
+
+def load_archived_thread(db: Session, thread_id: str, directory: Optional[str] = None) -> Optional[bytes]:
+    """GET /threads/{id} body of an archived thread, or None if it is not archived."""
+    record = _archived_record(db, thread_id, directory)
+    if record is None:
+        return None
+    metrics.incr("archive_reads")
+    return ThreadResponse.model_validate(record).model_dump_json().encode()
+
+
+def restore_archived_thread(db: Session, thread_id: str, directory: Optional[str] = None) -> Optional[Thread]:
+    """
+    Moves an archived thread back into the hot tables (thread, emails,
+    summaries, replies, attachment metadata), e.g. when new mail arrives
+    for it. Not committed: the caller commits it with the new email.
+    Returns the thread, or None if it is not archived.
+    """
+    record = _archived_record(db, thread_id, directory)
+    if record is None:
+        return None
+    thread = _restore_row(Thread, record)
+    db.add(thread)
+    for email in record["emails"]:
+        db.add(_restore_row(Email, email))
+        if email["summary"]:
+            db.add(_restore_row(EmailSummary, email["summary"]))
+        if email["reply"]:
+            db.add(_restore_row(GeneratedReply, email["reply"]))
+        for attachment in email["attachments"]:
+            db.add(_restore_row(Attachment, attachment))
+    # Segment frames are append-only; the one left behind is simply no longer referenced
+    db.execute(delete(ArchivedThread).where(ArchivedThread.thread_id == thread_id))
+    db.execute(delete(ArchivedMessageId).where(ArchivedMessageId.thread_id == thread_id))
+    metrics.incr("archive_restored")
+    return thread
+
+
+class ThreadArchiver:
+    """
+    Moves threads whose last email is older than `after_days` out of the hot
+    tables (emails, summaries, replies, attachments metadata, drafts,
+    delivered outbox rows, thread documents) into the cold archive, a batch
+    per transaction. Threads with a queued summary or an undelivered reply
+    stay hot until that work is done.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        after_days: Optional[int] = None,
+        backend: Optional[str] = None,
+        directory: Optional[str] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self.after_days = after_days if after_days is not None else settings.ARCHIVE_AFTER_DAYS
+        self.backend = backend or settings.ARCHIVE_BACKEND
+        if self.backend not in (BACKEND_TABLE, BACKEND_SEGMENTS):
+            raise ValueError(f"Unknown archive backend: {self.backend}")
+        self.segments = SegmentStore(directory or settings.ARCHIVE_DIR)
+        self.batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+        self._stop = threading.Event()
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Archives every eligible thread; returns how many were archived."""
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=self.after_days)
+        total = 0
+        db = self.session_factory()
+        try:
+            while not self._stop.is_set():
+                archived = self.archive_batch(db, cutoff)
+                total += archived
+                if archived < self.batch_size:
+                    break
+        finally:
+            db.close()
+        return total
+
+    def run_forever(self, poll_interval: Optional[float] = None):
+        interval = poll_interval if poll_interval is not None else settings.ARCHIVE_INTERVAL
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Thread archival failed")
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def archive_batch(self, db: Session, cutoff: datetime) -> int:
+        candidates = self._candidates(db, cutoff)
+        if not candidates:
+            return 0
+        # Lock the threads (store_email locks them too), then check again under the lock:
+        # mail may have arrived, or work been queued, since the candidates were picked
+        locked = db.scalars(select(Thread.id).where(Thread.id.in_(list(candidates))).with_for_update()).all()
+        candidates = self._candidates(db, cutoff, locked) if locked else {}
+        if not candidates:
+            db.rollback()
+            return 0
+        thread_ids = list(candidates)
+        threads = (
+            db.query(Thread)
+            .options(selectinload(Thread.emails).selectinload(Email.summary),
+                     selectinload(Thread.emails).selectinload(Email.reply),
+                     selectinload(Thread.emails).selectinload(Email.attachments))
+            .filter(Thread.id.in_(thread_ids))
+            .all()
+        )
+
+        # Threads that went hot again without being restored keep their earlier archived emails
+        rearchived = set(db.scalars(
+            select(ArchivedThread.thread_id).where(ArchivedThread.thread_id.in_(thread_ids)).distinct()
+        ))
+        by_period: Dict[date, List[Tuple[Thread, dict]]] = {}
+        for thread in threads:
+            record = thread_record(thread)
+            if thread.id in rearchived:
+                record = _merge_records([_archived_record(db, thread.id, self.segments.directory), record])
+            by_period.setdefault(_month(candidates[thread.id][0]), []).append((thread, record))
+        if rearchived:
+            db.execute(delete(ArchivedThread).where(ArchivedThread.thread_id.in_(list(rearchived))))
+            db.execute(delete(ArchivedMessageId).where(ArchivedMessageId.thread_id.in_(list(rearchived))))
+
+        archived_emails = 0
+        written = []
+        try:
+            for period, items in by_period.items():
+                archived_emails += self._write_period(db, period, items, candidates, written)
+            archived_ids = [thread.id for thread in threads]
+            # Only the emails loaded into the records above are removed from the hot tables
+            self._delete_hot(db, archived_ids, [email.id for thread in threads for email in thread.emails])
+            db.commit()
+        except BaseException:
+            db.rollback()
+            # Frames of a rolled-back batch are referenced by nothing
+            self.segments.truncate(written)
+            raise
+        metrics.incr("archive_threads", len(threads), backend=self.backend)
+        metrics.incr("archive_emails", archived_emails, backend=self.backend)
+        for thread_id in archived_ids:
+            # Gone from the thread list; GET /threads/{id} still serves it from the archive
+            event_bus.publish(THREAD, thread_id, status="archived")
+        return len(threads)
+
+    def _write_period(self, db: Session, period: date, items: List[Tuple[Thread, dict]],
+                      candidates: Dict[str, Tuple[datetime, int]], written: list) -> int:
+        self._ensure_partition(db, period)
+        frames = [_compress(record) for _, record in items]
+        if self.backend == BACKEND_SEGMENTS:
+            locations = self.segments.append(period, frames)
+            written.extend(locations)
+        else:
+            locations = [None] * len(items)
+        archived_emails = 0
+        for (thread, record), frame, location in zip(items, frames, locations):
+            last_received_at, email_count = candidates[thread.id]
+            row = ArchivedThread(thread_id=thread.id, period=period, last_received_at=last_received_at,
+                                 email_count=len(record["emails"]))
+            if location is None:
+                row.payload = frame
+            else:
+                row.segment, row.offset, row.length = location
+            db.add(row)
+            message_ids = {email["message_id"] for email in record["emails"] if email["message_id"]}
+            if message_ids:
+                db.execute(insert(ArchivedMessageId), [
+                    {"thread_id": thread.id, "message_id": message_id} for message_id in message_ids
+                ])
+            archived_emails += email_count
+        return archived_emails
+
+    def _candidates(self, db: Session, cutoff: datetime,
+                    thread_ids: Optional[List[str]] = None) -> Dict[str, Tuple[datetime, int]]:
+        last_received = func.max(Email.received_at)
+        queued_summaries = (
+            select(Email.thread_id)
+            .join(PendingSummary, PendingSummary.email_id == Email.id)
+            .where(PendingSummary.status == "pending")
+        )
+        undelivered = (
+            select(Email.thread_id)
+            .join(GeneratedReply, GeneratedReply.email_id == Email.id)
+            .join(OutboxMessage, OutboxMessage.reply_id == GeneratedReply.id)
+            .where(OutboxMessage.status.in_(["queued", "sending"]))
+        )
+        rows = db.execute(
+            select(Email.thread_id, last_received, func.count(Email.id))
+            .where(Email.thread_id.isnot(None))
+            .where(Email.thread_id.notin_(queued_summaries), Email.thread_id.notin_(undelivered))
+            .where(Email.thread_id.in_(thread_ids) if thread_ids is not None else true())
+            .group_by(Email.thread_id)
+            .having(last_received < cutoff)
+            .order_by(last_received)
+            .limit(self.batch_size)
+        ).all()
+        return {thread_id: (last, count) for thread_id, last, count in rows}
+    def _delete_hot(self, db: Session, thread_ids: List[str], email_ids: List[str]):
+        reply_ids = select(GeneratedReply.id).where(GeneratedReply.email_id.in_(email_ids))
+        # Children first: the hot tables keep their foreign keys. Undelivered replies and queued
+        # summaries are left in place, so their foreign keys fail the batch rather than lose them
+        db.execute(delete(OutboxMessage).where(OutboxMessage.reply_id.in_(reply_ids),
+                                               OutboxMessage.status.notin_(["queued", "sending"])))
+        db.execute(delete(PendingSummary).where(PendingSummary.email_id.in_(email_ids),
+                                                PendingSummary.status != "pending"))
+        db.execute(delete(DraftReply).where(or_(
+            DraftReply.email_id.in_(email_ids),
+            and_(DraftReply.thread_id.in_(thread_ids), DraftReply.email_id.is_(None)),
+        )))
+        for model in (Attachment, EmailSummary, GeneratedReply):
+            db.execute(delete(model).where(model.email_id.in_(email_ids)))
+        db.execute(delete(ThreadDocument).where(ThreadDocument.thread_id.in_(thread_ids)))
+        db.execute(delete(Email).where(Email.id.in_(email_ids)))
+        # A thread that still has an email (stored without waiting for the lock) stays hot
+        db.execute(delete(Thread).where(Thread.id.in_(thread_ids),
+                                        ~select(Email.id).where(Email.thread_id == Thread.id).exists()))
+
+    def _ensure_partition(self, db: Session, period: date):
+        if db.get_bind().dialect.name != "postgresql":
+            return
+        following = (period + timedelta(days=32)).replace(day=1)
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS archived_threads_{period:%Y_%m} PARTITION OF archived_threads "
+            f"FOR VALUES FROM ('{period.isoformat()}') TO ('{following.isoformat()}')"
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move idle threads from the hot tables into the cold archive.")
+    parser.add_argument("--once", action="store_true", help="Archive what is eligible now and exit")
+    args = parser.parse_args()
+
+    from backend.db.database import SessionLocal
+    logging.basicConfig(level=logging.INFO)
+    archiver = ThreadArchiver(SessionLocal)
+    if args.once:
+        print(f"Archived {archiver.run_once()} threads")
+    else:
+        archiver.run_forever()
+
+
+if __name__ == "__main__":
+    main()
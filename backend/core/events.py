@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+from backend.core.config import settings
+from backend.core.metrics import metrics
+
+# Event types; `status` says what happened to the entity
+EMAIL = "email"        # stored
+SUMMARY = "summary"    # ready, queued, failed, updated
+REPLY = "reply"        # generated, queued, sent, failed
+DRAFT = "draft"        # ready
+THREAD = "thread"      # archived
+RESYNC = "resync"      # the subscriber missed events and must reload
+
+
+class Subscription:
+    """Events for one subscriber, handed to its event loop from any thread."""
+
+    def __init__(self, bus: "EventBus", loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.bus = bus
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def deliver(self, event: dict):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The subscriber's loop has closed; it is unsubscribed on its way out
+            pass
+
+    def _put(self, event: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow consumer gets one resync instead of an unbounded backlog
+            self.overflowed = True
+            metrics.incr("events_dropped")
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """The next event, a resync event after an overflow, or None on timeout."""
+        if self.overflowed and self.queue.empty():
+            self.overflowed = False
+            return {"type": RESYNC, "seq": self.bus.last_seq}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """
+    In-process publish/subscribe of compact change events, so clients learn
+    what changed instead of re-reading everything to find out. Events are
+    published after the change is committed and carry only ids and a
+    status; subscribers read the changed thread or summary if they need it.
+
+    Every event has a sequence number. The last `buffer_size` events are
+    kept, so a client that reconnects with the last number it saw gets what
+    it missed, or a resync event if that has already been dropped.
+    """
+
+    def __init__(self, buffer_size: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_queue = max_queue or settings.EVENTS_SUBSCRIBER_QUEUE
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._recent = deque(maxlen=buffer_size or settings.EVENTS_BUFFER_SIZE)
+        self._subscribers = set()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def publish(self, type: str, thread_id: Optional[str] = None, email_id: Optional[str] = None,
+                status: Optional[str] = None) -> dict:
+        with self._lock:
+            self._seq += 1
+            event = {"seq": self._seq, "type": type, "thread_id": thread_id, "email_id": email_id,
+                     "status": status, "at": round(time.time(), 3)}
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.deliver(event)
+        metrics.incr("events_published", type=type)
+        return event
+
+    def since(self, seq: int) -> Optional[List[dict]]:
+        """Events after `seq`, or None if some of them are no longer buffered."""
+        with self._lock:
+            if seq > self._seq:
+                # From before a restart: the numbering started over
+                return None
+            if seq < self._seq and (not self._recent or self._recent[0]["seq"] > seq + 1):
+                return None
+            return [event for event in self._recent if event["seq"] > seq]
+
+    def subscribe(self) -> Subscription:
+        """Subscribes the running event loop; must be called from within it."""
+        subscription = Subscription(self, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscription)
+            metrics.set_gauge("events_subscribers", len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            metrics.set_gauge("events_subscribers", len(self._subscribers))
+
+
+event_bus = EventBus()
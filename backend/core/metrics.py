@@ -0,0 +1,67 @@
+import threading
+from collections import deque
+from typing import Dict
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry: counters, gauges and timings
+    (count/sum plus percentiles over a recent window). Exposed at `/metrics`.
+    """
+
+    WINDOW = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, dict] = {}
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                timing = self._timings[key] = {"count": 0, "sum": 0.0, "recent": deque(maxlen=self.WINDOW)}
+            timing["count"] += 1
+            timing["sum"] += value
+            timing["recent"].append(value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timings = {}
+            for key, timing in self._timings.items():
+                recent = sorted(timing["recent"])
+                timings[key] = {
+                    "count": timing["count"],
+                    "sum": round(timing["sum"], 6),
+                    "avg": round(timing["sum"] / timing["count"], 6),
+                    "p50": recent[len(recent) // 2],
+                    "p95": recent[min(len(recent) - 1, int(len(recent) * 0.95))],
+                    "max": recent[-1],
+                }
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges), "timings": timings}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,303 @@
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "safety_model.npz")
+
+# Common single words and phrases that also occur in ordinary mail ("cp" the file, "die" casting,
+# "act now" to keep a booking). They never block on their own; the model weighs them in context.
+AMBIGUOUS_KEYWORDS = frozenset({
+    "sexual", "sex", "nude", "naked", "kill", "murder", "suicide", "die", "hate", "racist", "slur", "nazi",
+    "scam", "fraud", "lottery", "winner", "cp", "beneficiary", "limited time offer", "act now",
+    "download attachment", "or else",
+})
+
+# Soft hyphen, zero-width characters and joiners are dropped; lookalike letters map to ASCII
+_INVISIBLE = "\u00ad\u180e\u200b\u200c\u200d\u2060\u2061\u2062\u2063\u2064\ufeff"
+_CONFUSABLES = {
+    # Cyrillic
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "с": "c",
+    "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ї": "i", "ј": "j", "ԁ": "d", "ԛ": "q", "ԝ": "w",
+    "ɡ": "g", "һ": "h", "ӏ": "l", "ո": "n", "ս": "u",
+    # Greek
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t",
+    "υ": "u", "χ": "x", "ω": "w",
+    # Latin lookalikes NFKC leaves alone
+    "ı": "i", "ł": "l", "ø": "o", "đ": "d", "ß": "ss",
+}
+_CLEAN = str.maketrans({**dict.fromkeys(_INVISIBLE, None), **_CONFUSABLES})
+_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g",
+                       "@": "a", "$": "s", "!": "i", "|": "l", "+": "t"})
+_TOKEN = re.compile(r"[\w@$!|+]+")
+_EDGE_SYMBOLS = "!|+_"
+# "s e n d", "s.e.n.d" and "s-e-n-d" are read as one word; a wider gap ends the word
+_SPACED_OUT = re.compile(r"(?<!\S)\S([ ._-])\S(?:\1\S)+\1?(?!\S)")
+
+
+def _plain_token(token: str) -> str:
+    token = token.strip(_EDGE_SYMBOLS)
+    if not any(c.isalpha() for c in token):
+        # Numbers and amounts stay as they are ("24 hours", "$500")
+        return "".join(c for c in token if c.isdigit())
+    return "".join(c for c in token.translate(_LEET) if c.isalnum())
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """
+    Lower-case word tokens of `text` with obfuscation undone: NFKC
+    compatibility forms (full-width, ligatures), Unicode lookalikes,
+    invisible characters, leetspeak inside words and spaced-out letters.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold().translate(_CLEAN)
+    text = _SPACED_OUT.sub(lambda m: m.group().replace(m.group(1), ""), text)
+    tokens = (t if t.isalpha() else _plain_token(t) for t in _TOKEN.findall(text))
+    return [t for t in tokens if t]
+
+
+def normalize(text: str) -> str:
+    return " ".join(normalize_tokens(text))
+
+
+class PhraseRules:
+    """Whole-word matching of the blocking keywords over normalised text."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = {}
+        for keyword in keywords:
+            if keyword not in AMBIGUOUS_KEYWORDS:
+                self.keywords.setdefault(normalize(keyword), keyword)
+        # Longest first, so "child porn" is reported rather than "porn"
+        alternatives = sorted(self.keywords, key=len, reverse=True)
+        self.pattern = re.compile(r"\b(?:" + "|".join(re.escape(a) for a in alternatives) + r")\b")
+        self.max_words = max(len(a.split()) for a in alternatives)
+
+    def match(self, normalized: str) -> Optional[str]:
+        """The original keyword found in `normalized`, if any."""
+        found = self.pattern.search(normalized)
+        return self.keywords[found.group()] if found else None
+
+
+def _hash_tokens(tokens: Sequence[str]) -> np.ndarray:
+    # crc32 is stable across processes, unlike hash(); ~0.1 µs per token
+    return np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint64, count=len(tokens))
+
+
+def _feature_indices(hashes: np.ndarray, n_features: int, first_new: int = 0) -> np.ndarray:
+    """Hashed unigram and bigram buckets of one token sequence; tokens before `first_new` only start bigrams."""
+    unigrams = hashes[first_new:]
+    start = max(first_new, 1)
+    bigrams = (hashes[start - 1:-1] * np.uint64(0x9E3779B1)) ^ hashes[start:] ^ np.uint64(0x5BD1E995)
+    return (np.concatenate([unigrams, bigrams]) % np.uint64(n_features)).astype(np.int64)
+
+
+class SafetyModel:
+    """
+    Logistic regression over hashed word unigrams and bigrams of normalised
+    text. A document's logit is the sum of the weights of its distinct
+    features divided by the square root of their number, plus the bias, so
+    repeating a text does not change its score.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float):
+        self.weights = weights.astype(np.float32)
+        self.bias = float(bias)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.weights)
+
+    def logits(self, doc_ids: np.ndarray, indices: np.ndarray, n_docs: int) -> np.ndarray:
+        sums = np.bincount(doc_ids, weights=self.weights[indices], minlength=n_docs)
+        counts = np.bincount(doc_ids, minlength=n_docs)
+        return sums / np.sqrt(np.maximum(counts, 1)) + self.bias
+
+    def save(self, path: str):
+        nonzero = np.flatnonzero(self.weights)
+        np.savez_compressed(path, n_features=self.n_features, bias=self.bias,
+                            indices=nonzero.astype(np.int32), values=self.weights[nonzero].astype(np.float16))
+
+    @classmethod
+    def load(cls, path: str) -> "SafetyModel":
+        with np.load(path) as data:
+            weights = np.zeros(int(data["n_features"]), dtype=np.float32)
+            weights[data["indices"]] = data["values"]
+            return cls(weights, float(data["bias"]))
+
+
+def _featurize(token_lists: Sequence[Sequence[str]], n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(doc id, feature index) pairs of every document's distinct features, concatenated."""
+    indices = [np.unique(_feature_indices(_hash_tokens(tokens), n_features)) for tokens in token_lists]
+    doc_ids = np.repeat(np.arange(len(indices)), [len(i) for i in indices])
+    return doc_ids, np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30, 30)))
+
+
+class SafetyScorer:
+    """
+    Local replacement for keyword guardrails in the LLM prompt. Text is
+    normalised once, then checked against whole-word blocking phrases
+    (reported by keyword) and scored by the linear model (unsafe at or above
+    `threshold`). Without a model only the phrases apply.
+    """
+
+    def __init__(self, keywords: Iterable[str], model: Optional[SafetyModel], threshold: float):
+        self.rules = PhraseRules(keywords)
+        self.model = model
+        self.threshold = threshold
+
+    def score_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Unsafe probability per text (1.0 for a blocking phrase), scored in one vectorised pass."""
+        token_lists = [normalize_tokens(text) for text in texts]
+        scores = np.zeros(len(texts))
+        if self.model is not None and texts:
+            doc_ids, indices = _featurize(token_lists, self.model.n_features)
+            scores = _sigmoid(self.model.logits(doc_ids, indices, len(texts)))
+        blocked = [self.rules.match(" ".join(tokens)) is not None for tokens in token_lists]
+        scores[np.array(blocked, dtype=bool)] = 1.0
+        return scores
+
+    def check(self, text: str) -> Tuple[bool, str]:
+        return self.check_chunks([text])
+
+    def check_chunks(self, chunks: Iterable[str]) -> Tuple[bool, str]:
+        """
+        (is_safe, reason) over text arriving in pieces, in bounded memory.
+        Words are never split between pieces, and the last few words are
+        carried over for phrases and bigrams spanning two pieces. Only the
+        set of model features seen so far is kept between pieces.
+        """
+        context: List[str] = []
+        seen = np.zeros(0, dtype=np.int64)
+        for piece in _word_aligned(chunks):
+            tokens = context + normalize_tokens(piece)
+            keyword = self.rules.match(" ".join(tokens))
+            if keyword:
+                return False, f"Content contains unsafe keyword '{keyword}'"
+            if self.model is not None and len(tokens) > len(context):
+                indices = _feature_indices(_hash_tokens(tokens), self.model.n_features, first_new=len(context))
+                seen = np.union1d(seen, indices)
+            context = tokens[-max(self.rules.max_words - 1, 1):]
+        if self.model is not None and len(seen):
+            score = float(_sigmoid(np.array(self.model.weights[seen].sum() / np.sqrt(len(seen)) + self.model.bias)))
+            if score >= self.threshold:
+                return False, f"Content classified as unsafe (score {score:.2f})"
+        return True, ""
+
+
+def _word_aligned(chunks: Iterable[str], max_carry: int = 1024 * 1024) -> Iterable[str]:
+    """Re-cuts `chunks` after their last whitespace; a run without any is cut at `max_carry`."""
+    carry = ""
+    for chunk in chunks:
+        window = carry + chunk
+        cut = max(window.rfind(" "), window.rfind("\n"), window.rfind("\t")) + 1
+        if cut:
+            carry = window[cut:]
+            yield window[:cut]
+        elif len(window) >= max_carry:
+            carry = ""
+            yield window
+        else:
+            carry = window
+    if carry:
+        yield carry
+
+
+def train_model(texts: Sequence[str], labels: Sequence[int], n_features: int = 2 ** 18, epochs: int = 300,
+                learning_rate: float = 0.05, l2: float = 1e-5, prior: float = 0.02) -> SafetyModel:
+    """
+    Fits the weights with full-batch Adam on the log loss, classes weighted
+    equally. The bias is not learned but fixed at the log-odds of `prior`, the
+    share of unsafe mail expected in production, so text made of words the
+    model has never seen scores as safe and only learned n-grams raise it.
+    """
+    y = np.asarray(labels, dtype=np.float64)
+    doc_ids, indices = _featurize([normalize_tokens(t) for t in texts], n_features)
+    n_docs = len(texts)
+    norms = 1.0 / np.sqrt(np.maximum(np.bincount(doc_ids, minlength=n_docs), 1))
+    positive = max(y.mean(), 1e-6)
+    sample_weight = np.where(y == 1, 0.5 / positive, 0.5 / max(1 - positive, 1e-6)) / n_docs
+    bias = float(np.log(prior / (1 - prior)))
+
+    weights = np.zeros(n_features)
+    m, v = np.zeros(n_features), np.zeros(n_features)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    for step in range(1, epochs + 1):
+        logits = np.bincount(doc_ids, weights=weights[indices], minlength=n_docs) * norms + bias
+        error = (_sigmoid(logits) - y) * sample_weight
+        grad = np.bincount(indices, weights=(error * norms)[doc_ids], minlength=n_features) + l2 * weights
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad ** 2
+        weights -= learning_rate * np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step) * m / (np.sqrt(v) + eps)
+    # Features never seen in training keep a zero weight, so the saved model stays sparse
+    weights[np.bincount(indices, minlength=n_features) == 0] = 0.0
+    return SafetyModel(weights, bias)
+
+
+_scorer: Optional[SafetyScorer] = None
+_scorer_lock = threading.Lock()
+
+
+def get_scorer() -> SafetyScorer:
+    """The scorer for UNSAFE_KEYWORDS and the configured (or bundled) model, loaded once."""
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                from backend.core.security import UNSAFE_KEYWORDS
+                path = settings.SAFETY_MODEL_PATH or BUNDLED_MODEL
+                model = None
+                if settings.SAFETY_MODEL_ENABLED:
+                    try:
+                        model = SafetyModel.load(path)
+                    except OSError:
+                        logger.warning("Safety model %s not found; using keyword rules only", path)
+                _scorer = SafetyScorer(UNSAFE_KEYWORDS, model, settings.SAFETY_THRESHOLD)
+    return _scorer
+
+
+def load_corpus(path: str, split: Optional[str] = None) -> Tuple[List[str], List[int]]:
+    """Texts and labels (1 = unsafe) of a JSONL corpus of {"text", "label", "split"} objects."""
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if split is None or item.get("split", "train") == split:
+                texts.append(item["text"])
+                labels.append(int(item["label"]))
+    return texts, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local safety model on a labelled JSONL corpus.")
+    parser.add_argument("corpus", help='JSONL with {"text": ..., "label": 0|1, "split": "train"|"eval"}')
+    parser.add_argument("--output", default=BUNDLED_MODEL)
+    parser.add_argument("--features", type=int, default=18, help="log2 of the number of hashed features")
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+
+    texts, labels = load_corpus(args.corpus, split="train")
+    model = train_model(texts, labels, n_features=2 ** args.features, epochs=args.epochs)
+    model.save(args.output)
+    print(f"Trained on {len(texts):,} texts ({sum(labels):,} unsafe); "
+          f"{np.count_nonzero(model.weights):,} non-zero weights written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+from itertools import chain
+from typing import Iterable, Iterator
+
 from fastapi import HTTPException
 
 UNSAFE_KEYWORDS = [
@@ -63,23 +66,35 @@ UNSAFE_KEYWORDS = [
     "serial number included"
 ]
 
+SCAN_CHUNK = 64 * 1024
+
+def check_safety_chunks(chunks: Iterable[str]) -> tuple[bool, str]:
+    """
+    Like check_safety, over text that arrives in pieces. Only one chunk
+    (plus a few carried-over words) is normalised at a time.
+    """
+    from backend.core.safety import get_scorer
+    return get_scorer().check_chunks(chunks)
+
+def _chunks(text: str) -> Iterator[str]:
+    for i in range(0, len(text), SCAN_CHUNK):
+        yield text[i:i + SCAN_CHUNK]
+
 def check_safety(text: str) -> tuple[bool, str]:
     """
-    Checks text for unsafe content.
+    Checks text for unsafe content with the local safety scorer
+    (backend.core.safety): whole-word keyword rules over normalised text,
+    then the hashed n-gram model.
     Returns (is_safe, reason).
     """
-    content = text.lower()
-    for keyword in UNSAFE_KEYWORDS:
-        if keyword in content:
-            return False, f"Content contains unsafe keyword '{keyword}'"
-    return True, ""
+    return check_safety_chunks(_chunks(text))
 
 def validate_content(subject: str, body: str):
     """
     Basic guardrail to check for inappropriate, harmful, or sexual content.
     Raises HTTPException if content is deemed unsafe.
     """
-    is_safe, reason = check_safety(subject + " " + body)
+    is_safe, reason = check_safety_chunks(chain([subject, " "], _chunks(body)))
     if not is_safe:
         raise HTTPException(status_code=400, detail=f"Request rejected: {reason}")
     return True
@@ -0,0 +1,128 @@
+import contextvars
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from backend.core.config import settings
+from backend.core.metrics import metrics
+
+
+class _Shard:
+    def __init__(self, index: int, lock: threading.Lock):
+        self.index = index
+        self.ready = threading.Condition(lock)
+        self.jobs = deque()
+        self.depth = 0  # queued plus running
+        self.thread: Optional[threading.Thread] = None
+
+
+class ShardedExecutor:
+    """
+    Runs work for the same key strictly in submission order, and work for
+    different keys in parallel.
+
+    Each key is hashed onto one of `shards` single-threaded FIFO workers.
+    A key stays on its shard while it has queued or running work, so its
+    jobs never overlap or reorder. Rebalancing: when a key with no pending
+    work arrives and its home shard is at least `rebalance_depth` jobs
+    deeper than the shallowest one, it is placed on the shallowest shard
+    instead, so one busy thread does not hold up the others hashed next to it.
+    """
+
+    def __init__(self, shards: Optional[int] = None, rebalance_depth: Optional[int] = None, name: str = "shard"):
+        self.name = name
+        self.rebalance_depth = settings.PROCESSING_REBALANCE_DEPTH if rebalance_depth is None else rebalance_depth
+        self._lock = threading.Lock()
+        self._shards = [_Shard(i, self._lock) for i in range(max(1, shards or settings.PROCESSING_SHARDS))]
+        self._keys: Dict[str, list] = {}  # key -> [shard, pending jobs]
+        self._local = threading.local()
+        self._closed = False
+
+    def shard_for(self, key: str) -> int:
+        """The shard a key hashes to; stable across processes, unlike hash()."""
+        return zlib.crc32(key.encode("utf-8")) % len(self._shards)
+
+    def submit(self, key: str, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        # Context variables (e.g. the LLM scheduling lane) follow the work onto the shard
+        context = contextvars.copy_context()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("executor is shut down")
+            entry = self._keys.get(key)
+            if entry is None:
+                shard = self._place(key)
+                entry = self._keys[key] = [shard, 0]
+            shard = entry[0]
+            entry[1] += 1
+            shard.depth += 1
+            shard.jobs.append((key, fn, args, kwargs, context, future, time.monotonic()))
+            if shard.thread is None:
+                shard.thread = threading.Thread(target=self._work, args=(shard,), name=f"{self.name}-{shard.index}",
+                                                daemon=True)
+                shard.thread.start()
+            shard.ready.notify()
+            depth = shard.depth
+        metrics.set_gauge("processing_shard_depth", depth, shard=shard.index)
+        return future
+
+    def run(self, key: str, fn: Callable, *args, **kwargs):
+        """Submits and waits for the result. Called from a shard, runs inline instead of waiting on itself."""
+        if getattr(self._local, "shard", None) is not None:
+            return fn(*args, **kwargs)
+        return self.submit(key, fn, *args, **kwargs).result()
+
+    def depths(self) -> List[int]:
+        with self._lock:
+            return [shard.depth for shard in self._shards]
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting work; queued work still runs."""
+        with self._lock:
+            self._closed = True
+            for shard in self._shards:
+                shard.ready.notify_all()
+            threads = [shard.thread for shard in self._shards if shard.thread is not None]
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _place(self, key: str) -> _Shard:
+        home = self._shards[self.shard_for(key)]
+        if self.rebalance_depth:
+            shallowest = min(self._shards, key=lambda shard: shard.depth)
+            if home.depth - shallowest.depth >= self.rebalance_depth:
+                metrics.incr("processing_shard_rebalanced")
+                return shallowest
+        return home
+
+    def _work(self, shard: _Shard):
+        self._local.shard = shard.index
+        while True:
+            with self._lock:
+                while not shard.jobs and not self._closed:
+                    shard.ready.wait()
+                if not shard.jobs:
+                    return
+                key, fn, args, kwargs, context, future, enqueued = shard.jobs.popleft()
+            metrics.observe("processing_shard_wait_seconds", time.monotonic() - enqueued)
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(context.run(fn, *args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._lock:
+                shard.depth -= 1
+                entry = self._keys[key]
+                entry[1] -= 1
+                if not entry[1]:
+                    # Idle keys are placed afresh next time, which is where rebalancing happens
+                    del self._keys[key]
+                depth = shard.depth
+            metrics.set_gauge("processing_shard_depth", depth, shard=shard.index)
+
+
+processing_shards = ShardedExecutor(name="processing-shard")
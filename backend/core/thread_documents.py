@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+
+from backend.core.config import settings
+from backend.db.models import Email, Thread, ThreadDocument
+
+
+class GeneratedReplyResponse(BaseModel):
+    id: int
+    reply_text: str
+    tone: str
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class EmailResponse(BaseModel):
+    id: str
+    sender: str
+    subject: str
+    body: str
+    received_at: datetime
+    reply: Optional[GeneratedReplyResponse] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ThreadResponse(BaseModel):
+    id: str
+    created_at: datetime
+    emails: List[EmailResponse]
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+def render_thread(db: Session, thread_id: str) -> Optional[bytes]:
+    """Serialises a thread exactly as GET /threads/{id} returns it, or None if it does not exist."""
+    thread = (
+        db.query(Thread)
+        .options(selectinload(Thread.emails).selectinload(Email.reply))
+        .filter(Thread.id == thread_id)
+        # The session may hold this thread with an email collection loaded before the write
+        .execution_options(populate_existing=True)
+        .first()
+    )
+    if thread is None:
+        return None
+    return ThreadResponse.model_validate(thread).model_dump_json().encode()
+
+
+def refresh_thread_documents(db: Session, thread_ids: Iterable[Optional[str]]):
+    """
+    Re-renders the stored documents of the given threads inside the caller's
+    transaction, so a document is committed together with the write that
+    changed it. Pending changes are flushed first; the thread rows stay
+    locked until the caller commits.
+    """
+    db.flush()
+    thread_ids = sorted({t for t in thread_ids if t})
+    if not thread_ids:
+        return
+    # Concurrent writers to a thread take turns (in a fixed order, so they cannot deadlock):
+    # each renders after the previous one committed, so no document misses the other's change
+    db.execute(select(Thread.id).where(Thread.id.in_(thread_ids)).order_by(Thread.id).with_for_update())
+    for thread_id in thread_ids:
+        body = render_thread(db, thread_id)
+        if body is None:
+            continue
+        document = db.get(ThreadDocument, thread_id) or ThreadDocument(thread_id=thread_id, version=0)
+        document.body = body
+        document.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        # Small documents are not worth the compression overhead
+        compress = settings.THREAD_DOCUMENT_GZIP and len(body) >= settings.THREAD_DOCUMENT_GZIP_MIN_BYTES
+        document.body_gzip = gzip.compress(body, compresslevel=6) if compress else None
+        document.version = (document.version or 0) + 1
+        db.add(document)
+
+
+def load_thread_document(db: Session, thread_id: str):
+    """(body, body_gzip, etag) of a stored document, read without hydrating ORM objects."""
+    return db.execute(
+        select(ThreadDocument.body, ThreadDocument.body_gzip, ThreadDocument.etag)
+        .where(ThreadDocument.thread_id == thread_id)
+    ).first()
@@ -0,0 +1,146 @@
+import re
+from datetime import datetime, timedelta, timezone
+from email.parser import HeaderParser
+from email.utils import getaddresses
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.db.models import ArchivedMessageId, Email
+
+# "Re:", "RE[2]:", "Fwd:", "FW:", "AW:", "SV:" and friends, possibly repeated
+_REPLY_PREFIX = re.compile(r"^\s*((re|fwd?|aw|sv|wg)(\[\d+\])?\s*:\s*)+", re.IGNORECASE)
+_MESSAGE_ID = re.compile(r"<[^<>\s]+>")
+_HEADER_LINE = re.compile(r"^[A-Za-z][A-Za-z0-9-]*:")
+
+# Upper bound on subject candidates inspected for participant overlap
+SUBJECT_CANDIDATE_LIMIT = 20
+
+
+def normalize_subject(subject: Optional[str]) -> str:
+    """Strips reply/forward prefixes and collapses whitespace."""
+    if not subject:
+        return ""
+    stripped = _REPLY_PREFIX.sub("", subject)
+    return " ".join(stripped.split()).lower()
+
+
+def is_reply_subject(subject: Optional[str]) -> bool:
+    return bool(subject and _REPLY_PREFIX.match(subject))
+
+
+def parse_message_ids(value: Optional[str]) -> List[str]:
+    """Returns the `<id@host>` tokens of a Message-ID/In-Reply-To/References header."""
+    if not value:
+        return []
+    ids = _MESSAGE_ID.findall(value)
+    if not ids and value.strip():
+        # Some clients drop the angle brackets
+        ids = [f"<{token.strip('<>')}>" for token in value.split()]
+    return ids
+
+
+def parse_addresses(value: Optional[str]) -> List[str]:
+    if not value:
+        return []
+    return [addr.lower() for _, addr in getaddresses([value]) if addr]
+
+
+def extract_threading_headers(raw_text: str) -> dict:
+    """
+    Pulls the threading headers out of a raw email's header block.
+    Returns an empty dict when the text does not start with RFC 822 headers.
+    """
+    # Only the header block matters; never split a multi-megabyte paste into lines
+    lines = raw_text[:settings.MIME_MAX_HEADER_BYTES].lstrip().splitlines()
+    if not lines or not _HEADER_LINE.match(lines[0]):
+        return {}
+
+    header_lines = []
+    for line in lines:
+        if not line.strip():
+            break
+        header_lines.append(line)
+
+    headers = HeaderParser().parsestr("\n".join(header_lines) + "\n\n", headersonly=True)
+    message_ids = parse_message_ids(headers.get("Message-ID"))
+    recipients = parse_addresses(", ".join(headers.get_all("To", []) + headers.get_all("Cc", [])))
+
+    return {
+        "message_id": message_ids[0] if message_ids else None,
+        "in_reply_to": " ".join(parse_message_ids(headers.get("In-Reply-To"))) or None,
+        "references": " ".join(parse_message_ids(headers.get("References"))) or None,
+        "recipients": ", ".join(recipients) or None,
+    }
+
+
+class ThreadResolver:
+    """
+    Finds the existing thread an incoming email belongs to.
+
+    Header references are tried first (one lookup on the indexed `message_id`
+    column, then on the Message-IDs of archived threads); failing that, a reply-style subject is matched against recent
+    emails with the same normalised subject that share at least one participant.
+    """
+
+    def __init__(self, db: Session, window_days: Optional[int] = None):
+        self.db = db
+        self.window = timedelta(days=window_days if window_days is not None else settings.THREAD_MATCH_WINDOW_DAYS)
+
+    def resolve(self, email_data: dict) -> Optional[str]:
+        references = parse_message_ids(email_data.get("in_reply_to")) + parse_message_ids(email_data.get("references"))
+        if references:
+            thread_id = self._match_references(references)
+            if thread_id:
+                return thread_id
+
+        subject = email_data.get("subject")
+        if (references or is_reply_subject(subject)) and settings.THREAD_MATCH_BY_SUBJECT:
+            participants = self._participants(email_data.get("sender"), email_data.get("recipients"))
+            return self._match_subject(
+                normalize_subject(subject),
+                participants,
+                email_data.get("received_at") or datetime.now(timezone.utc),
+            )
+        return None
+
+    def _match_references(self, references: List[str]) -> Optional[str]:
+        row = (
+            self.db.query(Email.thread_id)
+            .filter(Email.message_id.in_(references), Email.thread_id.isnot(None))
+            .order_by(Email.received_at.desc())
+            .first()
+        )
+        if row is None:
+            # A late reply to a thread that has since moved to the cold archive
+            row = (
+                self.db.query(ArchivedMessageId.thread_id)
+                .filter(ArchivedMessageId.message_id.in_(references))
+                .first()
+            )
+        return row[0] if row else None
+
+    def _match_subject(self, normalized: str, participants: set, received_at: datetime) -> Optional[str]:
+        if not normalized or not participants:
+            return None
+        candidates = (
+            self.db.query(Email.thread_id, Email.sender, Email.recipients)
+            .filter(
+                Email.normalized_subject == normalized,
+                Email.received_at >= received_at - self.window,
+                Email.thread_id.isnot(None),
+            )
+            .order_by(Email.received_at.desc())
+            .limit(SUBJECT_CANDIDATE_LIMIT)
+            .all()
+        )
+        for thread_id, sender, recipients in candidates:
+            if participants & self._participants(sender, recipients):
+                return thread_id
+        return None
+
+    @staticmethod
+    def _participants(sender: Optional[str], recipients: Optional[str]) -> set:
+        return set(parse_addresses(sender)) | set(parse_addresses(recipients))
+
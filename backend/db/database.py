@@ -1,6 +1,9 @@
+from fastapi import Depends, Request
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base
 from backend.core.config import settings
+from backend.db.routing import RecentWrites, ReplicaRouter
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
@@ -9,9 +12,40 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Optional read replicas for read-only routes; the primary stays the default everywhere else
+_replicas = [create_engine(url, pool_pre_ping=True) for url in settings.DATABASE_REPLICA_URLS]
+read_router = ReplicaRouter(
+    {replica.url.render_as_string(hide_password=True): replica for replica in _replicas},
+    check_interval=settings.REPLICA_HEALTH_CHECK_INTERVAL,
+)
+recent_writes = RecentWrites(settings.READ_YOUR_WRITES_SECONDS)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db(request: Request, primary=Depends(get_db)):
+    """
+    Session for read-only routes: a healthy replica when one is configured,
+    the primary otherwise or when the route names an email/thread this
+    process wrote in the last READ_YOUR_WRITES_SECONDS.
+    """
+    replica = None
+    if not recent_writes.contains_any(request.path_params.values()):
+        replica = read_router.pick()
+    if replica is None:
+        yield primary
+        return
+
+    db = SessionLocal(bind=replica)
+    try:
+        yield db
+    except OperationalError:
+        # Out of rotation until the next successful health check
+        read_router.mark_unhealthy(replica)
+        raise
+    finally:
+        db.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON, Boolean
+from sqlalchemy import BigInteger, Column, Date, Float, Integer, LargeBinary, String, Text, ForeignKey, DateTime, JSON, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from backend.db.database import Base
@@ -15,15 +15,27 @@ class Email(Base):
     __tablename__ = "emails"
 
     id = Column(String, primary_key=True, index=True)
-    thread_id = Column(String, ForeignKey("threads.id"), nullable=True)
+    thread_id = Column(String, ForeignKey("threads.id"), nullable=True, index=True)
     sender = Column(String, index=True)
     subject = Column(String)
     body = Column(Text)
-    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    # Threading headers, used to attach replies to existing threads
+    message_id = Column(String, nullable=True, index=True)
+    in_reply_to = Column(String, nullable=True)
+    references = Column(Text, nullable=True)
+    recipients = Column(Text, nullable=True)
+    normalized_subject = Column(String, nullable=True)
     
     thread = relationship("Thread", back_populates="emails")
     summary = relationship("EmailSummary", back_populates="email", uselist=False)
     reply = relationship("GeneratedReply", back_populates="email", uselist=False)
+    attachments = relationship("Attachment", back_populates="email")
+
+    __table_args__ = (
+        Index("ix_emails_normalized_subject_received_at", "normalized_subject", "received_at"),
+    )
 
 class EmailSummary(Base):
     __tablename__ = "email_summaries"
@@ -31,10 +43,20 @@ class EmailSummary(Base):
     id = Column(Integer, primary_key=True, index=True)
     email_id = Column(String, ForeignKey("emails.id"), unique=True)
     summary_json = Column(JSON) # Stores the full structured summary
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # What produced summary_json; rows not matching the current configuration are re-summarised
+    model = Column(String, nullable=True)
+    prompt_version = Column(String, nullable=True)
+    version = Column(Integer, default=1)  # bumped on every rewrite
+    # Indexed for the analytics refresh, which looks for summaries written since its last run
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True, index=True)  # last rewrite, if any
     
     email = relationship("Email", back_populates="summary")
 
+    __table_args__ = (
+        Index("ix_email_summaries_prompt_version_model", "prompt_version", "model"),
+    )
+
 class GeneratedReply(Base):
     __tablename__ = "generated_replies"
 
@@ -42,6 +64,187 @@ class GeneratedReply(Base):
     email_id = Column(String, ForeignKey("emails.id"), unique=True)
     reply_text = Column(Text)
     tone = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Set when auto_send queues the reply: queued, sent or failed
+    delivery_status = Column(String, nullable=True)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
     
     email = relationship("Email", back_populates="reply")
+    outbox = relationship("OutboxMessage", back_populates="reply")
+
+class OutboxMessage(Base):
+    """Outbound reply waiting for (or done with) SMTP delivery."""
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    reply_id = Column(Integer, ForeignKey("generated_replies.id"), index=True)
+    to_address = Column(String)
+    subject = Column(String)
+    body = Column(Text)
+    message_id = Column(String, unique=True)
+    in_reply_to = Column(String, nullable=True)
+    references = Column(Text, nullable=True)
+    status = Column(String, default="queued")  # queued, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    reply = relationship("GeneratedReply", back_populates="outbox")
+
+    __table_args__ = (
+        Index("ix_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+class DraftReply(Base):
+    """Reply drafted speculatively at ingest time, served by generate-reply when the tone matches."""
+    __tablename__ = "draft_replies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email_id = Column(String, ForeignKey("emails.id"), index=True)
+    thread_id = Column(String, ForeignKey("threads.id"), index=True)
+    tone = Column(String)
+    reply_text = Column(Text)
+    status = Column(String, default="pending", index=True)  # pending, used, invalidated
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ChunkSummary(Base):
+    __tablename__ = "chunk_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Hash of the summarised content (messages, or child summaries for level > 0)
+    chunk_hash = Column(String(64), unique=True, index=True)
+    level = Column(Integer, default=0)
+    message_count = Column(Integer)
+    summary = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class LLMResult(Base):
+    """Short-lived LLM results shared between processes by the single-flight layer."""
+    __tablename__ = "llm_results"
+
+    key = Column(String, primary_key=True)
+    result = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class ImportCheckpoint(Base):
+    """Resume position of a bulk mailbox import, committed together with each batch."""
+    __tablename__ = "import_checkpoints"
+
+    source = Column(String, primary_key=True)  # "<format>:<absolute path>"
+    position = Column(Integer, default=0)  # byte offset (mbox) or files consumed (maildir/eml)
+    imported = Column(Integer, default=0)
+    skipped = Column(Integer, default=0)
+    completed = Column(Boolean, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class MailboxSyncState(Base):
+    """IMAP high-water marks; a changed UIDVALIDITY invalidates last_uid."""
+    __tablename__ = "mailbox_sync_state"
+
+    mailbox = Column(String, primary_key=True)  # "<user>@<host>/<folder>"
+    uidvalidity = Column(BigInteger, nullable=True)
+    last_uid = Column(BigInteger, default=0)
+    highest_modseq = Column(BigInteger, nullable=True)
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)
+
+class Attachment(Base):
+    """Attachment metadata; the content lives in the content-addressed store under ATTACHMENT_DIR."""
+    __tablename__ = "attachments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email_id = Column(String, ForeignKey("emails.id"), index=True)
+    sha256 = Column(String(64), nullable=True, index=True)  # null when the part was over the size limit
+    filename = Column(String, nullable=True)
+    content_type = Column(String)
+    size = Column(BigInteger)
+    status = Column(String, default="stored")  # stored, too_large
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    email = relationship("Email", back_populates="attachments")
+
+class PendingSummary(Base):
+    """Email stored while the LLM was unavailable; summarised later by the backfill worker."""
+    __tablename__ = "pending_summaries"
+
+    email_id = Column(String, ForeignKey("emails.id"), primary_key=True)
+    status = Column(String, default="pending")  # pending, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_pending_summaries_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+class DailyEmailRollup(Base):
+    """
+    Per-day, per-sender email counts by intent/sentiment/urgency, with reply
+    turnaround sums. Rebuilt a day at a time by backend.core.analytics.
+    """
+    __tablename__ = "analytics_daily"
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, index=True)  # day the email was received (UTC)
+    sender = Column(String, index=True)
+    intent = Column(String)
+    sentiment = Column(String)
+    urgency = Column(String)
+    emails = Column(Integer, default=0)
+    sentiment_score_sum = Column(Float, default=0)
+    replied = Column(Integer, default=0)
+    turnaround_seconds_sum = Column(Float, default=0)
+
+    __table_args__ = (
+        # Also stops two concurrent refreshes from double-counting a day
+        Index("ux_analytics_daily_bucket", "day", "sender", "intent", "sentiment", "urgency", unique=True),
+    )
+
+class AnalyticsRefreshState(Base):
+    """When the analytics rollups were last refreshed."""
+    __tablename__ = "analytics_refresh_state"
+
+    name = Column(String, primary_key=True)
+    refreshed_at = Column(DateTime(timezone=True), nullable=True)
+
+class ThreadDocument(Base):
+    """Pre-serialised GET /threads/{id} response, rewritten in the same transaction as every change to the thread."""
+    __tablename__ = "thread_documents"
+
+    thread_id = Column(String, ForeignKey("threads.id"), primary_key=True)
+    body = Column(LargeBinary)  # JSON
+    body_gzip = Column(LargeBinary, nullable=True)
+    etag = Column(String)
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ArchivedThread(Base):
+    """
+    Thread moved out of the hot tables by backend.core.archive: the thread, its
+    emails, summaries, replies and attachment metadata as one zstd-compressed
+    JSON record, inline (`payload`) or in a segment file. Partitioned by the
+    month of the thread's last email on PostgreSQL.
+    """
+    __tablename__ = "archived_threads"
+
+    thread_id = Column(String, primary_key=True)
+    period = Column(Date, primary_key=True)  # first day of the month of last_received_at
+    last_received_at = Column(DateTime(timezone=True))
+    email_count = Column(Integer)
+    payload = Column(LargeBinary, nullable=True)
+    segment = Column(String, nullable=True)
+    offset = Column(BigInteger, nullable=True)
+    length = Column(Integer, nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # The partition key must be part of the primary key; lookups use its thread_id prefix
+    __table_args__ = {"postgresql_partition_by": "RANGE (period)"}
+
+class ArchivedMessageId(Base):
+    """Message-IDs of archived emails, so a late reply still resolves to its archived thread."""
+    __tablename__ = "archived_message_ids"
+
+    thread_id = Column(String, primary_key=True)
+    message_id = Column(String, primary_key=True, index=True)
@@ -0,0 +1,126 @@
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from backend.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRouter:
+    """
+    Chooses the engine for read-only sessions.
+
+    Healthy replicas share the load: the one with the fewest checked-out
+    connections wins, ties rotate. A replica is taken out of rotation when
+    its health check (`SELECT 1`) fails or a query on it hits a connection
+    error, and put back by the next successful check. Health checks run in
+    the background at most every `check_interval` seconds. With no healthy
+    replica, `pick` returns None and callers fall back to the primary.
+    """
+
+    def __init__(
+        self,
+        replicas: Dict[str, Engine],
+        check_interval: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.replicas = replicas
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._healthy = set(replicas)
+        self._rotation = itertools.count()
+        self._last_check = clock()
+        self._checking = False
+
+    @property
+    def healthy(self) -> List[str]:
+        with self._lock:
+            return sorted(self._healthy)
+
+    def pick(self) -> Optional[Engine]:
+        if not self.replicas:
+            return None
+        self._maybe_check()
+        with self._lock:
+            candidates = sorted(self._healthy)
+            if not candidates:
+                return None
+            offset = next(self._rotation)
+        rotated = candidates[offset % len(candidates):] + candidates[:offset % len(candidates)]
+        name = min(rotated, key=lambda n: self.replicas[n].pool.checkedout() if hasattr(self.replicas[n].pool, "checkedout") else 0)
+        metrics.incr("db_reads_routed", target=name)
+        return self.replicas[name]
+
+    def mark_unhealthy(self, engine: Engine):
+        for name, replica in self.replicas.items():
+            if replica is engine:
+                self._set_health(name, False)
+
+    def check(self):
+        """Runs the health check against every replica now."""
+        for name, engine in self.replicas.items():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                healthy = True
+            except Exception as e:
+                logger.warning("Read replica %s failed its health check: %s", name, e)
+                healthy = False
+            self._set_health(name, healthy)
+        with self._lock:
+            self._last_check = self._clock()
+            self._checking = False
+
+    def _maybe_check(self):
+        with self._lock:
+            if self._checking or self._clock() - self._last_check < self.check_interval:
+                return
+            self._checking = True
+        # Never make a request wait on an unreachable replica's connect timeout
+        threading.Thread(target=self.check, name="replica-health-check", daemon=True).start()
+
+    def _set_health(self, name: str, healthy: bool):
+        with self._lock:
+            changed = (name in self._healthy) != healthy
+            if healthy:
+                self._healthy.add(name)
+            else:
+                self._healthy.discard(name)
+        metrics.set_gauge("db_replica_healthy", 1 if healthy else 0, replica=name)
+        if changed and not healthy:
+            metrics.incr("db_replica_failures", replica=name)
+
+
+class RecentWrites:
+    """
+    Ids (emails, threads) written by this process in the last `ttl` seconds.
+    Reads that name one go to the primary, so a client never reads its own
+    write from a replica that has not replayed it yet.
+    """
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._expiry: Dict[str, float] = {}
+
+    def note(self, *keys: Optional[str]):
+        now = self._clock()
+        with self._lock:
+            for key in keys:
+                if key:
+                    self._expiry[key] = now + self.ttl
+            if len(self._expiry) > 10000:
+                self._expiry = {k: t for k, t in self._expiry.items() if t > now}
+
+    def contains_any(self, keys: Iterable[str]) -> bool:
+        now = self._clock()
+        with self._lock:
+            return any(self._expiry.get(key, 0) > now for key in keys)
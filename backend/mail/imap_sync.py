@@ -0,0 +1,276 @@
+import argparse
+import imaplib
+import logging
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from backend.ai.scheduler import LANE_BULK, use_lane
+from backend.core.config import settings
+from backend.core.metrics import metrics
+from backend.core.security import check_safety
+from backend.db.models import Email, MailboxSyncState
+from backend.mail.importer import parse_message
+
+logger = logging.getLogger(__name__)
+
+_FETCH_UID = re.compile(rb"UID (\d+)")
+
+
+def uid_set(uids: Iterable[int]) -> str:
+    """Compresses sorted UIDs into an IMAP sequence set ("1:5,7,9:10")."""
+    ranges: List[Tuple[int, int]] = []
+    for uid in uids:
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], uid)
+        else:
+            ranges.append((uid, uid))
+    return ",".join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+
+def _response_int(imap: imaplib.IMAP4, code: str) -> Optional[int]:
+    _, data = imap.response(code)
+    if not data or data[0] is None:
+        return None
+    try:
+        return int(data[0].split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+class _Watermark:
+    """Highest UID below which every enqueued message has been handed off."""
+
+    def __init__(self, start: int):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._highest = start
+
+    def add(self, uid: int):
+        with self._lock:
+            self._pending.add(uid)
+            self._highest = max(self._highest, uid)
+
+    def done(self, uid: int):
+        with self._lock:
+            self._pending.discard(uid)
+
+    def value(self) -> int:
+        with self._lock:
+            return min(self._pending) - 1 if self._pending else self._highest
+
+
+def process_message(email_data: dict, session_factory=None):
+    """Default hand-off: the same store-and-summarise path as /submit, in the bulk lane."""
+    from backend.ai.email_processor import EmailProcessor
+    if session_factory is None:
+        from backend.db.database import SessionLocal as session_factory
+
+    db = session_factory()
+    try:
+        message_id = email_data.get("message_id")
+        # A UIDVALIDITY reset re-lists the whole folder; skip what is already stored
+        if message_id and db.query(Email.id).filter(Email.message_id == message_id).first():
+            metrics.incr("imap_messages", outcome="duplicate")
+            return
+        with use_lane(LANE_BULK):
+            # During an LLM outage the email is stored and its summary queued, as for /submit
+            summary = EmailProcessor(db).process_email_in_order(email_data, defer_on_outage=True)
+        metrics.incr("imap_messages", outcome="processed" if summary.summary_json is not None else "queued")
+    finally:
+        db.close()
+
+
+class MailboxSync:
+    """
+    Incremental IMAP ingestion for one folder.
+
+    Each pass selects the folder read-only and compares UIDVALIDITY, UIDNEXT
+    and (with CONDSTORE) HIGHESTMODSEQ against the stored high-water marks,
+    so an idle mailbox costs one round trip regardless of its size. New UIDs
+    are fetched IMAP_FETCH_BATCH at a time with a single UID FETCH per batch
+    and handed to IMAP_WORKERS consumers through a bounded queue: when the
+    consumers fall behind, fetching blocks. `last_uid` only advances past
+    messages that have been handed off.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        handler: Optional[Callable[[dict], None]] = None,
+        connect: Optional[Callable[[], imaplib.IMAP4]] = None,
+        folder: Optional[str] = None,
+    ):
+        self.session_factory = session_factory
+        self.handler = handler or (lambda email_data: process_message(email_data, session_factory))
+        self.connect = connect or self._connect
+        self.folder = folder or settings.IMAP_FOLDER
+        self.mailbox = f"{settings.IMAP_USERNAME}@{settings.IMAP_HOST}/{self.folder}"
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _connect() -> imaplib.IMAP4:
+        if settings.IMAP_USE_SSL:
+            imap = imaplib.IMAP4_SSL(settings.IMAP_HOST, settings.IMAP_PORT)
+        else:
+            imap = imaplib.IMAP4(settings.IMAP_HOST, settings.IMAP_PORT)
+        imap.login(settings.IMAP_USERNAME, settings.IMAP_PASSWORD)
+        return imap
+
+    def sync_once(self) -> int:
+        """Fetches and hands off mail that arrived since the last pass; returns the count."""
+        start = time.perf_counter()
+        imap = self.connect()
+        db = self.session_factory()
+        try:
+            state = db.get(MailboxSyncState, self.mailbox)
+            if state is None:
+                state = MailboxSyncState(mailbox=self.mailbox, last_uid=0)
+                db.add(state)
+
+            condstore = "CONDSTORE" in imap.capabilities and "ENABLE" in imap.capabilities
+            if condstore:
+                imap.enable("CONDSTORE")
+            typ, _ = imap.select(self.folder, readonly=True)
+            if typ != "OK":
+                raise imaplib.IMAP4.error(f"Cannot select {self.folder}")
+            uidvalidity = _response_int(imap, "UIDVALIDITY")
+            uidnext = _response_int(imap, "UIDNEXT")
+            modseq = _response_int(imap, "HIGHESTMODSEQ") if condstore else None
+
+            if uidvalidity != state.uidvalidity:
+                if state.uidvalidity is not None:
+                    logger.warning("UIDVALIDITY of %s changed; resyncing the folder", self.mailbox)
+                state.uidvalidity = uidvalidity
+                state.last_uid = 0
+                state.highest_modseq = None
+
+            last_uid = state.last_uid or 0
+            unchanged = (modseq is not None and modseq == state.highest_modseq) or (
+                uidnext is not None and uidnext <= last_uid + 1
+            )
+            uids = [] if unchanged else self._new_uids(imap, last_uid)
+
+            watermark = _Watermark(last_uid)
+            handed_off = self._fetch_and_dispatch(imap, uids, watermark, db, state)
+
+            state.last_uid = watermark.value()
+            if modseq is not None and state.last_uid >= max(uids, default=last_uid):
+                state.highest_modseq = modseq
+            state.last_synced_at = datetime.now(timezone.utc)
+            db.commit()
+            metrics.observe("imap_sync_seconds", time.perf_counter() - start)
+            return handed_off
+        finally:
+            db.close()
+            try:
+                imap.logout()
+            except Exception:
+                pass
+
+    def _new_uids(self, imap: imaplib.IMAP4, last_uid: int) -> List[int]:
+        typ, data = imap.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+        if typ != "OK":
+            raise imaplib.IMAP4.error("UID SEARCH failed")
+        # "n:*" always matches the highest UID, even when it is below n
+        return sorted(uid for uid in (int(token) for token in b" ".join(data).split()) if uid > last_uid)
+
+    def _fetch_and_dispatch(self, imap, uids: List[int], watermark: _Watermark, db, state) -> int:
+        if not uids:
+            return 0
+        work: "queue.Queue[Optional[Tuple[int, bytes]]]" = queue.Queue(maxsize=max(1, settings.IMAP_QUEUE_SIZE))
+        workers = [
+            threading.Thread(target=self._consume, args=(work, watermark), daemon=True)
+            for _ in range(max(1, settings.IMAP_WORKERS))
+        ]
+        for worker in workers:
+            worker.start()
+
+        handed_off = 0
+        batch_size = max(1, settings.IMAP_FETCH_BATCH)
+        try:
+            for i in range(0, len(uids), batch_size):
+                if self._stop.is_set():
+                    break
+                for uid, raw in self._fetch(imap, uids[i:i + batch_size]):
+                    watermark.add(uid)
+                    work.put((uid, raw))  # blocks while the consumers are behind
+                    handed_off += 1
+                metrics.set_gauge("imap_queue_depth", work.qsize())
+                # Persist progress so a crash does not refetch completed batches
+                state.last_uid = watermark.value()
+                db.commit()
+        finally:
+            for _ in workers:
+                work.put(None)
+            for worker in workers:
+                worker.join()
+        return handed_off
+
+    def _fetch(self, imap: imaplib.IMAP4, uids: List[int]) -> List[Tuple[int, bytes]]:
+        typ, data = imap.uid("FETCH", uid_set(uids), "(UID BODY.PEEK[])")
+        if typ != "OK":
+            raise imaplib.IMAP4.error("UID FETCH failed")
+        messages = []
+        for item in data:
+            if isinstance(item, tuple):
+                match = _FETCH_UID.search(item[0])
+                if match:
+                    messages.append((int(match.group(1)), item[1]))
+        metrics.incr("imap_fetched", len(messages))
+        return sorted(messages)
+
+    def _consume(self, work: queue.Queue, watermark: _Watermark):
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            uid, raw = item
+            try:
+                email_data = parse_message(raw)
+                if email_data is None:
+                    metrics.incr("imap_messages", outcome="invalid")
+                elif not check_safety(email_data["subject"] + " " + email_data["body"])[0]:
+                    metrics.incr("imap_messages", outcome="unsafe")
+                else:
+                    self.handler(email_data)
+            except Exception:
+                # One bad message must not stall the folder; it is logged and passed over
+                logger.exception("Failed to ingest UID %s from %s", uid, self.mailbox)
+                metrics.incr("imap_messages", outcome="failed")
+            finally:
+                watermark.done(uid)
+
+    def run_forever(self, poll_interval: Optional[float] = None):
+        interval = poll_interval if poll_interval is not None else settings.IMAP_POLL_INTERVAL
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception:
+                logger.exception("Mailbox sync of %s failed", self.mailbox)
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync new mail from the configured IMAP folder.")
+    parser.add_argument("--once", action="store_true", help="Run one sync pass and exit")
+    args = parser.parse_args()
+
+    from backend.db.database import Base, SessionLocal, engine
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    sync = MailboxSync(SessionLocal)
+    if args.once:
+        print(f"Ingested {sync.sync_once()} messages")
+    else:
+        sync.run_forever()
+
+
+if __name__ == "__main__":
+    main()
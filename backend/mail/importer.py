@@ -0,0 +1,370 @@
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from backend.ai.scheduler import LANE_BULK, use_lane
+from backend.core.config import settings
+from backend.core.metrics import metrics
+from backend.core.safety import get_scorer
+from backend.core.thread_documents import refresh_thread_documents
+from backend.core.thread_resolver import (
+    ThreadResolver,
+    is_reply_subject,
+    normalize_subject,
+    parse_addresses,
+    parse_message_ids,
+)
+from backend.db.models import Attachment, Email, ImportCheckpoint, Thread
+from backend.mail.mime import MimeSizeError, ParsedMime, parse_bytes
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("mbox", "maildir", "eml")
+
+# (position after this message, raw message bytes)
+RawMessage = Tuple[int, bytes]
+
+
+def detect_format(path: str) -> str:
+    if os.path.isdir(path):
+        if all(os.path.isdir(os.path.join(path, sub)) for sub in ("cur", "new")):
+            return "maildir"
+        return "eml"
+    return "eml" if path.lower().endswith(".eml") else "mbox"
+
+
+def iter_mbox(path: str, start: int = 0) -> Iterator[RawMessage]:
+    """
+    Streams messages out of an mbox file one at a time. Positions are byte
+    offsets of the next "From " separator, so an import can resume with a seek.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        lines: List[bytes] = []
+        in_message = False
+        prev_blank = True
+        for line in f:
+            if prev_blank and line.startswith(b"From "):
+                if in_message:
+                    yield offset, b"".join(lines)
+                lines = []
+                in_message = True
+            elif in_message:
+                # mboxrd: ">From " lines were escaped when the mailbox was written
+                if line.startswith(b">") and line.lstrip(b">").startswith(b"From "):
+                    lines.append(line[1:])
+                else:
+                    lines.append(line)
+            prev_blank = line in (b"\n", b"\r\n")
+            offset += len(line)
+        if in_message:
+            yield offset, b"".join(lines)
+
+
+def iter_files(paths: Iterable[str], start: int = 0) -> Iterator[RawMessage]:
+    """Reads one message per file; positions count files consumed."""
+    for position, file_path in enumerate(paths, start=1):
+        if position <= start:
+            continue
+        with open(file_path, "rb") as f:
+            yield position, f.read()
+
+
+def maildir_paths(path: str) -> Iterator[str]:
+    for sub in ("cur", "new"):
+        folder = os.path.join(path, sub)
+        for name in sorted(os.listdir(folder)):
+            if not name.startswith("."):
+                yield os.path.join(folder, name)
+
+
+def eml_paths(path: str) -> Iterator[str]:
+    if os.path.isfile(path):
+        yield path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".eml"):
+                yield os.path.join(root, name)
+
+
+def iter_source(path: str, fmt: str, start: int = 0) -> Iterator[RawMessage]:
+    if fmt == "mbox":
+        return iter_mbox(path, start)
+    if fmt == "maildir":
+        return iter_files(maildir_paths(path), start)
+    return iter_files(eml_paths(path), start)
+
+
+def parse_message(raw: bytes) -> Optional[dict]:
+    """Turns raw RFC 822 bytes into the email_data dict used by EmailProcessor."""
+    email_data, mime = _parse_staged(raw)
+    mime.save_attachments()
+    return email_data
+
+
+def _parse_staged(raw: bytes) -> Tuple[Optional[dict], ParsedMime]:
+    """Like parse_message, but attachment blobs stay staged until the caller saves or discards them."""
+    mime = parse_bytes(raw, stage=True)
+    email_data = mime.email_data()
+    if not email_data["body"] and email_data["sender"] == "unknown@example.com":
+        mime.discard_attachments()
+        return None, mime
+    return email_data, mime
+
+
+class MailImporter:
+    """
+    Bulk-loads a mailbox into the emails table.
+
+    Messages are streamed from the source, parsed locally and inserted in
+    batches of IMPORT_BATCH_SIZE; the checkpoint row and the thread documents
+    of the batch are committed in the same transaction as each batch, so an
+    interrupted import resumes where the last batch ended. Attachment blobs
+    are only kept for messages that are inserted. Threads are resolved from an in-memory Message-ID cache
+    (bounded by IMPORT_THREAD_CACHE_SIZE) before falling back to
+    ThreadResolver, which only sees earlier batches.
+    """
+
+    def __init__(self, session_factory, batch_size: Optional[int] = None):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size or settings.IMPORT_BATCH_SIZE)
+        self._thread_by_message_id: "OrderedDict[str, str]" = OrderedDict()
+        self.touched_threads = set()  # of the batch being imported
+        self.stats = {"read": 0, "imported": 0, "duplicate": 0, "unsafe": 0, "invalid": 0, "threads": 0}
+
+    def run(
+        self,
+        path: str,
+        fmt: Optional[str] = None,
+        limit: Optional[int] = None,
+        restart: bool = False,
+        on_progress: Optional[Callable[[dict], None]] = None,
+        on_batch: Optional[Callable[[List[str]], None]] = None,
+    ) -> dict:
+        """Imports a mailbox; `on_batch` receives the thread ids of each committed batch."""
+        path = os.path.abspath(path)
+        fmt = fmt or detect_format(path)
+        source = f"{fmt}:{path}"
+        start = time.perf_counter()
+
+        db = self.session_factory()
+        try:
+            checkpoint = db.get(ImportCheckpoint, source)
+            if checkpoint is None:
+                checkpoint = ImportCheckpoint(source=source, position=0, imported=0, skipped=0, completed=False)
+                db.add(checkpoint)
+            elif restart:
+                checkpoint.position, checkpoint.imported, checkpoint.skipped, checkpoint.completed = 0, 0, 0, False
+            elif checkpoint.completed:
+                logger.info("%s was already imported; use restart to import it again", source)
+                return self._report(start)
+
+            batch: List[RawMessage] = []
+            exhausted = True
+            for item in iter_source(path, fmt, checkpoint.position or 0):
+                if limit is not None and self.stats["read"] + len(batch) >= limit:
+                    exhausted = False
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._import_batch(db, checkpoint, batch, on_batch)
+                    batch = []
+                    if on_progress:
+                        on_progress(self._report(start))
+            if batch:
+                self._import_batch(db, checkpoint, batch, on_batch)
+            checkpoint.completed = exhausted
+            db.commit()
+        finally:
+            db.close()
+
+        report = self._report(start)
+        if on_progress:
+            on_progress(report)
+        return report
+
+    def _import_batch(self, db: Session, checkpoint: ImportCheckpoint, batch: List[RawMessage],
+                      on_batch: Optional[Callable[[List[str]], None]] = None):
+        staged: List[ParsedMime] = []
+        try:
+            self._insert_batch(db, checkpoint, batch, staged)
+        finally:
+            # Blobs of skipped messages (or of a failed batch) are deleted; saved ones are no longer staged
+            for mime in staged:
+                mime.discard_attachments()
+        metrics.incr("import_messages", len(batch))
+        if on_batch:
+            on_batch(sorted(self.touched_threads))
+        self.touched_threads.clear()
+
+    def _insert_batch(self, db: Session, checkpoint: ImportCheckpoint, batch: List[RawMessage],
+                      staged: List[ParsedMime]):
+        parsed: List[Tuple[dict, ParsedMime]] = []
+        for _, raw in batch:
+            self.stats["read"] += 1
+            try:
+                email_data, mime = _parse_staged(raw)
+                staged.append(mime)
+            except MimeSizeError:
+                email_data = None
+            except Exception:
+                logger.exception("Could not parse message")
+                email_data = None
+            if email_data is None:
+                self._skip("invalid")
+                continue
+            parsed.append((email_data, mime))
+
+        # The whole batch is scored in one vectorised pass
+        scorer = get_scorer()
+        scores = scorer.score_batch([d["subject"] + " " + d["body"] for d, _ in parsed])
+        safe = []
+        for item, score in zip(parsed, scores):
+            if score >= scorer.threshold:
+                self._skip("unsafe")
+            else:
+                safe.append(item)
+        parsed = safe
+
+        # One lookup per batch for messages that are already stored (re-imports, copies across folders)
+        message_ids = {d["message_id"] for d, _ in parsed if d["message_id"]}
+        existing = set()
+        if message_ids:
+            existing = {
+                row[0] for row in db.query(Email.message_id).filter(Email.message_id.in_(message_ids)).all()
+            }
+
+        resolver = ThreadResolver(db)
+        pending_subjects = {}
+        rows = []
+        inserted: List[ParsedMime] = []
+        for email_data, mime in parsed:
+            message_id = email_data["message_id"]
+            if message_id and (message_id in existing or message_id in self._thread_by_message_id):
+                self._skip("duplicate")
+                continue
+
+            thread_id = self._resolve(resolver, pending_subjects, email_data)
+            if not thread_id:
+                thread_id = str(uuid.uuid4())
+                rows.append(Thread(id=thread_id))
+                self.stats["threads"] += 1
+
+            email = Email(
+                id=str(uuid.uuid4()),
+                thread_id=thread_id,
+                sender=email_data["sender"],
+                subject=email_data["subject"],
+                body=email_data["body"],
+                message_id=message_id,
+                in_reply_to=email_data["in_reply_to"],
+                references=email_data["references"],
+                recipients=email_data["recipients"],
+                normalized_subject=normalize_subject(email_data["subject"]),
+            )
+            if email_data["received_at"]:
+                email.received_at = email_data["received_at"]
+            rows.append(email)
+            rows.extend(Attachment(email_id=email.id, **attachment) for attachment in email_data["attachments"])
+            inserted.append(mime)
+
+            if message_id:
+                self._remember(message_id, thread_id)
+            normalized = email.normalized_subject
+            if normalized:
+                participants = set(parse_addresses(email.sender)) | set(parse_addresses(email.recipients))
+                pending_subjects.setdefault(normalized, []).append((thread_id, participants))
+            self.touched_threads.add(thread_id)
+            self.stats["imported"] += 1
+
+        db.add_all(rows)
+        # The stored GET /threads/{id} documents are committed together with the batch
+        refresh_thread_documents(db, self.touched_threads)
+        imported = sum(isinstance(row, Email) for row in rows)
+        checkpoint.position = batch[-1][0]
+        checkpoint.imported = (checkpoint.imported or 0) + imported
+        checkpoint.skipped = (checkpoint.skipped or 0) + len(batch) - imported
+        # Blobs go into the store before the rows that point at them are committed
+        for mime in inserted:
+            mime.save_attachments()
+        db.commit()
+
+    def _resolve(self, resolver: ThreadResolver, pending_subjects: dict, email_data: dict) -> Optional[str]:
+        references = parse_message_ids(email_data["in_reply_to"]) + parse_message_ids(email_data["references"])[::-1]
+        for ref in references:
+            thread_id = self._thread_by_message_id.get(ref)
+            if thread_id:
+                self._thread_by_message_id.move_to_end(ref)
+                return thread_id
+
+        thread_id = resolver.resolve(email_data)
+        if thread_id:
+            return thread_id
+
+        # The resolver cannot see rows of the batch being built
+        if (references or is_reply_subject(email_data["subject"])) and settings.THREAD_MATCH_BY_SUBJECT:
+            participants = set(parse_addresses(email_data["sender"])) | set(parse_addresses(email_data["recipients"]))
+            for candidate, others in reversed(pending_subjects.get(normalize_subject(email_data["subject"]), [])):
+                if participants & others:
+                    return candidate
+        return None
+
+    def _remember(self, message_id: str, thread_id: str):
+        self._thread_by_message_id[message_id] = thread_id
+        if len(self._thread_by_message_id) > settings.IMPORT_THREAD_CACHE_SIZE:
+            self._thread_by_message_id.popitem(last=False)
+
+    def _skip(self, reason: str):
+        self.stats[reason] += 1
+        metrics.incr("import_skipped", reason=reason)
+
+    def _report(self, start: float) -> dict:
+        elapsed = time.perf_counter() - start
+        return {
+            **self.stats,
+            "elapsed_seconds": round(elapsed, 2),
+            "messages_per_second": round(self.stats["read"] / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+def summarize_threads(session_factory, thread_ids: Iterable[str], concurrency: Optional[int] = None) -> int:
+    """
+    Summarises the latest email of each thread in the bulk lane, at most
+    `concurrency` at a time. Threads whose latest email already has a summary
+    are skipped. Returns the number of summaries written.
+    """
+    from backend.ai.email_processor import EmailProcessor
+
+    def summarize(thread_id: str) -> bool:
+        db = session_factory()
+        try:
+            latest = (
+                db.query(Email)
+                .filter(Email.thread_id == thread_id)
+                .order_by(Email.received_at.desc(), Email.id.desc())
+                .first()
+            )
+            if latest is None or latest.summary is not None:
+                return False
+            with use_lane(LANE_BULK):
+                EmailProcessor(db).summarize_email(latest)
+            return True
+        except Exception:
+            logger.exception("Summary failed for thread %s", thread_id)
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    workers = max(1, concurrency or settings.IMPORT_SUMMARY_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(summarize, thread_ids))
@@ -0,0 +1,446 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import uuid
+from email.header import decode_header, make_header
+from email.message import Message
+from email.parser import BytesHeaderParser
+from email.policy import compat32
+from email.utils import parsedate_to_datetime
+from datetime import timezone
+from typing import Iterable, Iterator, List, Optional
+
+from backend.core.config import settings
+from backend.core.metrics import metrics
+from backend.core.thread_resolver import parse_addresses, parse_message_ids
+
+_HEADER_LINE = re.compile(r"^[A-Za-z][A-Za-z0-9-]*:")
+_TAG = re.compile(r"<[^>]+>")
+_BLANK_LINES = re.compile(r"\n\s*\n\s*\n+")
+
+# Lines longer than this are passed on in fragments; boundary lines are far shorter
+MAX_LINE = 8192
+TEXT_CHUNK = 64 * 1024
+
+# Headers rendered into the LLM prompt in place of the raw message
+PROMPT_HEADERS = ("From", "To", "Cc", "Date", "Subject")
+
+
+class MimeSizeError(ValueError):
+    """The message exceeds MIME_MAX_TOTAL_BYTES or MIME_MAX_HEADER_BYTES."""
+
+
+def looks_like_message(text: str) -> bool:
+    """True when the text starts with an RFC 822 header block."""
+    return bool(_HEADER_LINE.match(text[:1024].lstrip()))
+
+
+def iter_text_chunks(text: str, size: int = TEXT_CHUNK) -> Iterator[bytes]:
+    for i in range(0, len(text), size):
+        yield text[i:i + size].encode("utf-8", errors="surrogateescape")
+
+
+def decode_header_value(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return value
+
+
+class AttachmentStore:
+    """
+    Content-addressed attachment files: <root>/<aa>/<bb>/<sha256>. Identical
+    attachments are stored once; a part is streamed to a temporary file while
+    hashing and renamed into place when complete.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.ATTACHMENT_DIR
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def writer(self) -> "BlobWriter":
+        return BlobWriter(self)
+
+
+class BlobWriter:
+    def __init__(self, store: AttachmentStore):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = None
+        self._tmp_path = None
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        self._open().write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def commit(self) -> str:
+        digest = self.finish()
+        self.publish()
+        return digest
+
+    def finish(self) -> str:
+        """Completes the blob but leaves it in the temporary directory until publish() or abort()."""
+        self._open().close()
+        return self._hash.hexdigest()
+
+    def publish(self):
+        final = self.store.path(self._hash.hexdigest())
+        if os.path.exists(final):
+            os.unlink(self._tmp_path)
+            metrics.incr("attachments_deduplicated")
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(self._tmp_path, final)
+        self._file = None
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self._tmp_path)
+            self._file = None
+
+    def _open(self):
+        if self._file is None:
+            tmp_dir = os.path.join(self.store.root, "tmp")
+            os.makedirs(tmp_dir, exist_ok=True)
+            self._tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+            self._file = open(self._tmp_path, "wb")
+        return self._file
+
+
+class _Decoder:
+    """Incremental Content-Transfer-Encoding decoder."""
+
+    def __init__(self, encoding: str):
+        self.encoding = (encoding or "").strip().lower()
+        self._rest = b""
+
+    def decode(self, data: bytes, final: bool = False) -> bytes:
+        if self.encoding == "base64":
+            data = self._rest + b"".join(data.split())
+            usable = len(data) if final else len(data) - len(data) % 4
+            self._rest = data[usable:]
+            try:
+                return base64.b64decode(data[:usable] + (b"=" * (-usable % 4) if final else b""))
+            except binascii.Error:
+                return b""
+        if self.encoding == "quoted-printable":
+            data = self._rest + data
+            cut = len(data) if final else data.rfind(b"\n") + 1
+            self._rest = data[cut:]
+            return binascii.a2b_qp(data[:cut])
+        return data
+
+
+class _TextSink:
+    def __init__(self, content_type: str, charset: Optional[str], encoding: str, limit: int):
+        self.content_type = content_type
+        self.charset = charset or "utf-8"
+        self.limit = limit
+        self.truncated = False
+        self._decoder = _Decoder(encoding)
+        self._parts: List[bytes] = []
+        self._size = 0
+
+    def write(self, data: bytes):
+        self._append(self._decoder.decode(data))
+
+    def close(self) -> str:
+        self._append(self._decoder.decode(b"", final=True))
+        raw = b"".join(self._parts)
+        try:
+            return raw.decode(self.charset, errors="replace")
+        except LookupError:
+            return raw.decode("utf-8", errors="replace")
+
+    def _append(self, data: bytes):
+        room = self.limit - self._size
+        if len(data) > room:
+            data = data[:max(room, 0)]
+            self.truncated = True
+        if data:
+            self._parts.append(data)
+            self._size += len(data)
+
+
+class _AttachmentSink:
+    def __init__(self, store: AttachmentStore, filename: Optional[str], content_type: str, encoding: str, limit: int,
+                 staged: Optional[List[BlobWriter]] = None):
+        self.filename = filename
+        self.staged = staged
+        self.content_type = content_type
+        self.limit = limit
+        self.size = 0
+        self._decoder = _Decoder(encoding)
+        self._writer: Optional[BlobWriter] = store.writer()
+
+    def write(self, data: bytes):
+        self._store(self._decoder.decode(data))
+
+    def close(self) -> dict:
+        self._store(self._decoder.decode(b"", final=True))
+        sha256 = None
+        if self._writer is not None and self.staged is not None:
+            sha256 = self._writer.finish()
+            self.staged.append(self._writer)
+        elif self._writer is not None:
+            sha256 = self._writer.commit()
+        metrics.incr("attachments", status="stored" if sha256 else "too_large")
+        return {
+            "sha256": sha256,
+            "filename": self.filename,
+            "content_type": self.content_type,
+            "size": self.size,
+            "status": "stored" if sha256 else "too_large",
+        }
+
+    def _store(self, data: bytes):
+        self.size += len(data)
+        if self._writer is None:
+            return
+        if self.size > self.limit:
+            # Over the per-part limit: drop what was written and discard the rest
+            self._writer.abort()
+            self._writer = None
+            return
+        self._writer.write(data)
+
+
+class ParsedMime:
+    def __init__(self, headers: Message, text: str, attachments: List[dict], truncated: bool, size: int,
+                 staged: Optional[List[BlobWriter]] = None):
+        self.headers = headers
+        self.text = text
+        self.attachments = attachments
+        self.truncated = truncated
+        self.size = size
+        self.staged = staged if staged is not None else []
+
+    def save_attachments(self):
+        """Moves staged attachment blobs into the store; call once the message is accepted."""
+        while self.staged:
+            self.staged.pop().publish()
+
+    def discard_attachments(self):
+        """Deletes staged attachment blobs of a message that is not stored."""
+        while self.staged:
+            self.staged.pop().abort()
+
+    def is_message(self) -> bool:
+        return any(self.headers.get(name) for name in ("From", "Subject", "Message-ID", "Content-Type"))
+
+    def header(self, name: str) -> str:
+        return decode_header_value(self.headers.get(name))
+
+    def prompt_text(self) -> str:
+        """Compact rendering for the LLM: a few headers plus the extracted text, no attachment payloads."""
+        lines = [f"{name}: {self.header(name)}" for name in PROMPT_HEADERS if self.headers.get(name)]
+        for attachment in self.attachments:
+            lines.append(f"Attachment: {attachment['filename'] or 'unnamed'} ({attachment['content_type']}, {attachment['size']} bytes)")
+        return "\n".join(lines) + "\n\n" + self.text
+
+    def threading_headers(self) -> dict:
+        message_ids = parse_message_ids(self.headers.get("Message-ID"))
+        recipients = parse_addresses(", ".join(self.headers.get_all("To", []) + self.headers.get_all("Cc", [])))
+        return {
+            "message_id": message_ids[0] if message_ids else None,
+            "in_reply_to": " ".join(parse_message_ids(self.headers.get("In-Reply-To"))) or None,
+            "references": " ".join(parse_message_ids(self.headers.get("References"))) or None,
+            "recipients": ", ".join(recipients) or None,
+        }
+
+    def email_data(self) -> dict:
+        received_at = None
+        if self.headers.get("Date"):
+            try:
+                received_at = parsedate_to_datetime(self.headers["Date"])
+                if received_at.tzinfo is None:
+                    received_at = received_at.replace(tzinfo=timezone.utc)
+            except (TypeError, ValueError):
+                received_at = None
+        return {
+            "sender": self.header("From") or "unknown@example.com",
+            "subject": self.header("Subject") or "No Subject",
+            "body": self.text,
+            "received_at": received_at,
+            "attachments": self.attachments,
+            **self.threading_headers(),
+        }
+
+
+class MimeStreamParser:
+    """
+    Single-pass MIME parser fed in chunks.
+
+    Text parts (text/plain, or HTML with the tags stripped when there is no
+    plain part) are decoded into a buffer capped at MIME_MAX_TEXT_BYTES; every
+    other leaf part is decoded straight into the attachment store and never
+    held in memory. Parts larger than MIME_MAX_PART_BYTES are dropped as they
+    stream (recorded with status "too_large"), and MimeSizeError is raised as
+    soon as the input passes MIME_MAX_TOTAL_BYTES.
+
+    With `stage=True` attachment blobs stay in the store's temporary
+    directory until ParsedMime.save_attachments(), so a message that is
+    rejected after parsing (discard_attachments()) leaves nothing behind.
+    """
+
+    def __init__(self, store: Optional[AttachmentStore] = None, stage: bool = False):
+        self.store = store or AttachmentStore()
+        self.staged: Optional[List[BlobWriter]] = [] if stage else None
+        self.max_total = settings.MIME_MAX_TOTAL_BYTES
+        self.max_part = settings.MIME_MAX_PART_BYTES
+        self.max_text = settings.MIME_MAX_TEXT_BYTES
+        self.max_header = settings.MIME_MAX_HEADER_BYTES
+        self.headers: Optional[Message] = None
+        self.attachments: List[dict] = []
+        self._plain: List[str] = []
+        self._html: List[str] = []
+        self._truncated = False
+        self._size = 0
+        self._buffer = bytearray()
+        self._in_headers = True
+        self._header_lines: List[bytes] = []
+        self._header_size = 0
+        self._boundaries: List[bytes] = []
+        self._sink = None
+        self._pending_newline = b""
+        self._continuation = False
+
+    def feed(self, chunk: bytes):
+        self._size += len(chunk)
+        if self.max_total and self._size > self.max_total:
+            self._abort()
+            raise MimeSizeError(f"Message exceeds {self.max_total} bytes")
+        self._buffer += chunk
+        pos = 0
+        while True:
+            end = self._buffer.find(b"\n", pos)
+            if end < 0:
+                break
+            self._line(bytes(self._buffer[pos:end + 1]), partial=False)
+            pos = end + 1
+        if len(self._buffer) - pos > MAX_LINE:
+            self._line(bytes(self._buffer[pos:]), partial=True)
+            pos = len(self._buffer)
+        del self._buffer[:pos]
+
+    def close(self) -> ParsedMime:
+        if self._buffer:
+            self._line(bytes(self._buffer), partial=False)
+            self._buffer.clear()
+        if self._in_headers:
+            self._end_headers()
+        self._finish_part()
+        text = "\n".join(t.strip() for t in self._plain if t.strip())
+        if not text and self._html:
+            text = _BLANK_LINES.sub("\n\n", _TAG.sub("", "\n".join(self._html))).strip()
+        return ParsedMime(self.headers or Message(), text, self.attachments, self._truncated, self._size, self.staged)
+
+    def _line(self, line: bytes, partial: bool):
+        starts_line = not self._continuation
+        self._continuation = partial
+
+        if self._in_headers:
+            self._header_size += len(line)
+            if self._header_size > self.max_header:
+                self._abort()
+                raise MimeSizeError(f"Header block exceeds {self.max_header} bytes")
+            if starts_line and not partial and not line.strip():
+                self._end_headers()
+            else:
+                self._header_lines.append(line)
+            return
+
+        if starts_line and self._boundaries and line.startswith(b"--"):
+            marker = line.rstrip()
+            for depth in range(len(self._boundaries) - 1, -1, -1):
+                boundary = b"--" + self._boundaries[depth]
+                if marker == boundary:
+                    self._finish_part()
+                    del self._boundaries[depth + 1:]
+                    self._in_headers = True
+                    return
+                if marker == boundary + b"--":
+                    self._finish_part()
+                    del self._boundaries[depth:]
+                    return
+
+        if self._sink is not None:
+            body = line.rstrip(b"\r\n")
+            self._sink.write(self._pending_newline + body)
+            self._pending_newline = line[len(body):]
+
+    def _end_headers(self):
+        headers = BytesHeaderParser(policy=compat32).parsebytes(b"".join(self._header_lines))
+        self._header_lines = []
+        self._header_size = 0
+        self._in_headers = False
+        if self.headers is None:
+            self.headers = headers
+        self._start_part(headers)
+
+    def _start_part(self, headers: Message):
+        content_type = headers.get_content_type()
+        encoding = headers.get("Content-Transfer-Encoding", "")
+        self._pending_newline = b""
+        if headers.get_content_maintype() == "multipart":
+            boundary = headers.get_param("boundary")
+            if boundary:
+                self._boundaries.append(str(boundary).encode("utf-8", errors="surrogateescape"))
+                self._sink = None  # preamble
+                return
+        filename = headers.get_filename()
+        disposition = (headers.get("Content-Disposition") or "").split(";")[0].strip().lower()
+        if content_type in ("text/plain", "text/html") and not filename and disposition != "attachment":
+            remaining = self.max_text - sum(len(t) for t in self._plain + self._html)
+            self._sink = _TextSink(content_type, headers.get_content_charset(), encoding, max(remaining, 0))
+        else:
+            self._sink = _AttachmentSink(
+                self.store, decode_header_value(filename) or None, content_type, encoding, self.max_part, self.staged
+            )
+
+    def _finish_part(self):
+        sink, self._sink = self._sink, None
+        if isinstance(sink, _TextSink):
+            text = sink.close()
+            self._truncated = self._truncated or sink.truncated
+            (self._plain if sink.content_type == "text/plain" else self._html).append(text)
+        elif isinstance(sink, _AttachmentSink):
+            self.attachments.append(sink.close())
+
+    def discard(self):
+        """Drops the part being written and every staged blob, e.g. when the upload fails midway."""
+        self._abort()
+
+    def _abort(self):
+        if isinstance(self._sink, _AttachmentSink) and self._sink._writer:
+            self._sink._writer.abort()
+        self._sink = None
+        while self.staged:
+            self.staged.pop().abort()
+
+
+def parse_stream(chunks: Iterable[bytes], store: Optional[AttachmentStore] = None, stage: bool = False) -> ParsedMime:
+    parser = MimeStreamParser(store, stage)
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+        return parser.close()
+    except BaseException:
+        parser.discard()
+        raise
+
+
+def parse_bytes(raw: bytes, store: Optional[AttachmentStore] = None, stage: bool = False) -> ParsedMime:
+    view = memoryview(raw)
+    return parse_stream((view[i:i + TEXT_CHUNK] for i in range(0, len(raw), TEXT_CHUNK)), store, stage)
@@ -0,0 +1,341 @@
+import argparse
+import logging
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.header import Header
+from email.message import Message
+from email.utils import formatdate, make_msgid
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.core.events import REPLY, event_bus
+from backend.core.metrics import metrics
+from backend.core.thread_resolver import is_reply_subject, parse_addresses
+from backend.db.models import Email, GeneratedReply, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# References keeps the thread root plus the most recent ids (RFC 5322 allows trimming the middle)
+MAX_REFERENCES = 20
+
+# (outbox id, reply id, attempt number, message) for a leased row
+Claimed = Tuple[int, int, int, Message]
+
+
+class ReplyAlreadySent(Exception):
+    """The reply is being (or has been) delivered; it is not sent a second time."""
+
+
+def enqueue_reply(db: Session, reply: GeneratedReply) -> OutboxMessage:
+    """
+    Queues a generated reply for delivery to the original sender, with
+    In-Reply-To/References built from the thread's stored Message-IDs.
+    A reply has at most one outbox row: queuing it again (a client retry, a
+    regenerated reply) rewrites the row still waiting to go out, and raises
+    ReplyAlreadySent once delivery has started. The caller commits.
+    """
+    email = reply.email or db.get(Email, reply.email_id)
+    thread_ids = [
+        row[0] for row in db.query(Email.message_id)
+        .filter(Email.thread_id == email.thread_id, Email.message_id.isnot(None), Email.received_at <= email.received_at)
+        .order_by(Email.received_at, Email.id)
+        .all()
+    ]
+    if email.message_id and email.message_id not in thread_ids:
+        thread_ids.append(email.message_id)
+    if len(thread_ids) > MAX_REFERENCES:
+        thread_ids = thread_ids[:1] + thread_ids[-(MAX_REFERENCES - 1):]
+
+    recipients = parse_addresses(email.sender)
+    fields = dict(
+        to_address=recipients[0] if recipients else email.sender,
+        subject=email.subject if is_reply_subject(email.subject) else f"Re: {email.subject}",
+        body=reply.reply_text,
+        in_reply_to=email.message_id,
+        references=" ".join(thread_ids) or None,
+        status="queued",
+        next_attempt_at=datetime.now(timezone.utc),
+    )
+    existing = None
+    if reply.id is not None:
+        existing = (
+            db.query(OutboxMessage)
+            .filter(OutboxMessage.reply_id == reply.id)
+            .order_by(OutboxMessage.id.desc())
+            .first()
+        )
+    if existing is not None:
+        # Conditional, so a row the worker has just leased is not rewritten under it
+        superseded = db.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id == existing.id, OutboxMessage.status.in_(["queued", "failed"]))
+            .values(**fields, attempts=0, last_error=None)
+        ).rowcount
+        if not superseded:
+            raise ReplyAlreadySent(f"Reply {reply.id} is already {existing.status}")
+        reply.delivery_status = "queued"
+        metrics.incr("outbox_superseded")
+        return existing
+
+    outbox = OutboxMessage(
+        reply=reply,
+        message_id=make_msgid(domain=settings.SMTP_FROM_ADDRESS.rpartition("@")[2] or None),
+        **fields,
+    )
+    reply.delivery_status = "queued"
+    db.add(outbox)
+    metrics.incr("outbox_enqueued")
+    return outbox
+
+
+def build_message(outbox: OutboxMessage) -> Message:
+    # compat32 Message: the default-policy EmailMessage re-parses every header
+    # through the header registry, which dominated send time in the benchmark
+    message = Message()
+    message["From"] = settings.SMTP_FROM_ADDRESS
+    message["To"] = outbox.to_address
+    message["Subject"] = _header(outbox.subject or "")
+    message["Date"] = formatdate(localtime=False)
+    message["Message-ID"] = outbox.message_id
+    if outbox.in_reply_to:
+        message["In-Reply-To"] = outbox.in_reply_to
+    if outbox.references:
+        message["References"] = outbox.references
+    message["MIME-Version"] = "1.0"
+    message.set_payload(outbox.body or "", "utf-8")
+    return message
+
+
+def _header(value: str):
+    return value if value.isascii() else Header(value, "utf-8")
+
+
+class SMTPConnectionPool:
+    """
+    Fixed-size pool of persistent SMTP sessions. Connections are opened
+    lazily, reused across messages (one EHLO/STARTTLS/AUTH per connection, not
+    per message) and replaced after a disconnect.
+    """
+
+    def __init__(self, host: str, port: int, size: int):
+        self.host = host
+        self.port = port
+        self.size = size
+        self._idle: "queue.Queue[Optional[smtplib.SMTP]]" = queue.Queue()
+        for _ in range(size):
+            self._idle.put(None)
+        self.connections_opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        if settings.SMTP_USE_SSL:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=settings.SMTP_TIMEOUT)
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=settings.SMTP_TIMEOUT)
+            conn.ehlo()
+            if settings.SMTP_STARTTLS and conn.has_extn("starttls"):
+                conn.starttls()
+                conn.ehlo()
+        if settings.SMTP_USERNAME:
+            conn.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        self.connections_opened += 1
+        metrics.incr("smtp_connections_opened")
+        return conn
+
+    def send(self, message: Message):
+        conn = self._idle.get()
+        try:
+            if conn is None:
+                conn = self._connect()
+            try:
+                conn.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # Server closed an idle session: reconnect once and resend
+                conn = self._connect()
+                conn.send_message(message)
+        except smtplib.SMTPException:
+            # The session survives a rejected message; reset the transaction and keep it
+            conn = _reset_or_close(conn)
+            raise
+        except Exception:
+            if conn is not None:
+                _quietly_close(conn)
+            conn = None
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for _ in range(self.size):
+            conn = self._idle.get()
+            if conn is not None:
+                _quietly_close(conn)
+            self._idle.put(None)
+
+
+def _reset_or_close(conn: Optional[smtplib.SMTP]) -> Optional[smtplib.SMTP]:
+    if conn is None:
+        return None
+    try:
+        conn.rset()
+        return conn
+    except Exception:
+        _quietly_close(conn)
+        return None
+
+
+def _quietly_close(conn: smtplib.SMTP):
+    try:
+        conn.quit()
+    except Exception:
+        conn.close()
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class OutboxWorker:
+    """
+    Delivers queued outbox rows through an SMTPConnectionPool.
+
+    Each batch is claimed with a lease (`next_attempt_at` pushed forward) so a
+    crashed worker's rows are picked up again, then sent concurrently over the
+    pool's connections. Transient failures are retried with exponential
+    backoff up to OUTBOX_MAX_ATTEMPTS; 5xx rejections fail immediately. Every
+    outcome is mirrored onto the GeneratedReply's delivery_status.
+    """
+
+    def __init__(self, session_factory, pool: Optional[SMTPConnectionPool] = None):
+        self.session_factory = session_factory
+        self.pool = pool or SMTPConnectionPool(settings.SMTP_HOST, settings.SMTP_PORT, settings.SMTP_POOL_SIZE)
+        self._stop = threading.Event()
+
+    def run_once(self, batch_size: Optional[int] = None) -> int:
+        """Sends one batch of due messages; returns how many were attempted."""
+        db = self.session_factory()
+        try:
+            batch = self._claim(db, batch_size or settings.OUTBOX_BATCH_SIZE)
+            if not batch:
+                return 0
+            with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+                errors = list(executor.map(self._send, [message for _, _, _, message in batch]))
+            self._record(db, batch, errors)
+            return len(batch)
+        finally:
+            db.close()
+
+    def run_forever(self, poll_interval: Optional[float] = None):
+        interval = poll_interval if poll_interval is not None else settings.OUTBOX_POLL_INTERVAL
+        while not self._stop.is_set():
+            try:
+                sent = self.run_once()
+            except Exception:
+                logger.exception("Outbox batch failed")
+                sent = 0
+            if not sent:
+                self._stop.wait(interval)
+        self.pool.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def _claim(self, db: Session, limit: int) -> List[Claimed]:
+        """Leases due rows and builds their messages before the commit expires them."""
+        now = datetime.now(timezone.utc)
+        rows = (
+            db.query(OutboxMessage)
+            .filter(or_(OutboxMessage.status == "queued", OutboxMessage.status == "sending"))
+            .filter(OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        lease = now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        batch = []
+        for item in rows:
+            item.status = "sending"
+            item.attempts = (item.attempts or 0) + 1
+            item.next_attempt_at = lease
+            batch.append((item.id, item.reply_id, item.attempts, build_message(item)))
+        db.commit()
+        return batch
+
+    def _send(self, message: Message) -> Optional[Exception]:
+        start = time.perf_counter()
+        try:
+            self.pool.send(message)
+        except Exception as e:
+            return e
+        metrics.observe("smtp_send_seconds", time.perf_counter() - start)
+        return None
+
+    def _record(self, db: Session, batch: List[Claimed], errors: List[Optional[Exception]]):
+        """Writes outcomes back with one UPDATE per outcome rather than per row."""
+        now = datetime.now(timezone.utc)
+        sent, failed = [], []
+        for (outbox_id, reply_id, attempts, _), error in zip(batch, errors):
+            if error is None:
+                sent.append((outbox_id, reply_id))
+            elif _is_permanent(error) or attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                failed.append((outbox_id, reply_id, str(error)))
+            else:
+                db.execute(update(OutboxMessage).where(OutboxMessage.id == outbox_id).values(
+                    status="queued",
+                    last_error=str(error),
+                    next_attempt_at=now + timedelta(seconds=settings.OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1))),
+                ))
+                metrics.incr("outbox_retried")
+
+        if sent:
+            db.execute(update(OutboxMessage).where(OutboxMessage.id.in_([o for o, _ in sent])).values(
+                status="sent", sent_at=now, last_error=None))
+            db.execute(update(GeneratedReply).where(GeneratedReply.id.in_([r for _, r in sent])).values(
+                delivery_status="sent", sent_at=now))
+            metrics.incr("outbox_sent", len(sent))
+        for outbox_id, reply_id, error in failed:
+            db.execute(update(OutboxMessage).where(OutboxMessage.id == outbox_id).values(status="failed", last_error=error))
+            db.execute(update(GeneratedReply).where(GeneratedReply.id == reply_id).values(delivery_status="failed"))
+            metrics.incr("outbox_failed")
+        db.commit()
+
+        outcomes = {reply_id: "sent" for _, reply_id in sent}
+        outcomes.update((reply_id, "failed") for _, reply_id, _ in failed)
+        if outcomes:
+            # One lookup per batch for the ids the events carry
+            for reply_id, email_id, thread_id in (
+                db.query(GeneratedReply.id, Email.id, Email.thread_id)
+                .join(Email, Email.id == GeneratedReply.email_id)
+                .filter(GeneratedReply.id.in_(outcomes))
+            ):
+                event_bus.publish(REPLY, thread_id, email_id, outcomes[reply_id])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued replies from the outbox over SMTP.")
+    parser.add_argument("--once", action="store_true", help="Send one batch and exit")
+    args = parser.parse_args()
+
+    from backend.db.database import SessionLocal
+    logging.basicConfig(level=logging.INFO)
+    worker = OutboxWorker(SessionLocal)
+    if args.once:
+        print(f"Attempted {worker.run_once()} messages")
+        worker.pool.close()
+    else:
+        worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
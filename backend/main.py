@@ -1,20 +1,116 @@
-from fastapi import FastAPI
-from backend.api.v1.endpoints import email, threads
-from backend.db.database import engine, Base
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from backend.ai.circuit_breaker import STATE_CLOSED, circuit_snapshot
+from backend.ai.endpoint_pool import get_pool
+from backend.api.v1.endpoints import analytics, email, events, threads
+from backend.db.database import engine, Base, get_db, read_router
+from backend.db.models import PendingSummary
+from backend.core.config import settings
+from backend.core.limits import BodySizeLimitMiddleware
+from backend.core.metrics import metrics
 
 from contextlib import asynccontextmanager
+import threading
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create tables on startup
     Base.metadata.create_all(bind=engine)
+
+    # Optionally deliver auto_send replies from this process
+    outbox_worker = None
+    if settings.OUTBOX_WORKER_ENABLED:
+        from backend.db.database import SessionLocal
+        from backend.mail.outbound import OutboxWorker
+        outbox_worker = OutboxWorker(SessionLocal)
+        threading.Thread(target=outbox_worker.run_forever, name="outbox-worker", daemon=True).start()
+
+    # Optionally poll the configured IMAP folder for new mail
+    mailbox_sync = None
+    if settings.IMAP_SYNC_ENABLED:
+        from backend.db.database import SessionLocal
+        from backend.mail.imap_sync import MailboxSync
+        mailbox_sync = MailboxSync(SessionLocal)
+        threading.Thread(target=mailbox_sync.run_forever, name="mailbox-sync", daemon=True).start()
+
+    # Optionally summarise emails accepted in degraded mode once the LLM is back
+    summary_backfill = None
+    if settings.SUMMARY_BACKFILL_ENABLED:
+        from backend.db.database import SessionLocal
+        from backend.ai.summary_queue import SummaryBackfillWorker
+        summary_backfill = SummaryBackfillWorker(SessionLocal)
+        threading.Thread(target=summary_backfill.run_forever, name="summary-backfill", daemon=True).start()
+
+    # Keep the analytics rollups current so GET /api/v1/analytics only reads
+    rollup_refresher = None
+    if settings.ANALYTICS_REFRESH_ENABLED:
+        from backend.db.database import SessionLocal
+        from backend.core.analytics import RollupRefresher
+        rollup_refresher = RollupRefresher(SessionLocal)
+        threading.Thread(target=rollup_refresher.run_forever, name="analytics-refresh", daemon=True).start()
+
+    # Optionally move idle threads into the cold archive
+    thread_archiver = None
+    if settings.ARCHIVE_ENABLED:
+        from backend.db.database import SessionLocal
+        from backend.core.archive import ThreadArchiver
+        thread_archiver = ThreadArchiver(SessionLocal)
+        threading.Thread(target=thread_archiver.run_forever, name="thread-archiver", daemon=True).start()
+
     yield
 
+    if thread_archiver:
+        thread_archiver.stop()
+    if rollup_refresher:
+        rollup_refresher.stop()
+    if summary_backfill:
+        summary_backfill.stop()
+    if outbox_worker:
+        outbox_worker.stop()
+    if mailbox_sync:
+        mailbox_sync.stop()
+
 app = FastAPI(title="Context Aware AI Email Reply", lifespan=lifespan)
 
+# Oversized bodies are refused before they are read; raw email endpoints get a larger allowance
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.MAX_REQUEST_BYTES,
+    path_limits={"/api/v1/email/webhook": settings.WEBHOOK_MAX_REQUEST_BYTES},
+)
+
 app.include_router(email.router, prefix="/api/v1/email", tags=["email"])
 app.include_router(threads.router, prefix="/api/v1/threads", tags=["threads"])
+app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["analytics"])
+app.include_router(events.router, prefix="/api/v1/events", tags=["events"])
+app.include_router(events.ws_router, tags=["events"])
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Context Aware AI Email Reply API"}
+
+@app.get("/health")
+def health(db: Session = Depends(get_db)):
+    # An open LLM circuit degrades the service (summaries are queued) but does not take it down
+    try:
+        db.execute(text("SELECT 1"))
+        pending = db.query(PendingSummary).filter(PendingSummary.status == "pending").count()
+    except Exception:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "database": "unavailable", "llm": circuit_snapshot()})
+    circuits = circuit_snapshot()
+    degraded = any(circuit["state"] != STATE_CLOSED for circuit in circuits.values())
+    pool = get_pool()
+    return {
+        "status": "degraded" if degraded else "ok",
+        "database": "ok",
+        "llm": circuits,
+        "llm_endpoints": pool.snapshot() if pool else None,
+        "read_replicas": {name: name in read_router.healthy for name in read_router.replicas},
+        "pending_summaries": pending,
+    }
+
+@app.get("/metrics")
+def read_metrics():
+    return metrics.snapshot()
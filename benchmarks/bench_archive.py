@@ -0,0 +1,141 @@
+"""
+Hot-table size and latency as mail volume grows, with and without cold archival.
+
+Simulates `--months` months of traffic into two SQLite databases. Every month
+adds `--threads` threads of `--emails` emails, from a fixed pool of senders.
+After each month the second database archives threads idle for more than
+`--after-days` days, as the ARCHIVE_ENABLED worker would. Per month it reports:
+
+- hot email rows;
+- insert time per 1,000 emails;
+- p50 of the inbox listing (the 20 most recently active threads, which
+  aggregates over every hot email);
+- p50 of GET /threads/{id} for current and archived threads.
+
+    python -m benchmarks.bench_archive [--months 12] [--threads 300] [--emails 8] [--backend segments]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.core.archive import ThreadArchiver
+from backend.core.config import settings
+from backend.db.database import Base, get_db, get_read_db
+from backend.db.models import Email, Thread
+from backend.main import app
+
+SENDERS = 200
+
+
+def add_month(session, month_start: datetime, n_threads: int, n_emails: int, rng: random.Random):
+    """Inserts one month of threads; returns (thread ids, seconds spent inserting)."""
+    thread_ids, emails = [], []
+    for _ in range(n_threads):
+        thread_id = str(uuid.uuid4())
+        thread_ids.append(thread_id)
+        sender = f"customer{rng.randrange(SENDERS)}@example.com"
+        ts = month_start + timedelta(hours=rng.randint(0, 24 * 20))
+        for i in range(n_emails):
+            emails.append({
+                "id": str(uuid.uuid4()), "thread_id": thread_id, "sender": sender,
+                "subject": "Re: Order status" if i else "Order status",
+                "body": " ".join(rng.choice(["order", "invoice", "shipping", "refund", "thanks"]) for _ in range(60)),
+                "received_at": ts,
+            })
+            ts += timedelta(hours=rng.randint(1, 24))
+    t0 = time.perf_counter()
+    session.execute(insert(Thread), [{"id": t} for t in thread_ids])
+    for i in range(0, len(emails), 500):
+        session.execute(insert(Email), emails[i:i + 500])
+    session.commit()
+    return thread_ids, time.perf_counter() - t0
+
+
+def p50_ms(fn, samples) -> float:
+    timings = []
+    for sample in samples:
+        t0 = time.perf_counter()
+        fn(sample)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--threads", type=int, default=300, help="New threads per month")
+    parser.add_argument("--emails", type=int, default=8, help="Emails per thread")
+    parser.add_argument("--after-days", type=int, default=90)
+    parser.add_argument("--backend", choices=["table", "segments"], default="segments")
+    parser.add_argument("--queries", type=int, default=200, help="Samples per GET latency (a tenth for the inbox)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.ARCHIVE_DIR = os.path.join(tmp, "segments")
+        setups = {}
+        for name in ("hot only", "archived"):
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, name.replace(' ', '_') + '.db')}",
+                                   connect_args={"check_same_thread": False}, poolclass=StaticPool)
+            Base.metadata.create_all(bind=engine)
+            setups[name] = (engine, sessionmaker(bind=engine), random.Random(args.seed), [])
+
+        print(f"{args.threads} threads x {args.emails} emails per month; archive after {args.after_days} days "
+              f"({args.backend})")
+        print(f"{'month':<7}{'setup':<10}{'hot emails':>11}{'insert ms/1k':>14}{'inbox p50 ms':>14}"
+              f"{'GET new ms':>12}{'GET old ms':>12}")
+        # One client for the whole run; each setup swaps in its own session override
+        with TestClient(app) as client:
+            try:
+                for month in range(args.months):
+                    month_start = start + timedelta(days=30 * month)
+                    for name, (engine, Session, rng, threads) in setups.items():
+                        with Session() as session:
+                            new_threads, elapsed = add_month(session, month_start, args.threads, args.emails, rng)
+                        threads.append(new_threads)
+                        if name == "archived":
+                            archiver = ThreadArchiver(Session, after_days=args.after_days, backend=args.backend)
+                            archiver.run_once(now=month_start + timedelta(days=30))
+
+                        def override():
+                            with Session() as session:
+                                yield session
+
+                        app.dependency_overrides[get_db] = override
+                        app.dependency_overrides[get_read_db] = override
+                        with Session() as session:
+                            hot = session.scalar(select(func.count(Email.id)))
+                            last_activity = func.max(Email.received_at)
+                            inbox = p50_ms(lambda _: session.execute(
+                                select(Email.thread_id, last_activity).group_by(Email.thread_id)
+                                .order_by(last_activity.desc()).limit(20)
+                            ).all(), range(args.queries // 10))
+
+                            def get(thread_id):
+                                assert client.get(f"/api/v1/threads/{thread_id}").status_code == 200
+
+                            recent = p50_ms(get, [rng.choice(new_threads) for _ in range(args.queries)])
+                            old = p50_ms(get, [rng.choice(threads[0]) for _ in range(args.queries)]) if month else recent
+                        per_1k = elapsed * 1000 / (args.threads * args.emails) * 1000
+                        print(f"{month + 1:<7}{name:<10}{hot:>11,}{per_1k:>14.1f}{inbox:>14.3f}{recent:>12.3f}{old:>12.3f}")
+            finally:
+                app.dependency_overrides.clear()
+                for engine, *_ in setups.values():
+                    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Backend read load of the frontend's thread pages: full refetch per rerun vs change events.
+
+Seeds `--threads` threads of `--emails` emails, then simulates `--views`
+page reruns (Streamlit reruns the page on every click), with a new email in
+a random thread every `--change-every` views. Two clients watch the same
+backend:
+
+- refetch: GET /threads/?limit=100 on every rerun, as the pages used to;
+- events: the frontend's ThreadCache, which applies change events and
+  re-reads only the threads they name. It polls GET /events here; over the
+  /ws/events WebSocket the reruns without changes make no request at all.
+
+Reports requests, SQL statements and response bytes per page view, and
+checks that both clients end up showing the same threads.
+
+    python -m benchmarks.bench_events [--threads 100] [--emails 5] [--views 500] [--change-every 25]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.ai.email_processor import EmailProcessor
+from backend.db.database import Base, get_db, get_read_db
+from backend.main import app
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend", "streamlit_app"))
+from live import ThreadCache  # noqa: E402
+
+
+class BenchClient:
+    """The APIClient methods ThreadCache uses, over a TestClient, counting requests and bytes."""
+
+    def __init__(self, client: TestClient):
+        self.client = client
+        self.requests = self.bytes = 0
+
+    def _get(self, path, params=None):
+        response = self.client.get(f"/api/v1{path}", params=params)
+        assert response.status_code == 200, response.text
+        self.requests += 1
+        self.bytes += len(response.content)
+        return response.json()
+
+    def list_threads(self, skip=0, limit=100):
+        return self._get("/threads/", {"skip": skip, "limit": limit})
+
+    def get_thread(self, thread_id):
+        return self._get(f"/threads/{thread_id}")
+
+    def get_events(self, since=None):
+        return self._get("/events/", {"since": since} if since is not None else None)
+
+    def get_email_summary(self, email_id):
+        return self._get(f"/email/{email_id}/summary")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--emails", type=int, default=5, help="Emails per seeded thread")
+    parser.add_argument("--views", type=int, default=500, help="Page reruns to simulate")
+    parser.add_argument("--change-every", type=int, default=25, help="Views between new emails")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    rng = random.Random(args.seed)
+
+    with Session() as session:
+        processor = EmailProcessor(session)
+        thread_ids = []
+        for t in range(args.threads):
+            thread_id = f"thread-{t}"
+            thread_ids.append(thread_id)
+            for i in range(args.emails):
+                processor.store_email({"thread_id": thread_id, "sender": f"customer{t}@example.com",
+                                       "subject": f"Order {t}", "body": f"Message {i} about order {t}. " * 20})
+
+    def override():
+        with Session() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_read_db] = override
+    executed = [0]
+    event.listen(engine, "before_cursor_execute", lambda *_: executed.__setitem__(0, executed[0] + 1))
+    try:
+        with TestClient(app) as client:
+            refetch = BenchClient(client)
+            cache = ThreadCache(BenchClient(client))
+            clients = {"refetch": refetch, "events": cache.client}
+            statements = {name: 0 for name in clients}
+            elapsed = {name: 0.0 for name in clients}
+            changes = 0
+            for view in range(args.views):
+                if view and view % args.change_every == 0:
+                    with Session() as session:
+                        EmailProcessor(session).store_email({
+                            "thread_id": rng.choice(thread_ids), "sender": "agent@example.com",
+                            "subject": "Re: Order", "body": "Following up on your order.",
+                        })
+                    changes += 1
+                for name in clients:
+                    before = executed[0]
+                    t0 = time.perf_counter()
+                    if name == "refetch":
+                        refetch.list_threads(limit=100)
+                    else:
+                        cache.refresh()
+                    elapsed[name] += time.perf_counter() - t0
+                    statements[name] += executed[0] - before
+
+            final = {t["id"]: len(t["emails"]) for t in refetch.list_threads(limit=100)}
+            cache.refresh()
+            assert {t["id"]: len(t["emails"]) for t in cache.list()} == final, "event-driven view diverged"
+            costs = {name: (c.requests, statements[name], c.bytes, elapsed[name]) for name, c in clients.items()}
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+    print(f"{args.threads} threads x {args.emails} emails; {args.views} page views, {changes} new emails")
+    print(f"{'client':<9}{'requests/view':>15}{'SQL/view':>10}{'KB/view':>9}{'ms/view':>9}")
+    for name, (requests, statements, size, seconds) in costs.items():
+        print(f"{name:<9}{requests / args.views:>15.2f}{statements / args.views:>10.2f}"
+              f"{size / args.views / 1024:>9.1f}{seconds * 1000 / args.views:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
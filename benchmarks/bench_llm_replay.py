@@ -0,0 +1,190 @@
+"""
+Deterministic performance regression run over recorded LLM responses.
+
+Drives a corpus of emails through the full FastAPI app (webhook parsing,
+/submit summaries and generate-reply) against a fresh SQLite database, with
+every LLM call answered from a cassette (backend/ai/cassette.py). Reports the
+non-LLM time per endpoint (wall time minus replayed latency) and prompt
+tokens per task, and compares both with a saved baseline.
+
+Record a cassette once against the live provider (needs OPENAI_API_KEY):
+
+    python -m benchmarks.bench_llm_replay --record --cassette corpus.jsonl.gz
+
+Then, per commit:
+
+    python -m benchmarks.bench_llm_replay --cassette corpus.jsonl.gz --save-baseline base.json
+    python -m benchmarks.bench_llm_replay --cassette corpus.jsonl.gz --baseline base.json
+
+The second form exits with status 1 when an endpoint's median overhead or a
+task's prompt tokens grew beyond the tolerances. A corpus file (--corpus) has
+one JSON object per line: {"kind": "submit", "email": {...}} or
+{"kind": "webhook", "raw": "..."}, optionally with "reply_tone".
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+_tmp = tempfile.mkdtemp(prefix="llm-replay-")
+# Thread context feeds into the prompts, so every run starts from an empty database
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'replay.db')}"
+os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+from fastapi.testclient import TestClient
+
+from backend.ai.cassette import Cassette, use_cassette
+from backend.db.database import Base, engine
+from backend.main import app
+
+TOPICS = [
+    ("Pricing for the team plan", "Could you send pricing for 25 seats and tell me whether annual billing is discounted?"),
+    ("Invoice 4471 is wrong", "We were charged twice for March. Please refund the duplicate charge as soon as possible."),
+    ("Meeting next week", "Are you available Tuesday or Wednesday afternoon to go through the onboarding plan?"),
+    ("Contract renewal", "Our contract ends on the 30th. What do we need to do to renew for another year?"),
+    ("Login problems", "Since this morning none of our users can log in. This is blocking the whole support team."),
+]
+
+
+def default_corpus(n: int, seed: int):
+    rng = random.Random(seed)
+    for i in range(n):
+        subject, body = TOPICS[i % len(TOPICS)]
+        sender = f"customer{rng.randint(1, 50)}@example.com"
+        if i % 3 == 2:
+            raw = f"From: {sender}\nTo: support@example.com\nSubject: {subject}\n\nHi,\n\n{body}\n\nThanks"
+            yield {"kind": "webhook", "raw": raw, "reply_tone": "professional" if i % 2 else None}
+        else:
+            email = {"sender": sender, "subject": subject, "body": f"Hi,\n\n{body}\n\nThanks"}
+            yield {"kind": "submit", "email": email, "reply_tone": "friendly" if i % 2 else None}
+
+
+def load_corpus(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run(client: TestClient, cassette: Cassette, corpus) -> dict:
+    timings = defaultdict(list)
+
+    def call(endpoint: str, path: str, payload: dict) -> dict:
+        replayed = sum(stats["latency"] for stats in cassette.stats.values())
+        t0 = time.perf_counter()
+        response = client.post(path, json=payload)
+        elapsed = time.perf_counter() - t0
+        llm_time = sum(stats["latency"] for stats in cassette.stats.values()) - replayed
+        response.raise_for_status()
+        timings[endpoint].append(max(elapsed - llm_time, 0.0) * 1000)
+        return response.json()
+
+    for item in corpus:
+        if item["kind"] == "webhook":
+            result = call("webhook", "/api/v1/email/webhook", {"raw_content": item["raw"]})
+        else:
+            result = call("submit", "/api/v1/email/submit", item["email"])
+        if item.get("reply_tone") and result.get("status") == "success":
+            call("generate_reply", f"/api/v1/email/{result['email_id']}/generate-reply", {"tone": item["reply_tone"]})
+
+    return {
+        "endpoints": {
+            name: {
+                "requests": len(values),
+                "p50_ms": round(statistics.median(values), 3),
+                "p95_ms": round(sorted(values)[int(len(values) * 0.95)], 3),
+                "mean_ms": round(statistics.fmean(values), 3),
+            }
+            for name, values in sorted(timings.items())
+        },
+        "prompt_tokens": {task: int(stats["input_tokens"]) for task, stats in sorted(cassette.stats.items())},
+        "cached_prompt_tokens": {task: int(stats["cached_input_tokens"]) for task, stats in sorted(cassette.stats.items())},
+        "llm_calls": {task: int(stats["calls"]) for task, stats in sorted(cassette.stats.items())},
+        "cassette_misses": cassette.misses,
+    }
+
+
+def compare(report: dict, baseline: dict, overhead_tolerance: float, token_tolerance: float):
+    """Regression messages for endpoints whose median overhead or tasks whose prompt tokens grew too much."""
+    regressions = []
+    for name, current in report["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before and current["p50_ms"] > before["p50_ms"] * (1 + overhead_tolerance):
+            regressions.append(f"{name}: p50 overhead {before['p50_ms']:.2f} ms -> {current['p50_ms']:.2f} ms")
+    for task, tokens in report["prompt_tokens"].items():
+        before = baseline["prompt_tokens"].get(task)
+        if before and tokens > before * (1 + token_tolerance):
+            regressions.append(f"{task}: prompt tokens {before:,} -> {tokens:,}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassette", required=True, help="Cassette file (.jsonl or .jsonl.gz)")
+    parser.add_argument("--record", action="store_true", help="Call the live provider and write the cassette")
+    parser.add_argument("--corpus", help="JSONL corpus (default: a synthetic one)")
+    parser.add_argument("--emails", type=int, default=30, help="Size of the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency", choices=["zero", "recorded"], default="zero")
+    parser.add_argument("--repeat", type=int, default=3, help="Replay runs; the fastest is reported")
+    parser.add_argument("--baseline", help="Compare with this saved report")
+    parser.add_argument("--save-baseline", help="Write the report here")
+    parser.add_argument("--overhead-tolerance", type=float, default=0.25)
+    parser.add_argument("--token-tolerance", type=float, default=0.02)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else list(default_corpus(args.emails, args.seed))
+    if args.record and os.path.exists(args.cassette):
+        os.remove(args.cassette)
+    cassette = Cassette(args.cassette, "record") if args.record else None
+
+    try:
+        reports = []
+        # Replays repeat on a fresh database each time; the fastest run per endpoint is kept to damp noise
+        for _ in range(1 if args.record else args.repeat):
+            Base.metadata.drop_all(bind=engine)
+            Base.metadata.create_all(bind=engine)
+            if not args.record:
+                cassette = Cassette(args.cassette, "replay", latency=args.latency)
+            with use_cassette(cassette), TestClient(app) as client:
+                reports.append(run(client, cassette, corpus))
+        report = reports[0]
+        for other in reports[1:]:
+            for name, row in other["endpoints"].items():
+                if row["p50_ms"] < report["endpoints"][name]["p50_ms"]:
+                    report["endpoints"][name] = row
+    finally:
+        engine.dispose()
+        shutil.rmtree(_tmp, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'endpoint':<16}{'requests':>9}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        for name, row in report["endpoints"].items():
+            print(f"{name:<16}{row['requests']:>9}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['mean_ms']:>10.2f}")
+        for task, tokens in report["prompt_tokens"].items():
+            cached = report["cached_prompt_tokens"][task]
+            print(f"{task:<16}{report['llm_calls'][task]:>9} calls {tokens:>10,} prompt tokens ({cached:,} cached)")
+        if report["cassette_misses"]:
+            print(f"{report['cassette_misses']} calls had no exact recording (prompt changed since recording)")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline and not args.record:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.overhead_tolerance, args.token_tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Bulk import throughput and memory.
+
+Writes a synthetic mbox (threads of replies with In-Reply-To/References)
+and imports it into a temporary SQLite database, reporting messages/second.
+With --trace-memory the peak traced heap of the import is reported too
+(tracemalloc roughly halves throughput).
+
+    python -m benchmarks.bench_mail_import [--messages 100000] [--batch-size 500] [--trace-memory]
+"""
+import argparse
+import os
+import random
+import tempfile
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.db.database import Base
+from backend.mail.importer import MailImporter
+
+
+def write_mbox(path, n, thread_length=8):
+    rng = random.Random(7)
+    with open(path, "w") as f:
+        for i in range(n):
+            thread, position = divmod(i, thread_length)
+            sender = f"user{rng.randrange(5000)}@example.com"
+            headers = [
+                f"From: {sender}",
+                f"To: team{thread % 50}@example.com",
+                f"Subject: {'Re: ' if position else ''}Topic {thread}",
+                f"Date: Mon, 05 Jan 2026 10:00:{position:02d} +0000",
+                f"Message-ID: <t{thread}.{position}@example.com>",
+            ]
+            if position:
+                parents = " ".join(f"<t{thread}.{p}@example.com>" for p in range(position))
+                headers += [f"In-Reply-To: <t{thread}.{position - 1}@example.com>", f"References: {parents}"]
+            body = " ".join(rng.choice(("invoice", "meeting", "status", "update", "please", "thanks")) for _ in range(80))
+            f.write(f"From {sender} Mon Jan  5 10:00:00 2026\n" + "\n".join(headers) + f"\n\n{body}\n\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mbox = os.path.join(tmp, "inbox.mbox")
+        write_mbox(mbox, args.messages)
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+
+        size_mb = os.path.getsize(mbox) / 1024 / 1024
+        if args.trace_memory:
+            tracemalloc.start()
+        report = MailImporter(sessionmaker(bind=engine), batch_size=args.batch_size).run(mbox)
+        if args.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    print(f"messages          {report['read']:,} ({size_mb:.0f} MB mbox)")
+    print(f"imported          {report['imported']:,} into {report['threads']:,} threads")
+    print(f"throughput        {report['messages_per_second']:,.0f} msg/s ({report['elapsed_seconds']:.1f}s)")
+    if args.trace_memory:
+        print(f"peak traced heap  {peak / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Interactive latency under a bulk backfill.
+
+Simulates an LLM with fixed service time behind the shared limiter and
+measures interactive call latency alone and while a bulk backfill saturates
+the model's concurrency.
+
+    python -m benchmarks.bench_priority_lanes [--service-ms 50] [--concurrency 4] [--backfill 400]
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from backend.ai.rate_limiter import TokenBucketLimiter
+from backend.ai.scheduler import LANE_BULK, LANE_INTERACTIVE
+
+
+def call(limiter, lane, service_s):
+    start = time.perf_counter()
+    limiter.acquire(1, lane)
+    try:
+        time.sleep(service_s)
+    finally:
+        limiter.release(1)
+    return time.perf_counter() - start
+
+
+def interactive_latencies(limiter, n, service_s, gap_s):
+    latencies = []
+    for _ in range(n):
+        latencies.append(call(limiter, LANE_INTERACTIVE, service_s))
+        time.sleep(gap_s)
+    return latencies
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<28} p50={statistics.median(latencies) * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--service-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--backfill", type=int, default=400)
+    parser.add_argument("--interactive", type=int, default=40)
+    args = parser.parse_args()
+    service_s = args.service_ms / 1000
+
+    limiter = TokenBucketLimiter("bench", rpm=0, tpm=0, max_concurrency=args.concurrency)
+    report("interactive, idle", interactive_latencies(limiter, args.interactive, service_s, service_s))
+
+    bulk_latencies = []
+
+    def backfill():
+        with ThreadPoolExecutor(max_workers=args.concurrency * 4) as pool:
+            for latency in pool.map(lambda _: call(limiter, LANE_BULK, service_s), range(args.backfill)):
+                bulk_latencies.append(latency)
+
+    runner = threading.Thread(target=backfill)
+    runner.start()
+    time.sleep(service_s * 2)
+    report("interactive, during backfill", interactive_latencies(limiter, args.interactive, service_s, service_s))
+    runner.join()
+    report("bulk, during backfill", bulk_latencies)
+
+
+if __name__ == "__main__":
+    main()
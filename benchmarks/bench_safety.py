@@ -0,0 +1,125 @@
+"""
+Accuracy and throughput of the local safety scorer vs the old substring filter.
+
+Evaluates three checks on the held-out "eval" split of a labelled corpus
+(benchmarks/safety_corpus.py unless --corpus is given):
+
+- substring: the previous check_safety (any UNSAFE_KEYWORDS substring);
+- rules: whole-word blocking phrases over normalised text;
+- rules+model: rules plus the hashed n-gram model at SAFETY_THRESHOLD.
+
+Reports precision/recall/false-positive rate overall and per kind (hard
+negatives, obfuscated), then microseconds per email for single checks and
+vectorised batches, and the guardrail text no longer sent with every
+webhook parse prompt.
+
+    python -m benchmarks.bench_safety [--size 3000] [--train] [--model path.npz] [--threshold 0.8]
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+
+from backend.core.config import settings
+from backend.core.safety import BUNDLED_MODEL, SafetyModel, SafetyScorer, train_model
+from backend.core.security import UNSAFE_KEYWORDS
+from benchmarks import safety_corpus
+
+
+def substring_check(text: str) -> bool:
+    """The pre-scorer check_safety: unsafe if any keyword occurs anywhere."""
+    lowered = text.lower()
+    return any(keyword in lowered for keyword in UNSAFE_KEYWORDS)
+
+
+def confusion(predicted, labels) -> dict:
+    predicted, labels = np.asarray(predicted, dtype=bool), np.asarray(labels, dtype=bool)
+    tp, fp = int((predicted & labels).sum()), int((predicted & ~labels).sum())
+    fn, tn = int((~predicted & labels).sum()), int((~predicted & ~labels).sum())
+    return {
+        "accuracy": (tp + tn) / max(len(labels), 1),
+        "precision": tp / max(tp + fp, 1),
+        "recall": tp / max(tp + fn, 1),
+        "fpr": fp / max(fp + tn, 1),
+    }
+
+
+def per_email_us(fn, texts, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(texts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help='JSONL of {"text", "label", "split", "kind"} (default: synthetic)')
+    parser.add_argument("--size", type=int, default=3000, help="Size of the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--model", default=settings.SAFETY_MODEL_PATH or BUNDLED_MODEL)
+    parser.add_argument("--train", action="store_true", help="Fit a model on the train split instead of loading one")
+    parser.add_argument("--threshold", type=float, default=settings.SAFETY_THRESHOLD)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        for item in items:
+            item.setdefault("split", "eval")
+    else:
+        items = list(safety_corpus.generate(args.size, args.seed))
+    evaluation = [item for item in items if item["split"] == "eval"]
+    texts = [item["text"] for item in evaluation]
+    labels = np.array([item["label"] for item in evaluation])
+    kinds = np.array([item.get("kind", "") for item in evaluation])
+
+    if args.train:
+        train = [item for item in items if item["split"] == "train"]
+        model = train_model([item["text"] for item in train], [item["label"] for item in train])
+    else:
+        model = SafetyModel.load(args.model)
+    rules = SafetyScorer(UNSAFE_KEYWORDS, None, args.threshold)
+    scorer = SafetyScorer(UNSAFE_KEYWORDS, model, args.threshold)
+
+    predictions = {
+        "substring": [substring_check(text) for text in texts],
+        "rules": rules.score_batch(texts) >= args.threshold,
+        "rules+model": scorer.score_batch(texts) >= args.threshold,
+    }
+    print(f"Eval split: {len(texts):,} emails ({int(labels.sum()):,} unsafe); threshold {args.threshold}")
+    print(f"{'check':<13}{'accuracy':>9}{'precision':>10}{'recall':>8}{'FPR':>7}"
+          f"{'FPR hard neg':>14}{'recall obfusc.':>16}")
+    for name, predicted in predictions.items():
+        predicted = np.asarray(predicted, dtype=bool)
+        overall = confusion(predicted, labels)
+        hard = kinds == "hard_negative"
+        obfuscated = kinds == "obfuscated"
+        hard_fpr = predicted[hard].mean() if hard.any() else float("nan")
+        obfuscated_recall = predicted[obfuscated].mean() if obfuscated.any() else float("nan")
+        print(f"{name:<13}{overall['accuracy']:>9.3f}{overall['precision']:>10.3f}{overall['recall']:>8.3f}"
+              f"{overall['fpr']:>7.3f}{hard_fpr:>14.3f}{obfuscated_recall:>16.3f}")
+
+    sample = (texts * (2000 // max(len(texts), 1) + 1))[:2000]
+    mean_chars = sum(map(len, sample)) / len(sample)
+    print(f"\nThroughput over {len(sample):,} emails ({mean_chars:,.0f} chars on average), best of 3:")
+    print(f"  substring check_safety  {per_email_us(substring_check, sample):>8.1f} us/email")
+    print(f"  scorer.check            {per_email_us(scorer.check, sample):>8.1f} us/email")
+    batches = [sample[i:i + args.batch_size] for i in range(0, len(sample), args.batch_size)]
+    batch_us = per_email_us(scorer.score_batch, batches) / args.batch_size
+    print(f"  scorer.score_batch({args.batch_size})  {batch_us:>8.1f} us/email")
+
+    guardrail = ", ".join(UNSAFE_KEYWORDS)
+    print(f"\nGuardrail rules removed from the parse prompt: {len(guardrail):,} chars "
+          f"(~{len(guardrail) // 4:,} tokens) per webhook call")
+
+
+if __name__ == "__main__":
+    main()
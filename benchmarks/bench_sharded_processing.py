@@ -0,0 +1,131 @@
+"""
+Concurrent email processing: a plain worker pool vs per-thread sharded workers.
+
+Submits bursts of `--burst-size` back-to-back emails to each of
+`--threads` new threads, `--bursts` times, with the bursts of different
+threads interleaved in random order. The summary LLM call is simulated by a
+fixed `--service-ms` delay. The stream goes through:
+
+- serial: a ShardedExecutor with one shard, i.e. one email at a time;
+- pool: `--workers` threads calling process_email directly, so emails of
+  one thread run concurrently;
+- sharded: a ShardedExecutor with `--workers` shards
+  (EmailProcessor.process_email_in_order).
+
+Reports throughput, failed emails (e.g. two emails racing to create the
+same thread row) and summaries whose context missed an earlier email of
+their thread.
+
+    python -m benchmarks.bench_sharded_processing [--threads 1000] [--bursts 1] [--burst-size 3] [--workers 8] [--service-ms 20]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.ai.email_processor import EmailProcessor, EmailSummaryModel
+from backend.core.sharding import ShardedExecutor
+from backend.db.database import Base
+
+SUMMARY = {
+    "timestamp": "2025-01-01",
+    "sender": {"email": "customer@example.com"},
+    "thread_info": {"is_thread": True},
+    "content_analysis": {"main_topic": "order"},
+    "classification": {"intent": "inquiry", "confidence": 0.9},
+    "sentiment": {"score": 0.0, "label": "neutral", "tone": "polite"},
+    "urgency": {"level": "low", "reason": "none", "suggested_response_time": "1 day"},
+    "context_summary": "order follow-up",
+    "recommended_tone": "professional",
+}
+
+
+def run(mode, stream, workers, service_s):
+    path = os.path.join(tempfile.mkdtemp(), f"{mode}.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    context_sizes = {}
+
+    def generate(self, email, thread_context, email_count):
+        time.sleep(service_s)
+        context_sizes[email.body] = email_count
+        return EmailSummaryModel(**{**SUMMARY, "email_id": email.id})
+
+    def process(email_data):
+        db = Session()
+        try:
+            processor = EmailProcessor(db)
+            if mode == "pool":
+                processor.process_email(dict(email_data))
+            else:
+                processor.process_email_in_order(dict(email_data))
+        finally:
+            db.close()
+
+    executor = ShardedExecutor(shards=1 if mode == "serial" else workers, name="bench-shard")
+    failed = 0
+    with patch("backend.ai.email_processor.processing_shards", executor), \
+            patch.object(EmailProcessor, "_generate_summary", generate):
+        start = time.perf_counter()
+        if mode == "pool":
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(process, email_data) for email_data in stream]
+        else:
+            futures = [executor.submit(email_data["thread_id"], process, email_data) for email_data in stream]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                failed += 1
+        elapsed = time.perf_counter() - start
+    executor.shutdown()
+    engine.dispose()
+
+    # The n-th email of a thread should be summarised with the n emails that arrived up to it
+    inconsistent = sum(1 for email_data in stream
+                       if email_data["body"] in context_sizes
+                       and context_sizes[email_data["body"]] != email_data["position"])
+    return len(stream) / elapsed, failed, inconsistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=1000)
+    parser.add_argument("--bursts", type=int, default=1, help="Bursts per thread")
+    parser.add_argument("--burst-size", type=int, default=3, help="Back-to-back emails per burst")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--service-ms", type=float, default=20, help="Simulated summary LLM latency")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    thread_ids = [f"thread-{t}" for t in range(args.threads)]
+    bursts = [thread_id for thread_id in thread_ids for _ in range(args.bursts)]
+    rng.shuffle(bursts)
+    stream, position = [], dict.fromkeys(thread_ids, 0)
+    for thread_id in bursts:
+        for _ in range(args.burst_size):
+            position[thread_id] += 1
+            stream.append({"thread_id": thread_id, "sender": "customer@example.com", "subject": "Order",
+                           "body": f"{thread_id}/{position[thread_id]}", "position": position[thread_id]})
+
+    print(f"{len(stream)} emails: {args.threads} threads x {args.bursts} bursts x {args.burst_size} emails; "
+          f"{args.workers} workers, {args.service_ms:g} ms per summary")
+    print(f"{'mode':<9}{'emails/s':>10}{'failed':>8}{'inconsistent':>14}")
+    for mode in ("serial", "pool", "sharded"):
+        rate, failed, inconsistent = run(mode, stream, args.workers, args.service_ms / 1000)
+        print(f"{mode:<9}{rate:>10.1f}{failed:>8}{inconsistent:>14}")
+
+
+if __name__ == "__main__":
+    main()
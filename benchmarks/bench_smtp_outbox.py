@@ -0,0 +1,113 @@
+"""
+Outbox delivery throughput against a local aiosmtpd server.
+
+Queues N replies in an in-memory database and drains the outbox with the
+sender worker at different pool sizes, plus a baseline that opens a new SMTP
+connection for every message.
+
+    python -m benchmarks.bench_smtp_outbox [--messages 2000] [--pool-sizes 1,4,8]
+"""
+import argparse
+import os
+import socket
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from aiosmtpd.controller import Controller
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.core.config import settings
+from backend.db.database import Base
+from backend.db.models import Email, GeneratedReply, Thread
+from backend.mail.outbound import OutboxWorker, SMTPConnectionPool, build_message, enqueue_reply
+
+
+class Sink:
+    def __init__(self):
+        self.count = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.count += 1
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def seed(n):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    db.add(Thread(id="bench"))
+    for i in range(n):
+        email = Email(id=f"e{i}", thread_id="bench", sender=f"user{i}@example.com", subject="Invoice",
+                      body="body", message_id=f"<m{i}@example.com>")
+        reply = GeneratedReply(email=email, reply_text="Thanks, this is paid. " * 20, tone="professional")
+        db.add_all([email, reply])
+        db.flush()
+        enqueue_reply(db, reply)
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def run_worker(session_factory, host, port, pool_size, batch_size):
+    pool = SMTPConnectionPool(host, port, pool_size)
+    worker = OutboxWorker(session_factory, pool=pool)
+    start = time.perf_counter()
+    while worker.run_once(batch_size):
+        pass
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return elapsed, pool.connections_opened
+
+
+def run_unpooled(session_factory, host, port, n):
+    # Baseline: one connection (EHLO + QUIT) per message
+    from backend.db.models import OutboxMessage
+    db = session_factory()
+    messages = [build_message(item) for item in db.query(OutboxMessage).limit(n).all()]
+    db.close()
+    start = time.perf_counter()
+    for message in messages:
+        pool = SMTPConnectionPool(host, port, 1)
+        pool.send(message)
+        pool.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--pool-sizes", default="1,4,8")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    settings.SMTP_STARTTLS = False
+    settings.SMTP_USERNAME = ""
+    port = free_port()
+    sink = Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        session_factory = seed(args.messages)
+        elapsed = run_unpooled(session_factory, "127.0.0.1", port, args.messages)
+        print(f"{'connection per message':<24} {args.messages / elapsed:8.0f} msg/s  ({args.messages} connections)")
+
+        for size in [int(s) for s in args.pool_sizes.split(",")]:
+            session_factory = seed(args.messages)
+            elapsed, opened = run_worker(session_factory, "127.0.0.1", port, size, args.batch_size)
+            print(f"{f'worker, pool={size}':<24} {args.messages / elapsed:8.0f} msg/s  ({opened} connections)")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
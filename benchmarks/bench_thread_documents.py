@@ -0,0 +1,114 @@
+"""
+GET /threads/{id} throughput: rendering through the ORM vs stored thread documents.
+
+Builds a SQLite database of threads with 50 emails (and replies) each, then
+measures requests per second through the ASGI app twice: once with no stored
+documents (every request hydrates the thread and validates the response model,
+as before) and once serving the pre-serialised documents.
+
+    python -m benchmarks.bench_thread_documents [--threads 200] [--emails 50] [--requests 2000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend.core.thread_documents import refresh_thread_documents
+from backend.db.database import Base, get_db, get_read_db
+from backend.db.models import Email, GeneratedReply, Thread, ThreadDocument
+from backend.main import app
+
+
+def build_corpus(session, n_threads: int, n_emails: int, rng: random.Random):
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    thread_ids, emails, replies = [], [], []
+    for _ in range(n_threads):
+        thread_id = str(uuid.uuid4())
+        thread_ids.append(thread_id)
+        ts = start
+        for i in range(n_emails):
+            email_id = str(uuid.uuid4())
+            emails.append({
+                "id": email_id, "thread_id": thread_id, "sender": f"user{rng.randint(0, 99)}@example.com",
+                "subject": "Re: Contract renewal" if i else "Contract renewal",
+                "body": " ".join(rng.choice(["pricing", "terms", "invoice", "meeting", "thanks"]) for _ in range(80)),
+                "received_at": ts,
+            })
+            if i % 2 == 0:
+                replies.append({"email_id": email_id, "reply_text": "Thanks, we will get back to you shortly.",
+                                "tone": "professional", "created_at": ts + timedelta(hours=1)})
+            ts += timedelta(hours=rng.randint(1, 12))
+    session.execute(insert(Thread), [{"id": t} for t in thread_ids])
+    session.execute(insert(Email), emails)
+    session.execute(insert(GeneratedReply), replies)
+    session.commit()
+    return thread_ids
+
+
+def measure(client: TestClient, thread_ids, n_requests: int, rng: random.Random, headers=None) -> float:
+    paths = [f"/api/v1/threads/{rng.choice(thread_ids)}" for _ in range(n_requests)]
+    t0 = time.perf_counter()
+    for path in paths:
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+    return n_requests / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--emails", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            thread_ids = build_corpus(session, args.threads, args.emails, rng)
+
+        def override():
+            with Session() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override
+        app.dependency_overrides[get_read_db] = override
+        try:
+            with TestClient(app) as client:
+                print(f"Corpus: {len(thread_ids)} threads x {args.emails} emails")
+                before = measure(client, thread_ids, args.requests, rng)
+                print(f"ORM render:        {before:>8,.0f} req/s")
+
+                with Session() as session:
+                    t0 = time.perf_counter()
+                    refresh_thread_documents(session, thread_ids)
+                    session.commit()
+                    print(f"(documents built in {time.perf_counter() - t0:.1f}s)")
+
+                after = measure(client, thread_ids, args.requests, rng, headers={"Accept-Encoding": "identity"})
+                print(f"Stored document:   {after:>8,.0f} req/s  ({after / before:.1f}x)")
+                gzipped = measure(client, thread_ids, args.requests, rng, headers={"Accept-Encoding": "gzip"})
+                print(f"Stored gzip:       {gzipped:>8,.0f} req/s  ({gzipped / before:.1f}x)")
+
+                with Session() as session:
+                    session.execute(delete(ThreadDocument))
+                    session.commit()
+        finally:
+            app.dependency_overrides.clear()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
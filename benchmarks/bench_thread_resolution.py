@@ -0,0 +1,129 @@
+"""
+Thread resolution benchmark over a synthetic corpus.
+
+Builds a SQLite database with ~100k emails spread over a year, then resolves a
+sample of incoming emails and reports match latency and accuracy.
+
+    python -m benchmarks.bench_thread_resolution [--emails 100000] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend.core.thread_resolver import ThreadResolver, normalize_subject
+from backend.db.database import Base
+from backend.db.models import Email, Thread
+
+TOPICS = ["Invoice", "Pricing", "Meeting", "Contract", "Support ticket", "Renewal", "Onboarding", "Refund"]
+
+
+def build_corpus(session, n_emails: int, rng: random.Random):
+    """Inserts threads of 1-9 emails; returns thread metadata for query generation."""
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    users = [f"user{i}@example.com" for i in range(5000)]
+    threads, thread_rows, email_rows = [], [], []
+
+    while len(email_rows) < n_emails:
+        thread_id = str(uuid.uuid4())
+        # Subjects deliberately collide across threads
+        subject = f"{rng.choice(TOPICS)} #{rng.randint(1, 2000)}"
+        a, b = rng.sample(users, 2)
+        ts = start + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        message_ids = []
+        for i in range(rng.randint(1, 9)):
+            sender, recipient = (a, b) if i % 2 == 0 else (b, a)
+            message_id = f"<{uuid.uuid4().hex}@example.com>"
+            email_rows.append({
+                "id": str(uuid.uuid4()),
+                "thread_id": thread_id,
+                "sender": sender,
+                "recipients": recipient,
+                "subject": subject if i == 0 else f"Re: {subject}",
+                "normalized_subject": normalize_subject(subject),
+                "body": "...",
+                "message_id": message_id,
+                "in_reply_to": message_ids[-1] if message_ids else None,
+                "references": " ".join(message_ids) or None,
+                "received_at": ts,
+            })
+            message_ids.append(message_id)
+            ts += timedelta(hours=rng.randint(1, 48))
+        thread_rows.append({"id": thread_id})
+        threads.append((thread_id, subject, a, b, message_ids, ts))
+
+    for model, rows in ((Thread, thread_rows), (Email, email_rows)):
+        for i in range(0, len(rows), 10000):
+            session.execute(insert(model), rows[i:i + 10000])
+    session.commit()
+    return threads, len(email_rows)
+
+
+def make_queries(threads, n_queries: int, rng: random.Random):
+    """Yields (email_data, expected_thread_id) pairs: header replies, header-less replies and new threads."""
+    for _ in range(n_queries):
+        thread_id, subject, a, b, message_ids, last_ts = rng.choice(threads)
+        kind = rng.random()
+        received_at = last_ts + timedelta(hours=rng.randint(1, 72))
+        if kind < 0.6:
+            yield {"sender": b, "recipients": a, "subject": f"Re: {subject}", "in_reply_to": message_ids[-1],
+                   "references": " ".join(message_ids), "received_at": received_at}, thread_id
+        elif kind < 0.9:
+            yield {"sender": b, "recipients": a, "subject": f"RE: {subject}", "received_at": received_at}, thread_id
+        else:
+            # Same subject, unrelated people: must not be merged
+            yield {"sender": f"stranger{rng.randint(0, 10**6)}@example.org", "recipients": "someone@example.org",
+                   "subject": f"Re: {subject}", "received_at": received_at}, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+
+        t0 = time.perf_counter()
+        threads, n_emails = build_corpus(session, args.emails, rng)
+        print(f"Corpus: {n_emails} emails in {len(threads)} threads ({time.perf_counter() - t0:.1f}s to build)")
+
+        resolver = ThreadResolver(session)
+        latencies, correct, by_kind = [], 0, {"headers": [0, 0], "subject": [0, 0], "new": [0, 0]}
+        for email_data, expected in make_queries(threads, args.queries, rng):
+            t0 = time.perf_counter()
+            got = resolver.resolve(email_data)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            kind = "new" if expected is None else ("headers" if email_data.get("in_reply_to") else "subject")
+            by_kind[kind][0] += got == expected
+            by_kind[kind][1] += 1
+            correct += got == expected
+
+        latencies.sort()
+        print(f"Queries: {len(latencies)}")
+        print(f"Latency ms: p50={statistics.median(latencies):.3f} "
+              f"p95={latencies[int(len(latencies) * 0.95)]:.3f} max={latencies[-1]:.3f}")
+        print(f"Accuracy: {correct / len(latencies):.2%}")
+        for kind, (ok, total) in by_kind.items():
+            if total:
+                print(f"  {kind:<8} {ok}/{total} ({ok / total:.2%})")
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
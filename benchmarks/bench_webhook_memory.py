@@ -0,0 +1,161 @@
+"""
+Peak RSS per /webhook request for a large raw email.
+
+Each case runs in a fresh interpreter and drives the ASGI app directly, feeding
+the request body in 64 KiB receive() messages the way a server would, so the
+number reported is the growth of the process high-water mark (ru_maxrss)
+caused by handling one request:
+
+    json-plain  a plain-text paste posted as {"raw_content": ...} to /webhook
+    json-mime   a MIME message with a large attachment posted to /webhook
+    raw-mime    the same message streamed as the body of /webhook/raw
+
+The LLM call is patched to fail (so the regex fallback runs) and the summary
+step is stubbed; everything else - middleware, parsing, guardrails, storage -
+is the real code path.
+
+    python -m benchmarks.bench_webhook_memory [--size-mb 10] [--json]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+CASES = ("json-plain", "json-mime", "raw-mime")
+RECEIVE_CHUNK = 64 * 1024
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def mime_chunks(size):
+    """Yields a multipart message of roughly `size` bytes, one base64 line at a time."""
+    yield (
+        "From: Ann <ann@example.com>\r\nTo: bob@example.com\r\nSubject: Scans\r\n"
+        "Message-ID: <scans@example.com>\r\nMIME-Version: 1.0\r\n"
+        'Content-Type: multipart/mixed; boundary="b"\r\n\r\n'
+        "--b\r\nContent-Type: text/plain\r\n\r\nScans attached.\r\n"
+        "--b\r\nContent-Type: application/octet-stream\r\nContent-Transfer-Encoding: base64\r\n"
+        'Content-Disposition: attachment; filename="scans.bin"\r\n\r\n'
+    ).encode()
+    block = os.urandom(57 * 1024)
+    line = base64.encodebytes(block).replace(b"\n", b"\r\n")
+    for _ in range(max(1, size // len(line))):
+        yield line
+    yield b"--b--\r\n"
+
+
+def request_body(case, size):
+    if case == "json-plain":
+        text = ("Hello team, the quarterly numbers are attached below.\n" * (size // 54 + 1))[:size]
+        return [json.dumps({"raw_content": text}).encode()]
+    if case == "json-mime":
+        raw = b"".join(mime_chunks(size)).decode()
+        return [json.dumps({"raw_content": raw}).encode()]
+    return mime_chunks(size)
+
+
+def run_case(case, size):
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    from unittest.mock import patch
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from backend.core.config import settings
+    from backend.db.database import Base, get_db
+    from backend.main import app
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    app.dependency_overrides[get_db] = lambda: session_factory()
+    settings.ATTACHMENT_DIR = tempfile.mkdtemp()
+
+    path = "/api/v1/email/webhook/raw" if case == "raw-mime" else "/api/v1/email/webhook"
+    content_type = b"message/rfc822" if case == "raw-mime" else b"application/json"
+
+    async def post(chunks):
+        # Re-slice the body into server-sized receive() messages without joining it
+        def messages():
+            for chunk in chunks:
+                for i in range(0, len(chunk), RECEIVE_CHUNK):
+                    yield chunk[i:i + RECEIVE_CHUNK]
+        pending = messages()
+        status = []
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+            "root_path": "", "headers": [(b"content-type", content_type)],
+            "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+        }
+
+        async def receive():
+            chunk = next(pending, None)
+            if chunk is None:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.request", "body": bytes(chunk), "more_body": True}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        await app(scope, receive, send)
+        return status[0]
+
+    stub = lambda email: type("S", (), {"email_id": email.id, "summary_json": {}})()
+    with patch("backend.ai.email_processor.EmailProcessor.summarize_email", side_effect=stub), \
+         patch("backend.ai.llm.GovernedChatOpenAI._generate", side_effect=RuntimeError("offline")):
+        # Warm up imports, the LLM client and the database before taking the baseline
+        asyncio.run(post(request_body(case, 64 * 1024)))
+        body = request_body(case, size)
+        baseline = peak_rss_mb()
+        status = asyncio.run(post(body))
+        return {"case": case, "status": status, "peak_delta_mb": round(peak_rss_mb() - baseline, 1)}
+
+
+def measure(size_mb, cases=CASES):
+    """Runs each case in its own interpreter so one case's high-water mark can't hide another's."""
+    results = []
+    for case in cases:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_webhook_memory", "--case", case, "--size-mb", str(size_mb)],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args()
+    size = int(args.size_mb * 1024 * 1024)
+
+    if args.case:
+        print(json.dumps(run_case(args.case, size)))
+        return
+
+    results = measure(args.size_mb)
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.size_mb:g} MB input")
+    for result in results:
+        print(f"  {result['case']:<11} status={result['status']}  peak RSS +{result['peak_delta_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
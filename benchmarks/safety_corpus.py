@@ -0,0 +1,234 @@
+"""
+Synthetic labelled email corpus for the local safety scorer.
+
+Ordinary business mail (including "hard negatives" that use words the old
+substring filter blocked: cp, die, act now, kill the job...) and unsafe mail
+(scams, phishing, extortion, threats, malware lures, explicit spam), part of
+it obfuscated with leetspeak, Unicode lookalikes, spacing and zero-width
+characters. Every sentence pool is split by index: the "eval" texts are built
+only from sentences never seen in "train", so evaluation measures
+generalisation to new phrasing rather than memorisation.
+
+    python -m benchmarks.safety_corpus --output corpus.jsonl [--size 3000] [--seed 7]
+"""
+import argparse
+import json
+import random
+
+NAMES = ["Anna", "Ben", "Carla", "David", "Elif", "Farid", "Grace", "Hiro", "Ines", "Jonas", "Kemi", "Luis"]
+COMPANIES = ["Northwind", "Acme Logistics", "Blue Harbor", "Contoso", "Fabrikam", "Globex", "Initech", "Umbrella Foods"]
+PRODUCTS = ["the team plan", "the analytics add-on", "our API", "the mobile app", "the Q3 report", "the onboarding kit"]
+DATES = ["Monday", "Tuesday afternoon", "next week", "the 14th", "end of month", "Friday morning", "March 3rd"]
+AMOUNTS = ["$120", "$4,500", "EUR 980", "$37.50", "$12,000", "GBP 260"]
+LINKS = ["http://secure-verify-login.co/acc", "http://bit.ly/3xQz9", "http://paypa1-support.net/restore",
+         "http://claim-prize-now.info/id", "http://account-review.top/login"]
+
+GREETINGS = ["Hi {name},", "Hello {name},", "Dear {name},", "Hey {name},", "Good morning {name},", "Dear customer,"]
+SIGNOFFS = ["Thanks,\n{name}", "Best regards,\n{name}", "Cheers,\n{name}", "Kind regards,\n{name} at {company}",
+            "Sincerely,\nThe {company} team", "Talk soon,\n{name}"]
+
+SAFE = [
+    "Could you send me the updated pricing for {product}?",
+    "I attached the signed contract for {company}; please countersign by {date}.",
+    "Are you available for a call on {date} to go through the roadmap?",
+    "The invoice for {amount} was paid yesterday, reference 4471.",
+    "Our users report that the login page loads slowly since the last release.",
+    "Can we move the quarterly review to {date}? Half the team is travelling.",
+    "Please find the meeting notes from today's workshop below.",
+    "We would like to renew our subscription for another year.",
+    "The shipment left the warehouse this morning and should arrive by {date}.",
+    "Thanks for the quick turnaround on the design changes.",
+    "I am out of office until {date}; {name} is covering urgent requests.",
+    "Could you add {name} to the shared project folder?",
+    "The staging environment will be down for maintenance on {date}.",
+    "We noticed a duplicate charge of {amount} on our last statement.",
+    "Please review the attached draft and let me know your comments.",
+    "Our budget for {product} was approved, so we can start next sprint.",
+    "Is there a discount for annual billing on {product}?",
+    "The new hire orientation starts at 9am on {date} in room 4B.",
+    "I reset the build server and the pipeline is green again.",
+    "Can you confirm the delivery address for the replacement parts?",
+    "Happy to help with the migration; I blocked out {date} for it.",
+    "Lunch is on us after the all-hands meeting on {date}.",
+    "The customer asked whether {product} supports single sign-on.",
+    "Here are the slides from the conference talk, as promised.",
+    "Let's sync on the hiring plan before the board meeting.",
+    "We fixed the bug in the export and deployed version 2.4.1.",
+    "The auditors need the expense reports by {date}.",
+    "Please update your timesheet before the payroll cut-off.",
+    "Our office will be closed for the public holiday on {date}.",
+    "The survey results are in and satisfaction went up four points.",
+    "Would {date} work for the contract renewal discussion?",
+    "I am forwarding the quote from {company} for your approval.",
+    "The printer on the third floor is fixed, thanks to facilities.",
+    "Can you share the API documentation with the new contractor?",
+    "We are planning the team offsite and need a headcount by {date}.",
+    "Attached is the receipt for the conference registration of {amount}.",
+    "The client loved the demo and wants a pilot with {product}.",
+    "Reminder: the security awareness training is due by {date}.",
+    "Could you double-check the figures in row 12 of the forecast?",
+    "We are switching our courier to {company} starting {date}.",
+]
+
+HARD_NEGATIVES = [
+    "Just cp the config file to the server and restart the service.",
+    "The die casting supplier confirmed the new mould for {date}.",
+    "Please act now if you want to keep your seat at the workshop; registration closes {date}.",
+    "I had to kill the stuck job on the batch server, it is rerunning now.",
+    "We hate to see you go, but your cancellation has been processed.",
+    "Congratulations to {name}, the winner of our internal hackathon!",
+    "HR needs the beneficiary details for your pension form by {date}.",
+    "Submit the report on time, or else we miss the filing window.",
+    "The fraud team flagged a suspicious card payment; no action is needed from you.",
+    "Please download the attachment from the shared drive, not the email.",
+    "The mandatory sexual harassment prevention training is scheduled for {date}.",
+    "Our charity run supports a suicide prevention helpline this year.",
+    "The murder mystery dinner for the team event is booked for {date}.",
+    "Report any scam calls claiming to be from our bank to the service desk.",
+    "This limited time offer from {company} for office chairs ends {date}.",
+    "I would die for a coffee before the 8am standup.",
+    "The documentary on the rise of the nazi party is on the history reading list.",
+    "Remove the naked cable ends before installing the new switch.",
+    "Our lottery for the parking spots will run on {date}.",
+    "The shooting schedule for the product video is attached.",
+    "Do not open attachments you did not expect; forward them to IT.",
+    "The kill switch in the deployment script stops all workers safely.",
+    "The vendor's CP-40 compressor needs a replacement valve.",
+    "Payment of {amount} will be transferred to your account on {date} as agreed.",
+    "Your password will expire in 10 days; change it in the usual settings page.",
+    "We recorded the webinar and will share the video next week.",
+    "Our lawyers reviewed the inheritance clause in the partnership agreement.",
+    "The bomb disposal scene in the training film was cut for length.",
+    "Racist or hateful comments are removed under our community guidelines.",
+    "Team, the die is cast: we launch {product} on {date}.",
+]
+
+UNSAFE = [
+    # Scams
+    "Congratulations, you have won {amount} in our international lottery; send your bank details to claim.",
+    "I am a lawyer handling inheritance funds of $10.5 million and you are the only beneficiary.",
+    "Urgent transfer needed: wire transfer immediately {amount} to the account below to release your prize.",
+    "You were selected as our lucky lottery winner, pay the processing fee to receive your money.",
+    "Claim your prize of $1,000,000 today by sending a small handling fee.",
+    "A wealthy client wishes to move funds through your account for a 30% commission.",
+    "Your package is held at customs; pay {amount} release fee with gift cards.",
+    "Invest in our crypto fund and double your money guaranteed in 7 days.",
+    # Phishing
+    "Your account has been suspended, click below to verify your details: {link}",
+    "Bank verification required: confirm your account within 24 hours at {link}",
+    "We detected a login attempt from a new device; verify your identity here {link}",
+    "Password reset required for your mailbox, log in at {link} to avoid deactivation.",
+    "Your mailbox storage is full and will be deactivated unless you re-enter your credentials at {link}",
+    "Unusual sign-in activity: confirm your username and password to keep access {link}",
+    "Your payroll account needs updating, submit your bank login on the secure portal {link}",
+    "Dear user, your email will be closed today unless you validate your account at {link}",
+    # Extortion
+    "I have your password and I recorded you through your webcam.",
+    "Send bitcoin worth {amount} to my wallet or else the video goes to all your contacts.",
+    "Pay within 24 hours or your private photos will be published.",
+    "I hacked your device months ago and have compromising videos of you; transfer 0.5 BTC now.",
+    "Your secrets will be exposed to your family unless you pay the ransom in crypto.",
+    "We encrypted your files; send payment to the wallet address to get the decryption key.",
+    # Threats
+    "I will kill you if you show up at the office again.",
+    "I know where you live and I am going to shoot you.",
+    "Watch your back, I will stab you when I see you.",
+    "This is a bomb threat against your headquarters.",
+    "You and your family will suffer, I will make sure of it.",
+    "I will hurt you badly, you will regret ignoring me.",
+    # Malware lures
+    "Open the attached executable to view your invoice.",
+    "Please enable macros to see the protected document.",
+    "Your invoice.zip is attached, run the file inside to confirm payment.",
+    "See payment receipt.exe for details of the refund.",
+    "Install the attached update to fix your security certificate immediately.",
+    "Run the script in the attachment to unlock your salary statement.",
+    # Explicit / piracy / hate
+    "Hot singles want sex tonight, watch the xxx porn video here {link}",
+    "Get nude pics and naked photos of local girls for free {link}",
+    "Download cracked software with license key attached, no payment needed.",
+    "Serial number included for the full pirated suite, grab it before takedown.",
+    "White power forever, heil hitler brothers.",
+    "Death to jews and all their supporters.",
+    "Exclusive adult content and explicit videos waiting for you {link}",
+    "Join our movement to drive the immigrants out by force.",
+]
+
+
+def _split(pool, split):
+    # Every fourth sentence is held out for evaluation
+    return [s for i, s in enumerate(pool) if (i % 4 == 3) == (split == "eval")]
+
+
+def _fill(template, rng):
+    return template.format(
+        name=rng.choice(NAMES), company=rng.choice(COMPANIES), product=rng.choice(PRODUCTS),
+        date=rng.choice(DATES), amount=rng.choice(AMOUNTS), link=rng.choice(LINKS),
+    )
+
+
+_LEET = {"a": "4", "e": "3", "i": "1", "o": "0", "s": "$", "t": "7"}
+_LOOKALIKE = {"a": "а", "e": "е", "o": "о", "p": "р", "c": "с", "x": "х", "i": "і"}
+
+
+def obfuscate(text, rng):
+    """One of the tricks used to get past keyword filters."""
+    trick = rng.choice(["leet", "lookalike", "spacing", "zero-width", "dots"])
+    words = text.split(" ")
+    targets = rng.sample(range(len(words)), k=max(1, len(words) // 3))
+    for i in targets:
+        word = words[i]
+        if trick == "leet":
+            word = "".join(_LEET.get(c, c) if rng.random() < 0.6 else c for c in word)
+        elif trick == "lookalike":
+            word = "".join(_LOOKALIKE.get(c, c) if rng.random() < 0.6 else c for c in word)
+        elif trick == "spacing" and word.isalpha():
+            word = " ".join(word)
+        elif trick == "zero-width":
+            word = "\u200b".join(word)
+        elif trick == "dots" and word.isalpha():
+            word = ".".join(word)
+        words[i] = word
+    return " ".join(words)
+
+
+def make_email(rng, unsafe, split):
+    """(text, kind) with kind one of safe, hard_negative, unsafe, obfuscated."""
+    safe_pool = _split(SAFE, split)
+    # Same number of sentences either way, so length and greetings say nothing about the label
+    sentences = [_fill(rng.choice(safe_pool), rng) for _ in range(rng.randint(1, 3))]
+    kind = "unsafe" if unsafe else "safe"
+    if unsafe:
+        obfuscated = rng.random() < 0.35
+        sentence = _fill(rng.choice(_split(UNSAFE, split)), rng)
+        sentences[rng.randrange(len(sentences))] = obfuscate(sentence, rng) if obfuscated else sentence
+        kind = "obfuscated" if obfuscated else kind
+    elif rng.random() < 0.5:
+        sentences[rng.randrange(len(sentences))] = _fill(rng.choice(_split(HARD_NEGATIVES, split)), rng)
+        kind = "hard_negative"
+    body = " ".join(sentences)
+    return f"{_fill(rng.choice(GREETINGS), rng)}\n\n{body}\n\n{_fill(rng.choice(SIGNOFFS), rng)}", kind
+
+
+def generate(size, seed=7, eval_share=0.3, unsafe_share=0.4):
+    rng = random.Random(seed)
+    for _ in range(size):
+        split = "eval" if rng.random() < eval_share else "train"
+        unsafe = rng.random() < unsafe_share
+        text, kind = make_email(rng, unsafe, split)
+        yield {"text": text, "label": int(unsafe), "split": split, "kind": kind}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--size", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    with open(args.output, "w", encoding="utf-8") as f:
+        for item in generate(args.size, args.seed):
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,11 @@ from typing import Optional, Dict, Any
 
 # Default to localhost:8000 if not set
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000/api/v1")
+# Change events WebSocket; defaults to the API host
+API_EVENTS_URL = os.getenv(
+    "API_EVENTS_URL",
+    API_BASE_URL.replace("http", "ws", 1).rsplit("/api/", 1)[0] + "/ws/events"
+)
 
 class APIClient:
     @staticmethod
@@ -72,3 +77,23 @@ class APIClient:
         url = f"{API_BASE_URL}/threads/{thread_id}"
         response = requests.get(url)
         return APIClient._handle_response(response)
+
+    @staticmethod
+    def get_analytics(start: Optional[str] = None, end: Optional[str] = None, group_by: str = "day", sender: Optional[str] = None) -> Dict[str, Any]:
+        url = f"{API_BASE_URL}/analytics"
+        params = {"group_by": group_by}
+        if start:
+            params["start"] = start
+        if end:
+            params["end"] = end
+        if sender:
+            params["sender"] = sender
+        response = requests.get(url, params=params)
+        return APIClient._handle_response(response)
+
+    @staticmethod
+    def get_events(since: Optional[int] = None) -> Dict[str, Any]:
+        """Change events after `since` (polling fallback for the events WebSocket)"""
+        url = f"{API_BASE_URL}/events/"
+        response = requests.get(url, params={"since": since} if since is not None else None)
+        return APIClient._handle_response(response)
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+try:
+    from websockets.sync.client import connect
+except ImportError:  # Without websockets the pages poll GET /events instead
+    connect = None
+
+# Event types that change what GET /threads/{id} returns
+THREAD_CHANGES = {"email", "reply"}
+
+
+class EventStream:
+    """
+    One WebSocket to the backend's /ws/events for the whole Streamlit
+    process, shared by every session. Events are kept in a bounded buffer;
+    each session reads those after the last one it applied. Reconnects with
+    the last sequence number seen, so nothing is missed across a drop.
+    """
+
+    def __init__(self, url: str, buffer_size: int = 1000):
+        self.url = url
+        self.seq: Optional[int] = None
+        self.connected = False
+        self._events = deque(maxlen=buffer_size)
+        self._resync_at = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="event-stream", daemon=True)
+
+    def start(self) -> "EventStream":
+        if connect is not None:
+            self._thread.start()
+        return self
+
+    def events_after(self, seq: Optional[int]) -> Optional[List[dict]]:
+        """Events after `seq`, or None if the caller missed some and must reload."""
+        with self._lock:
+            if seq is None or self.seq is None or seq < self._resync_at or seq > self.seq:
+                return None
+            if self._events and self._events[0]["seq"] > seq + 1:
+                return None
+            return [event for event in self._events if event["seq"] > seq]
+
+    def _run(self):
+        delay = 1.0
+        while True:
+            url = self.url if self.seq is None else f"{self.url}?since={self.seq}"
+            try:
+                with connect(url, open_timeout=5) as websocket:
+                    for message in websocket:
+                        self._receive(json.loads(message))
+                        # Connected once the first message has said where the stream stands
+                        self.connected, delay = True, 1.0
+            except Exception:
+                pass
+            self.connected = False
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _receive(self, event: dict):
+        with self._lock:
+            if event["type"] == "resync" or (self.seq is not None and event["seq"] < self.seq):
+                # Missed events, or the backend restarted and numbering started over
+                self._events.clear()
+                self._resync_at = event["seq"]
+            elif event["type"] != "ping":
+                self._events.append(event)
+            self.seq = event["seq"]
+
+
+class ThreadCache:
+    """
+    The thread list (and opened summaries) of one session, kept current from
+    change events: each change re-reads only the thread or summary it names,
+    so reruns without changes cost no backend reads at all.
+    """
+
+    def __init__(self, client, limit: int = 100):
+        self.client = client
+        self.limit = limit
+        self.seq: Optional[int] = None
+        self.threads: Dict[str, dict] = {}
+        self.summaries: Dict[str, dict] = {}
+
+    def refresh(self, stream: Optional[EventStream] = None) -> bool:
+        """Applies new events (from `stream`, or by polling); returns whether anything changed."""
+        if stream is not None and stream.connected:
+            seq, events = stream.seq, stream.events_after(self.seq)
+        else:
+            response = self.client.get_events(self.seq)
+            seq, events = response["seq"], None if response["resync"] else response["events"]
+        if events is None:
+            self.reload(seq)
+            return True
+        self.seq = seq
+        return self.apply(events)
+
+    def reload(self, seq: Optional[int]):
+        # The sequence number is taken before reading, so later changes are applied again rather than lost
+        self.seq = seq
+        self.threads = {thread["id"]: thread for thread in self.client.list_threads(limit=self.limit)}
+        self.summaries.clear()
+
+    def apply(self, events: List[dict]) -> bool:
+        changed, dirty = {}, False
+        for event in events:
+            if event["type"] in THREAD_CHANGES and event["thread_id"]:
+                changed[event["thread_id"]] = True
+            elif event["type"] == "thread" and event["status"] == "archived":
+                changed.pop(event["thread_id"], None)
+                dirty |= self.threads.pop(event["thread_id"], None) is not None
+            if event["type"] == "summary" and event["email_id"]:
+                dirty |= self.summaries.pop(event["email_id"], None) is not None
+        for thread_id in changed:
+            if thread_id in self.threads or len(self.threads) < self.limit:
+                self.threads[thread_id] = self.client.get_thread(thread_id)
+                dirty = True
+        return dirty
+
+    def list(self, limit: Optional[int] = None) -> List[dict]:
+        return list(self.threads.values())[:limit]
+
+    def summary(self, email_id: str) -> dict:
+        if email_id not in self.summaries:
+            self.summaries[email_id] = self.client.get_email_summary(email_id)
+        return self.summaries[email_id]
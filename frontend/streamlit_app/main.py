@@ -33,8 +33,8 @@ st.markdown("---")
 st.markdown("### Quick Stats")
 
 try:
-    from api_client import APIClient
-    threads = APIClient.list_threads(limit=100)
+    from utils import live_threads
+    threads = live_threads(limit=100)
     
     total_threads = len(threads)
     total_emails = sum(len(t['emails']) for t in threads)
@@ -39,7 +39,10 @@ with col1:
                             "reply": None, 
                             "thread_id": None 
                         }
-                        st.success("Email submitted successfully!")
+                        if res.get('status') == 'queued':
+                            st.warning("Email stored. The AI service is unavailable right now, so the analysis has been queued.")
+                        else:
+                            st.success("Email submitted successfully!")
                     except Exception as e:
                         st.error(f"Error: {e}")
 
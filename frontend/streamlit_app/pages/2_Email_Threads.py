@@ -1,13 +1,13 @@
 import streamlit as st
-from api_client import APIClient
-from utils import init_page
+from utils import init_page, live_threads, watch_changes
 
 init_page("Email Threads")
 
 st.title("📨 Email Threads")
 
 try:
-    threads = APIClient.list_threads(limit=50)
+    threads = live_threads(limit=50)
+    watch_changes()
     
     if not threads:
         st.info("No email threads found. Start by submitting a new email!")
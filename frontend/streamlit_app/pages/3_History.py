@@ -1,6 +1,5 @@
 import streamlit as st
-from api_client import APIClient
-from utils import init_page
+from utils import init_page, live_threads, watch_changes
 import pandas as pd
 
 init_page("History")
@@ -8,7 +7,8 @@ init_page("History")
 st.title("📜 History")
 
 try:
-    threads = APIClient.list_threads(limit=100)
+    threads = live_threads(limit=100)
+    watch_changes()
     
     if not threads:
         st.info("No history available yet.")
@@ -68,10 +68,10 @@ try:
                     c4.write(row['Status'])
                     
                     if c5.button("View", key=f"view_{row['Email ID']}"):
-                        # Fetch and display email details
+                        # Fetch and display email details; kept fresh by summary change events
                         try:
-                            summary = APIClient.get_email_summary(row['Email ID'])
-                            st.session_state[f"view_email_{row['Email ID']}"] = summary
+                            st.session_state.thread_cache.summary(row['Email ID'])
+                            st.session_state[f"view_email_{row['Email ID']}"] = True
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error: {e}")
@@ -84,7 +84,10 @@ try:
                 # Show details if viewed
                 if st.session_state.get(f"view_email_{row['Email ID']}"):
                     st.markdown("---")
-                    summary_data = st.session_state[f"view_email_{row['Email ID']}"]["summary"]
+                    summary_data = st.session_state.thread_cache.summary(row['Email ID'])["summary"]
+                    if summary_data is None:
+                        st.info("Analysis pending: the AI service was unavailable when this email arrived.")
+                        continue
                     
                     with st.expander("📊 Email Analysis", expanded=True):
                         # Key Metrics
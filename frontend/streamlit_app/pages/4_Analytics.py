@@ -0,0 +1,70 @@
+import streamlit as st
+from api_client import APIClient
+from utils import init_page
+from datetime import date, timedelta
+import pandas as pd
+
+init_page("Analytics")
+
+st.title("📈 Analytics")
+
+# Filters
+col1, col2, col3 = st.columns(3)
+with col1:
+    date_range = st.date_input("Date range", value=(date.today() - timedelta(days=29), date.today()))
+with col2:
+    group_by = st.selectbox("Group by", ["day", "sender"])
+with col3:
+    sender = st.text_input("Sender", placeholder="Filter by exact sender...")
+
+if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+    start, end = date_range
+else:
+    start = end = date_range[0] if isinstance(date_range, (tuple, list)) else date_range
+
+try:
+    data = APIClient.get_analytics(start.isoformat(), end.isoformat(), group_by=group_by, sender=sender or None)
+    totals = data["totals"]
+
+    if not data["rows"]:
+        st.info("No summarised emails in this range yet.")
+    else:
+        # Headline numbers
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Emails", totals["emails"])
+        m2.metric("Replied", totals["replied"])
+        m3.metric("Avg Sentiment", f"{totals['avg_sentiment']:.2f}" if totals["avg_sentiment"] is not None else "N/A")
+        turnaround = totals["avg_turnaround_seconds"]
+        m4.metric("Avg Turnaround", f"{turnaround / 3600:.1f} h" if turnaround is not None else "N/A")
+
+        df = pd.DataFrame(data["rows"]).set_index(group_by)
+
+        st.markdown("---")
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("### Intent Mix")
+            st.bar_chart(pd.DataFrame(df["intent"].tolist(), index=df.index).fillna(0))
+        with c2:
+            st.markdown("### Urgency Distribution")
+            st.bar_chart(pd.DataFrame(df["urgency"].tolist(), index=df.index).fillna(0))
+
+        c3, c4 = st.columns(2)
+        with c3:
+            st.markdown("### Sentiment")
+            if group_by == "day":
+                st.line_chart(df["avg_sentiment"])
+            else:
+                st.bar_chart(pd.DataFrame(df["sentiment"].tolist(), index=df.index).fillna(0))
+        with c4:
+            st.markdown("### Reply Turnaround (hours)")
+            st.bar_chart((df["avg_turnaround_seconds"] / 3600).rename("hours"))
+
+        st.markdown("### Details")
+        st.dataframe(
+            df[["emails", "replied", "avg_sentiment", "avg_turnaround_seconds"]],
+            use_container_width=True
+        )
+
+except Exception as e:
+    st.error(f"Failed to load analytics: {str(e)}")
+    st.warning("Make sure the backend server is running!")
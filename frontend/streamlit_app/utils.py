@@ -1,5 +1,7 @@
 import streamlit as st
 import os
+from api_client import API_EVENTS_URL, APIClient
+from live import EventStream, ThreadCache
 
 def load_css(file_path: str):
     with open(file_path) as f:
@@ -24,3 +26,27 @@ def init_page(page_title: str):
         st.markdown("---")
         st.caption("Context Aware AI Email Reply Tool")
 
+@st.cache_resource
+def get_event_stream():
+    """The process-wide change event stream, shared by all sessions."""
+    return EventStream(API_EVENTS_URL).start()
+
+def live_threads(limit: int = 100) -> list:
+    """
+    Threads as last seen by this session, updated from change events
+    instead of re-downloading the thread list on every rerun.
+    """
+    if "thread_cache" not in st.session_state:
+        st.session_state.thread_cache = ThreadCache(APIClient)
+    cache = st.session_state.thread_cache
+    cache.refresh(get_event_stream())
+    return cache.list(limit)
+
+def watch_changes(interval: float = 2.0):
+    """Reruns the page when change events touch what this session shows."""
+    @st.fragment(run_every=interval)
+    def _watch():
+        cache = st.session_state.get("thread_cache")
+        if cache is not None and cache.refresh(get_event_stream()):
+            st.rerun()
+    _watch()
@@ -1,3 +1,6 @@
+import copy
+from unittest.mock import patch
+
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -5,6 +8,32 @@ from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 from backend.main import app
 from backend.db.database import get_db, Base
+from backend.core.config import settings
+from backend.ai.email_processor import EmailProcessor, EmailSummaryModel
+
+SUMMARY_JSON = {
+    "email_id": "e1",
+    "timestamp": "2025-01-01",
+    "sender": {"email": "a@example.com"},
+    "thread_info": {"is_thread": False},
+    "content_analysis": {"main_topic": "pricing"},
+    "classification": {"intent": "inquiry", "confidence": 0.9},
+    "sentiment": {"score": 0.1, "label": "neutral", "tone": "polite"},
+    "urgency": {"level": "low", "reason": "none", "suggested_response_time": "1 day"},
+    "context_summary": "asks for pricing",
+    "recommended_tone": "professional",
+}
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", default=False, help="Run tests marked slow")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="slow; pass --run-slow to run")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
 
 # Use in-memory SQLite for tests
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -40,9 +69,43 @@ def client(db_session):
     
     # Patch the engine in backend.main to use our test engine
     # This prevents the lifespan event from trying to connect to the real DB
-    from unittest.mock import patch
-    with patch("backend.main.engine", engine):
+    # (and the rollup refresher from polling it)
+    with patch("backend.main.engine", engine), patch.object(settings, "ANALYTICS_REFRESH_ENABLED", False):
         with TestClient(app) as c:
             yield c
             
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def summary_json():
+    """A valid summary, as the summary LLM call returns it."""
+    return copy.deepcopy(SUMMARY_JSON)
+
+
+class FakeSummaries:
+    """
+    Stands in for EmailProcessor._generate_summary: returns `summary_json`
+    (with `fields` applied) for the email and records (email_id, email_count)
+    per call. `before(email)` runs first, e.g. to simulate a concurrent write.
+    """
+
+    def __init__(self, summary_json):
+        self.summary_json = summary_json
+        self.fields = {}
+        self.before = None
+        self.calls = []
+
+    def generate(self, email, thread_context, email_count):
+        if self.before:
+            self.before(email)
+        self.calls.append((email.id, email_count))
+        return EmailSummaryModel(**{**self.summary_json, **self.fields, "email_id": email.id})
+
+
+@pytest.fixture
+def fake_summaries(summary_json):
+    """Replaces the summary LLM call for the whole test."""
+    fake = FakeSummaries(summary_json)
+    with patch.object(EmailProcessor, "_generate_summary", lambda processor, *args: fake.generate(*args)):
+        yield fake
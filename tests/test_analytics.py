@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.core.analytics import RollupRefresher, refresh_rollups
+from backend.db.models import AnalyticsRefreshState, DailyEmailRollup, Email, EmailSummary, GeneratedReply, Thread
+
+DAY1 = datetime(2025, 3, 3, 9, 0)
+DAY2 = datetime(2025, 3, 4, 9, 0)
+
+
+def _summary(intent, sentiment, score, urgency):
+    return {
+        "classification": {"intent": intent, "confidence": 0.9},
+        "sentiment": {"label": sentiment, "score": score, "tone": "polite"},
+        "urgency": {"level": urgency, "reason": "", "suggested_response_time": "1 day"},
+    }
+
+
+def _add(db, email_id, sender, received_at, summary, reply_after=None, summarized_at=None):
+    db.add(Email(id=email_id, thread_id="t", sender=sender, subject="s", body="b", received_at=received_at))
+    db.add(EmailSummary(email_id=email_id, summary_json=summary, created_at=summarized_at or received_at))
+    if reply_after is not None:
+        db.add(GeneratedReply(email_id=email_id, reply_text="r", tone="professional", created_at=received_at + reply_after))
+
+
+def _seed(db):
+    db.add(Thread(id="t"))
+    _add(db, "a1", "ann@example.com", DAY1, _summary("Inquiry", "Positive", 0.8, "low"), timedelta(hours=2))
+    _add(db, "a2", "ann@example.com", DAY1 + timedelta(hours=1), _summary("inquiry", "negative", -0.4, "high"), timedelta(hours=4))
+    _add(db, "b1", "bob@example.com", DAY1, _summary("complaint", "negative", -0.6, "high"))
+    _add(db, "b2", "bob@example.com", DAY2, _summary("complaint", "neutral", 0.0, "medium"), timedelta(minutes=30))
+    db.commit()
+
+
+def test_daily_analytics(client, db_session):
+    _seed(db_session)
+    response = client.get("/api/v1/analytics", params={"start": "2025-03-01", "end": "2025-03-31", "refresh": True})
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["totals"]["emails"] == 4 and data["totals"]["replied"] == 3
+    assert data["totals"]["intent"] == {"inquiry": 2, "complaint": 2}
+    day1, day2 = data["rows"]
+    assert day1["day"] == "2025-03-03" and day1["emails"] == 3
+    assert day1["sentiment"] == {"positive": 1, "negative": 2}
+    assert day1["urgency"] == {"low": 1, "high": 2}
+    assert day1["avg_turnaround_seconds"] == 3 * 3600
+    assert day1["avg_sentiment"] == round((0.8 - 0.4 - 0.6) / 3, 3)
+    assert day2["day"] == "2025-03-04" and day2["avg_turnaround_seconds"] == 1800
+
+
+def test_sender_analytics(client, db_session):
+    _seed(db_session)
+    # Reading does not refresh (or write anything); the background refresher does
+    data = client.get("/api/v1/analytics", params={"start": "2025-03-01", "end": "2025-03-31"}).json()
+    assert data["totals"]["emails"] == 0 and db_session.query(AnalyticsRefreshState).count() == 0
+    assert RollupRefresher(lambda: db_session).run_once() == 2
+
+    data = client.get("/api/v1/analytics", params={
+        "start": "2025-03-01", "end": "2025-03-31", "group_by": "sender"
+    }).json()
+    by_sender = {row["sender"]: row for row in data["rows"]}
+    assert by_sender["bob@example.com"]["intent"] == {"complaint": 2}
+    assert by_sender["ann@example.com"]["replied"] == 2
+
+    data = client.get("/api/v1/analytics", params={
+        "start": "2025-03-04", "end": "2025-03-04", "sender": "bob@example.com"
+    }).json()
+    assert [row["emails"] for row in data["rows"]] == [1]
+
+
+def test_refresh_only_rebuilds_changed_days(db_session):
+    _seed(db_session)
+    assert refresh_rollups(db_session) == 2
+    day1_rows = {row.id for row in db_session.query(DailyEmailRollup).filter(DailyEmailRollup.day == DAY1.date())}
+
+    # Nothing new since the last refresh (everything was summarised long ago)
+    assert refresh_rollups(db_session) == 0
+
+    # A fresh summary on day 2 only rebuilds day 2
+    _add(db_session, "b3", "bob@example.com", DAY2 + timedelta(hours=3), _summary("complaint", "neutral", 0.0, "low"),
+         summarized_at=datetime.now(timezone.utc))
+    db_session.commit()
+    assert refresh_rollups(db_session) == 1
+    assert {row.id for row in db_session.query(DailyEmailRollup).filter(DailyEmailRollup.day == DAY1.date())} == day1_rows
+    day2_emails = sum(row.emails for row in db_session.query(DailyEmailRollup).filter(DailyEmailRollup.day == DAY2.date()))
+    assert day2_emails == 2
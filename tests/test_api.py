@@ -6,7 +6,7 @@ from unittest.mock import MagicMock, patch
 
 @pytest.fixture
 def mock_llm_response():
-    with patch("backend.ai.email_processor.ChatOpenAI") as mock_chat:
+    with patch("backend.ai.llm.ChatOpenAI") as mock_chat:
         # Mock for EmailProcessor
         mock_instance = mock_chat.return_value
         # Mock the chain invocation
@@ -0,0 +1,174 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+import zstandard
+
+from backend.ai.email_processor import EmailProcessor
+from backend.core.archive import ThreadArchiver
+from backend.core.config import settings
+from backend.db.models import (
+    ArchivedThread,
+    Email,
+    EmailSummary,
+    GeneratedReply,
+    OutboxMessage,
+    PendingSummary,
+    Thread,
+    ThreadDocument,
+)
+
+
+def _thread(db, thread_id, days_ago, replied=False):
+    received_at = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    db.add(Thread(id=thread_id))
+    for i in range(2):
+        db.add(Email(id=f"{thread_id}-{i}", thread_id=thread_id, sender="a@example.com", subject="Pricing",
+                     body=f"Message {i}", message_id=f"<{thread_id}-{i}@example.com>",
+                     received_at=received_at + timedelta(minutes=i)))
+    db.add(EmailSummary(email_id=f"{thread_id}-1", summary_json={"thread_info": {"thread_id": thread_id}}))
+    if replied:
+        db.add(GeneratedReply(id=len(thread_id), email_id=f"{thread_id}-1", reply_text="Thanks!", tone="friendly"))
+    db.commit()
+
+
+@pytest.mark.parametrize("backend", ["table", "segments"])
+def test_idle_threads_move_to_archive_and_stay_readable(client, db_session, tmp_path, backend):
+    _thread(db_session, "old", days_ago=400, replied=True)
+    _thread(db_session, "busy", days_ago=400)
+    db_session.add(PendingSummary(email_id="busy-0"))
+    _thread(db_session, "recent", days_ago=3)
+    before = client.get("/api/v1/threads/old").json()
+
+    archiver = ThreadArchiver(lambda: db_session, after_days=180, backend=backend, directory=str(tmp_path))
+    assert archiver.run_once() == 1
+    assert archiver.run_once() == 0
+
+    # Hot tables no longer hold the archived thread; the busy and recent ones stay
+    db_session.expire_all()
+    assert {t.id for t in db_session.query(Thread)} == {"busy", "recent"}
+    assert db_session.query(Email).filter(Email.thread_id == "old").count() == 0
+    assert db_session.query(GeneratedReply).count() == 0
+    assert db_session.get(ThreadDocument, "old") is None
+
+    row = db_session.query(ArchivedThread).filter_by(thread_id="old").one()
+    assert row.email_count == 2
+    if backend == "segments":
+        assert row.payload is None
+        frame = (tmp_path / row.segment).read_bytes()[row.offset:row.offset + row.length]
+    else:
+        assert row.segment is None
+        frame = row.payload
+    record = json.loads(zstandard.ZstdDecompressor().decompress(frame))
+    assert record["emails"][1]["summary"]["summary_json"] == {"thread_info": {"thread_id": "old"}}
+
+    # GET /threads/{id} answers the same as before archival
+    with patch.object(settings, "ARCHIVE_DIR", str(tmp_path)):
+        response = client.get("/api/v1/threads/old")
+    assert response.status_code == 200
+    assert response.json() == before
+
+
+def test_undelivered_reply_keeps_thread_hot(db_session, tmp_path):
+    _thread(db_session, "queued", days_ago=400, replied=True)
+    reply = db_session.query(GeneratedReply).one()
+    db_session.add(OutboxMessage(reply_id=reply.id, to_address="a@example.com", subject="Re: Pricing",
+                                 body="Thanks!", status="queued"))
+    db_session.commit()
+
+    archiver = ThreadArchiver(lambda: db_session, after_days=180, directory=str(tmp_path))
+    assert archiver.run_once() == 0
+
+    db_session.query(OutboxMessage).update({"status": "sent"})
+    db_session.commit()
+    assert archiver.run_once() == 1
+    assert db_session.query(OutboxMessage).count() == 0
+
+
+@pytest.mark.parametrize("backend", ["table", "segments"])
+def test_new_email_for_archived_thread_restores_it(client, db_session, tmp_path, backend):
+    _thread(db_session, "old", days_ago=400, replied=True)
+    archiver = ThreadArchiver(lambda: db_session, after_days=180, backend=backend, directory=str(tmp_path))
+    assert archiver.run_once() == 1
+
+    # A late reply resolves to the archived thread by its headers and brings the history back
+    with patch.object(settings, "ARCHIVE_DIR", str(tmp_path)):
+        email = EmailProcessor(db_session).store_email({
+            "sender": "a@example.com", "subject": "Re: Pricing", "body": "Any update?",
+            "in_reply_to": "<old-1@example.com>",
+        })
+    assert email.thread_id == "old"
+    db_session.expire_all()
+    assert db_session.query(ArchivedThread).count() == 0
+    assert [e.body for e in db_session.get(Thread, "old").emails] == ["Message 0", "Message 1", "Any update?"]
+    assert db_session.get(Email, "old-1").summary.summary_json == {"thread_info": {"thread_id": "old"}}
+    assert db_session.get(Email, "old-1").reply.reply_text == "Thanks!"
+    assert len(client.get("/api/v1/threads/old").json()["emails"]) == 3
+
+    # Archived again later as one thread, not a second record next to the first
+    assert archiver.run_once(now=datetime.now(timezone.utc) + timedelta(days=365)) == 1
+    assert db_session.query(ArchivedThread).filter_by(thread_id="old").one().email_count == 3
+
+
+def test_rearchiving_a_thread_that_went_hot_merges_its_records(client, db_session, tmp_path):
+    _thread(db_session, "old", days_ago=400)
+    archiver = ThreadArchiver(lambda: db_session, after_days=180, directory=str(tmp_path))
+    assert archiver.run_once() == 1
+    # The same thread id hot again next to its archived record, as stored before restoring existed
+    db_session.add(Thread(id="old"))
+    db_session.add(Email(id="old-2", thread_id="old", sender="a@example.com", subject="Re: Pricing", body="Again",
+                         received_at=datetime.now(timezone.utc) - timedelta(days=200)))
+    db_session.commit()
+
+    assert archiver.run_once() == 1
+    row = db_session.query(ArchivedThread).filter_by(thread_id="old").one()
+    assert row.email_count == 3
+    body = client.get("/api/v1/threads/old").json()
+    assert [e["body"] for e in body["emails"]] == ["Message 0", "Message 1", "Again"]
+
+
+def test_email_arriving_during_archival_is_not_lost(db_session, tmp_path):
+    _thread(db_session, "old", days_ago=400)
+    _thread(db_session, "other", days_ago=400)
+    archiver = ThreadArchiver(lambda: db_session, after_days=180, directory=str(tmp_path))
+    candidates, delete_hot = archiver._candidates, archiver._delete_hot
+
+    def late_email(email_id, thread_id):
+        db_session.add(Email(id=email_id, thread_id=thread_id, sender="a@example.com", subject="Re: Pricing",
+                             body="Still there?"))
+        db_session.flush()
+
+    def candidates_then_new_mail(db, cutoff, thread_ids=None):
+        found = candidates(db, cutoff, thread_ids)
+        if thread_ids is None:
+            late_email("old-late", "old")
+        return found
+
+    def new_mail_then_delete(db, thread_ids, email_ids):
+        late_email("other-late", "other")
+        delete_hot(db, thread_ids, email_ids)
+
+    with patch.object(archiver, "_candidates", candidates_then_new_mail), \
+            patch.object(archiver, "_delete_hot", new_mail_then_delete):
+        assert archiver.run_once() == 1
+
+    db_session.expire_all()
+    # "old" got mail before the re-check under the lock and stays hot
+    assert db_session.query(Email).filter_by(thread_id="old").count() == 3
+    assert db_session.query(ArchivedThread).filter_by(thread_id="old").count() == 0
+    # An email stored without waiting for the lock is never deleted with the archived ones
+    assert [e.id for e in db_session.query(Email).filter_by(thread_id="other")] == ["other-late"]
+    assert db_session.get(Thread, "other") is not None
+
+
+def test_rolled_back_batch_leaves_no_segment_frames(db_session, tmp_path):
+    _thread(db_session, "old", days_ago=400)
+    archiver = ThreadArchiver(lambda: db_session, after_days=180, backend="segments", directory=str(tmp_path))
+    with patch.object(archiver, "_delete_hot", side_effect=RuntimeError("connection lost")):
+        with pytest.raises(RuntimeError):
+            archiver.run_once()
+
+    assert all(segment.stat().st_size == 0 for segment in tmp_path.iterdir())
+    assert db_session.query(ArchivedThread).count() == 0
+    assert db_session.query(Email).count() == 2
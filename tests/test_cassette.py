@@ -0,0 +1,58 @@
+import uuid
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI
+
+from backend.ai.cassette import Cassette, CassetteMiss, use_cassette
+from backend.ai.llm import GovernedChatOpenAI, TASK_SUMMARY
+
+
+def _model():
+    return GovernedChatOpenAI(task=TASK_SUMMARY, model="gpt-4o-mini", api_key="test", max_retries=0)
+
+
+def _prompt(body="How much does the pro plan cost?"):
+    return [SystemMessage(content="Summarise the email."), HumanMessage(content=f"Email ID: {uuid.uuid4()}\n{body}")]
+
+
+def _provider(*args, **kwargs):
+    message = AIMessage(content="pricing question",
+                        usage_metadata={"input_tokens": 40, "output_tokens": 5, "total_tokens": 45})
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _record(path):
+    with patch.object(ChatOpenAI, "_generate", side_effect=_provider) as provider, \
+            use_cassette(Cassette(path, "record")):
+        assert _model().invoke(_prompt()).content == "pricing question"
+    assert provider.call_count == 1
+
+
+def test_replay_serves_recorded_response_without_provider(tmp_path):
+    path = str(tmp_path / "calls.jsonl.gz")
+    _record(path)
+
+    cassette = Cassette(path, "replay")
+    with patch.object(ChatOpenAI, "_generate", side_effect=AssertionError("provider called")), \
+            use_cassette(cassette):
+        # Same prompt with a different email id
+        response = _model().invoke(_prompt())
+    assert response.content == "pricing question"
+    assert response.usage_metadata["input_tokens"] == 40
+    assert cassette.stats[TASK_SUMMARY]["calls"] == 1
+
+
+def test_changed_prompt_is_replayed_with_scaled_tokens(tmp_path):
+    path = str(tmp_path / "calls.jsonl")
+    _record(path)
+
+    with use_cassette(Cassette(path, "replay")):
+        response = _model().invoke(_prompt("How much does the pro plan cost? " * 20))
+    assert response.content == "pricing question"
+    assert response.usage_metadata["input_tokens"] > 40
+
+    with use_cassette(Cassette(path, "replay", strict=True)), pytest.raises(CassetteMiss):
+        _model().invoke(_prompt("Something else entirely"))
@@ -0,0 +1,134 @@
+import time
+from unittest.mock import patch
+
+import httpx
+import openai
+import pytest
+from langchain_core.messages import HumanMessage
+
+from backend.ai import circuit_breaker
+from backend.ai.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from backend.ai.llm import GovernedChatOpenAI, TASK_SUMMARY, get_chat_model
+from backend.ai.summary_queue import SummaryBackfillWorker
+from backend.core.config import settings
+from backend.core.metrics import metrics
+from backend.db.models import EmailSummary, PendingSummary
+
+
+def _timeout(*args, **kwargs):
+    raise openai.APITimeoutError(request=httpx.Request("POST", "http://llm/v1/chat/completions"))
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    circuit_breaker._breakers.clear()
+    yield
+    circuit_breaker._breakers.clear()
+
+
+def test_breaker_opens_probes_and_closes():
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_seconds=10, clock=lambda: now[0])
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.before_call()
+    assert exc.value.retry_after == 10
+
+    now[0] = 10
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 20
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.snapshot() == {"state": "closed", "consecutive_failures": 0, "retry_after": 0.0}
+
+
+def test_governed_model_fails_fast_once_open(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_FAILURE_THRESHOLD", 2)
+    metrics.reset()
+    llm = GovernedChatOpenAI(model="breaker-test", api_key="test", base_url="http://outage/v1", max_retries=0)
+    with patch("langchain_openai.ChatOpenAI._generate", side_effect=_timeout) as provider:
+        for _ in range(2):
+            with pytest.raises(openai.APITimeoutError):
+                llm.invoke([HumanMessage(content="hi")])
+        with pytest.raises(CircuitOpenError):
+            llm.invoke([HumanMessage(content="hi")])
+    assert provider.call_count == 2
+    snapshot = metrics.snapshot()
+    assert snapshot["gauges"]["llm_circuit_state{circuit=http://outage/v1}"] == 2
+    assert snapshot["counters"]["llm_circuit_rejected{circuit=http://outage/v1}"] == 1
+
+
+def test_chat_models_have_explicit_timeouts():
+    timeout = get_chat_model(TASK_SUMMARY, "timeout-test").request_timeout
+    assert timeout.connect == settings.LLM_CONNECT_TIMEOUT
+    assert timeout.read == settings.LLM_READ_TIMEOUT
+
+
+def test_submit_degrades_while_provider_hangs(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_FAILURE_THRESHOLD", 2)
+
+    def hang(*args, **kwargs):
+        time.sleep(0.3)
+        _timeout()
+
+    timings = []
+    with patch("langchain_openai.ChatOpenAI._generate", side_effect=hang):
+        for i in range(4):
+            start = time.perf_counter()
+            response = client.post("/api/v1/email/submit", json={
+                "subject": f"Order {i}", "body": "Where is my order?", "sender": "ann@example.com"
+            })
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200
+            assert response.json()["status"] == "queued"
+
+        start = time.perf_counter()
+        assert client.get("/api/v1/threads/").status_code == 200
+        threads_latency = time.perf_counter() - start
+
+        health = client.get("/health").json()
+
+    # Two timeouts open the circuit; later submits are stored without waiting on the provider
+    assert min(timings[:2]) >= 0.3
+    assert max(timings[2:]) < 0.2
+    assert threads_latency < 0.2
+    assert health["status"] == "degraded" and health["pending_summaries"] == 4
+    assert health["llm"][settings.OPENAI_BASE_URL]["state"] == "open"
+
+    email_id = response.json()["email_id"]
+    assert client.get(f"/api/v1/email/{email_id}/summary").status_code == 202
+
+
+def test_backfill_summarises_once_provider_recovers(client, db_session, monkeypatch, summary_json):
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_FAILURE_THRESHOLD", 1)
+    with patch("langchain_openai.ChatOpenAI._generate", side_effect=_timeout):
+        email_id = client.post("/api/v1/email/submit", json={
+            "subject": "Invoice", "body": "Please resend the invoice.", "sender": "bob@example.com"
+        }).json()["email_id"]
+
+    worker = SummaryBackfillWorker(lambda: db_session)
+    with patch("langchain_openai.ChatOpenAI._generate") as provider:
+        # Circuit still open: nothing is attempted and the email stays queued
+        assert worker.run_once() == 0
+        assert provider.call_count == 0
+    assert db_session.get(PendingSummary, email_id).attempts == 0
+
+    get_breaker(settings.OPENAI_BASE_URL).record_success()
+    with patch("backend.ai.email_processor.EmailProcessor._invoke_summary", return_value=summary_json):
+        assert worker.run_once() == 1
+
+    assert db_session.get(PendingSummary, email_id) is None
+    stored = db_session.query(EmailSummary).filter_by(email_id=email_id).one().summary_json
+    assert stored["email_id"] == email_id and stored["context_summary"] == "asks for pricing"
+    assert client.get("/health").json()["status"] == "ok"
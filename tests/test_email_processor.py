@@ -0,0 +1,134 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import insert
+
+from backend.ai.email_processor import EmailProcessor, EmailSummaryModel
+from backend.ai.llm import ModelRouter
+from backend.core.metrics import metrics
+from backend.db.models import Email, Thread
+
+class ScriptedLLM:
+    """Returns the scripted responses in order and records the prompts it saw."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def _next(self, prompt_value):
+        self.prompts.append(prompt_value.to_messages())
+        return self.responses.pop(0)
+
+    def runnable(self):
+        return RunnableLambda(self._next)
+
+    def with_structured_output(self, schema, method=None, include_raw=False):
+        def call(prompt_value):
+            raw = self._next(prompt_value)
+            try:
+                return {"raw": raw, "parsed": schema(**json.loads(raw.content)), "parsing_error": None}
+            except Exception as e:
+                return {"raw": raw, "parsed": None, "parsing_error": e}
+        return RunnableLambda(call)
+
+
+def _processor(db_session, llm):
+    processor = EmailProcessor.__new__(EmailProcessor)
+    processor.db = db_session
+    processor.router = ModelRouter()
+    processor.llm = llm
+    return processor
+
+
+def _email():
+    return Email(id="e1", thread_id="t1", sender="a@example.com", subject="s", body="b")
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+def test_json_mode_repairs_malformed_output(db_session, summary_json):
+    llm = ScriptedLLM([AIMessage(content="not json at all"), AIMessage(content=json.dumps(summary_json))])
+    with patch("backend.ai.email_processor.settings.SUMMARY_STRUCTURED_OUTPUT", "off"):
+        summary = _processor(db_session, llm.runnable())._generate_summary(_email(), "ctx", 1)
+
+    assert isinstance(summary, EmailSummaryModel)
+    assert summary.thread_info.thread_id == "t1"
+    # The retry carries the failed output and the validation error
+    assert "failed validation" in llm.prompts[1][-1].content
+    assert metrics.snapshot()["counters"]["summary_parse_failures{mode=json}"] == 1
+
+
+def test_structured_mode_omits_format_instructions(db_session, summary_json):
+    llm = ScriptedLLM([AIMessage(content=json.dumps(summary_json))])
+    with patch("backend.ai.email_processor.settings.SUMMARY_STRUCTURED_OUTPUT", "on"):
+        summary = _processor(db_session, llm)._generate_summary(_email(), "ctx", 2)
+
+    assert summary.thread_info.is_thread is True
+    assert all("JSON schema" not in message.content for message in llm.prompts[0])
+    assert metrics.snapshot()["timings"]["summary_prompt_tokens_saved"]["sum"] > 0
+
+
+def test_repairs_are_bounded(db_session):
+    llm = ScriptedLLM([AIMessage(content="{}")] * 3)
+    with patch("backend.ai.email_processor.settings.SUMMARY_STRUCTURED_OUTPUT", "on"), \
+            patch("backend.ai.email_processor.settings.SUMMARY_MAX_REPAIRS", 2):
+        with pytest.raises(OutputParserException):
+            _processor(db_session, llm)._generate_summary(_email(), "ctx", 1)
+    assert len(llm.prompts) == 3
+
+
+def test_failure_before_any_raw_output_is_repaired(db_session, summary_json):
+    llm = ScriptedLLM([AIMessage(content=json.dumps(summary_json))])
+    calls = []
+
+    def structured(schema, method=None, include_raw=False):
+        def call(prompt_value):
+            calls.append(1)
+            if len(calls) == 1:
+                # A malformed provider response fails inside the chain, before any raw output exists
+                raise KeyError("choices")
+            return ScriptedLLM.with_structured_output(llm, schema).invoke(prompt_value)
+        return RunnableLambda(call)
+
+    llm.with_structured_output = structured
+    with patch("backend.ai.email_processor.settings.SUMMARY_STRUCTURED_OUTPUT", "on"):
+        summary = _processor(db_session, llm)._generate_summary(_email(), "ctx", 1)
+
+    assert summary.thread_info.thread_id == "t1"
+    assert len(calls) == 2
+    assert metrics.snapshot()["counters"]["summary_parse_failures{mode=structured}"] == 1
+
+
+def test_summary_prompt_prefix_is_static(db_session, summary_json):
+    llm = ScriptedLLM([AIMessage(content=json.dumps(summary_json))] * 2)
+    other = Email(id="e2", thread_id="t2", sender="b@example.com", subject="s", body="b")
+    with patch("backend.ai.email_processor.settings.SUMMARY_STRUCTURED_OUTPUT", "off"):
+        _processor(db_session, llm.runnable())._generate_summary(_email(), "ctx one", 1)
+        _processor(db_session, llm.runnable())._generate_summary(other, "ctx two", 1)
+
+    # Everything request-specific sits after the shared system message (format instructions included)
+    first, second = llm.prompts
+    assert first[0].content == second[0].content and "JSON schema" in first[0].content
+    assert first[-1].content.startswith("Thread Context:\nctx one") and first[-1].content.endswith("Sender: a@example.com")
+
+
+def test_thread_created_concurrently_by_another_process_is_reused(db_session):
+    def created_elsewhere(db, thread_id):
+        # Another process inserts the thread between the lookup and our insert
+        db.execute(insert(Thread).values(id=thread_id))
+        return None
+
+    with patch("backend.ai.email_processor.restore_archived_thread", created_elsewhere):
+        email = EmailProcessor(db_session).store_email(
+            {"thread_id": "t1", "sender": "a@example.com", "subject": "s", "body": "b"})
+    assert email.thread_id == "t1"
+    assert db_session.query(Thread).count() == 1
+    assert db_session.query(Email).filter_by(thread_id="t1").count() == 1
+    assert metrics.snapshot()["counters"]["thread_create_conflicts"] == 1
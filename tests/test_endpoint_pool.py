@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from backend.ai.endpoint_pool import Endpoint, EndpointPool
+from backend.ai.llm import GovernedChatOpenAI
+from backend.core.config import settings
+from backend.core.metrics import metrics
+
+
+class StubServer:
+    """OpenAI-compatible chat completions server answering with its name after `latency` seconds."""
+
+    def __init__(self, name: str, latency: float = 0.0, status: int = 200):
+        self.name = name
+        self.latency = latency
+        self.status = status
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                stub.requests += 1
+                time.sleep(stub.latency)
+                body = json.dumps({
+                    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "stub",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": stub.name}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+                } if stub.status == 200 else {"error": {"message": "overloaded"}}).encode()
+                try:
+                    self.send_response(stub.status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled this request
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(*args, **kwargs):
+        servers.append(StubServer(*args, **kwargs))
+        return servers[-1]
+
+    metrics.reset()
+    yield start
+    for server in servers:
+        server.server.shutdown()
+
+
+def _ask(pool):
+    return pool.generate("gpt-4o-mini", [HumanMessage(content="hi")]).generations[0].message.content
+
+
+def test_routes_to_lowest_latency_endpoint(stub):
+    fast, slow = stub("fast", 0.01), stub("slow", 0.15)
+    pool = EndpointPool([Endpoint(slow.url, api_key="test"), Endpoint(fast.url, api_key="test")])
+
+    # Each endpoint is measured once, then the fast one takes every call
+    answers = [_ask(pool) for _ in range(8)]
+    assert sorted(answers[:2]) == ["fast", "slow"]
+    assert answers[2:] == ["fast"] * 6
+
+    # Call sites use the pool transparently through the governed model
+    model = GovernedChatOpenAI(task="parse", model="gpt-4o-mini", api_key="test", max_retries=0)
+    with patch("backend.ai.llm.get_pool", return_value=pool):
+        assert model.invoke("hi").content == "fast"
+
+
+def test_fails_over_and_skips_open_circuit(stub):
+    down, up = stub("down", status=500), stub("up")
+    pool = EndpointPool([Endpoint(down.url, api_key="test", weight=10), Endpoint(up.url, api_key="test")])
+
+    assert [_ask(pool) for _ in range(10)] == ["up"] * 10
+    # The failure penalty moves the failing endpoint behind the healthy one after one attempt
+    assert down.requests == 1
+    # An open circuit ranks last whatever the score
+    for _ in range(settings.LLM_CIRCUIT_FAILURE_THRESHOLD):
+        pool.endpoints[0].breaker.record_failure()
+    pool.endpoints[0].ewma = 0.0
+    assert pool.rank()[0] is pool.endpoints[1]
+    assert metrics.snapshot()["counters"][f"llm_endpoint_failovers{{endpoint={down.url}}}"] >= 1
+
+
+def test_rate_limited_endpoint_drops_out_of_first_place(stub):
+    # 429s leave the circuit closed; only the failure penalty moves the endpoint down
+    limited, up = stub("limited", status=429), stub("up")
+    pool = EndpointPool([Endpoint(limited.url, api_key="test", weight=10), Endpoint(up.url, api_key="test")])
+
+    assert [_ask(pool) for _ in range(10)] == ["up"] * 10
+    assert limited.requests == 1
+    assert metrics.snapshot()["counters"][f"llm_endpoint_errors{{endpoint={limited.url}}}"] == 1
+
+
+def test_hedge_cancels_slow_primary(stub):
+    primary, backup = stub("primary", 0.01), stub("backup", 0.01)
+    pool = EndpointPool(
+        [Endpoint(primary.url, api_key="test", weight=10), Endpoint(backup.url, api_key="test")],
+        hedge=True, hedge_min_delay=0.05, hedge_min_samples=5,
+    )
+    for _ in range(8):
+        _ask(pool)
+
+    primary.latency = 2.0
+    start = time.perf_counter()
+    assert _ask(pool) == "backup"
+    assert time.perf_counter() - start < 1.0
+
+    counters = metrics.snapshot()["counters"]
+    assert counters[f"llm_hedged_requests{{endpoint={backup.url}}}"] == 1
+    assert counters[f"llm_hedge_cancelled{{endpoint={primary.url}}}"] == 1
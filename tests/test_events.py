@@ -0,0 +1,48 @@
+from unittest.mock import patch
+
+from backend.core.events import EMAIL, REPLY, RESYNC, SUMMARY, EventBus, event_bus
+
+
+def test_since_returns_missed_events_or_asks_for_resync():
+    bus = EventBus(buffer_size=3)
+    assert bus.since(0) == []
+    for i in range(5):
+        bus.publish(EMAIL, f"t{i}", f"e{i}", "stored")
+
+    assert [event["seq"] for event in bus.since(3)] == [4, 5]
+    assert bus.since(5) == []
+    # Events 2 and 3 are no longer buffered
+    assert bus.since(1) is None
+    # A client from before a restart numbers past the current sequence
+    assert bus.since(9) is None
+
+
+def test_processing_and_replies_publish_change_events(client, fake_summaries):
+    since = event_bus.last_seq
+    email_id = client.post("/api/v1/email/submit", json={
+        "subject": "Pricing", "body": "What does the team plan cost?", "sender": "ann@example.com"
+    }).json()["email_id"]
+    with patch("backend.ai.reply_generator.ReplyGenerator.generate",
+               return_value={"status": "success", "reply": "Hi Ann, it is $10 a seat."}):
+        assert client.post(f"/api/v1/email/{email_id}/generate-reply", json={"tone": "friendly"}).status_code == 200
+
+    response = client.get("/api/v1/events/", params={"since": since}).json()
+    events = [(e["type"], e["email_id"], e["status"]) for e in response["events"]]
+    assert events == [(EMAIL, email_id, "stored"), (SUMMARY, email_id, "ready"), (REPLY, email_id, "generated")]
+    assert len({e["thread_id"] for e in response["events"]}) == 1
+    assert response["seq"] == event_bus.last_seq and response["resync"] is False
+    assert client.get("/api/v1/events/").json() == {"seq": event_bus.last_seq, "resync": True, "events": []}
+
+
+def test_websocket_pushes_backlog_then_live_events(client):
+    since = event_bus.last_seq
+    missed = event_bus.publish(EMAIL, "t1", "e1", "stored")
+
+    with client.websocket_connect(f"/ws/events?since={since}") as websocket:
+        assert websocket.receive_json() == missed
+        assert websocket.receive_json() == {"type": "ping", "seq": missed["seq"]}
+        live = event_bus.publish(REPLY, "t1", "e1", "sent")
+        assert websocket.receive_json() == live
+
+    with client.websocket_connect(f"/ws/events?since={event_bus.last_seq + 10}") as websocket:
+        assert websocket.receive_json() == {"type": RESYNC, "seq": event_bus.last_seq}
@@ -0,0 +1,214 @@
+import imaplib
+import re
+import socketserver
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+import openai
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend.ai.email_processor import EmailProcessor
+from backend.db.models import Email, MailboxSyncState, PendingSummary
+from backend.mail.imap_sync import MailboxSync, process_message, uid_set
+
+
+class FakeMailbox:
+    def __init__(self, uidvalidity=7, condstore=True):
+        self.uidvalidity = uidvalidity
+        self.condstore = condstore
+        self.messages = {}  # uid -> raw bytes
+        self.modseq = 1
+        self.next_uid = 1
+        self.commands = []
+
+    def deliver(self, subject, message_id=None):
+        uid = self.next_uid
+        self.next_uid += 1
+        self.modseq += 1
+        self.messages[uid] = (
+            f"From: ann@example.com\r\nTo: bob@example.com\r\nSubject: {subject}\r\n"
+            f"Message-ID: <{message_id or uid}@example.com>\r\n\r\nBody of {subject}.\r\n"
+        ).encode()
+        return uid
+
+
+def _parse_set(value, highest):
+    uids = set()
+    for part in value.split(","):
+        lo, _, hi = part.partition(":")
+        lo = highest if lo == "*" else int(lo)
+        hi = lo if not hi else (highest if hi == "*" else int(hi))
+        uids.update(range(min(lo, hi), max(lo, hi) + 1))
+    return uids
+
+
+class IMAPHandler(socketserver.StreamRequestHandler):
+    """Just enough IMAP4rev1 for imaplib: LOGIN, ENABLE, EXAMINE, UID SEARCH/FETCH, LOGOUT."""
+
+    def handle(self):
+        box = self.server.mailbox
+        self.wfile.write(b"* OK fake IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            tag, command, *rest = line.split(" ", 2)
+            args = rest[0] if rest else ""
+            command = command.upper()
+            if command == "UID":
+                sub, _, args = args.partition(" ")
+                command = f"UID {sub.upper()}"
+            box.commands.append(command)
+            out = []
+            if command == "CAPABILITY":
+                caps = "IMAP4rev1 ENABLE CONDSTORE" if box.condstore else "IMAP4rev1"
+                out.append(f"* CAPABILITY {caps}")
+            elif command == "ENABLE":
+                out.append("* ENABLED CONDSTORE")
+            elif command in ("SELECT", "EXAMINE"):
+                out += [
+                    f"* {len(box.messages)} EXISTS",
+                    f"* OK [UIDVALIDITY {box.uidvalidity}] UIDs valid",
+                    f"* OK [UIDNEXT {box.next_uid}] Predicted next UID",
+                ]
+                if box.condstore:
+                    out.append(f"* OK [HIGHESTMODSEQ {box.modseq}] Highest")
+                out.append(f"{tag} OK [READ-ONLY] done")
+            elif command == "UID SEARCH":
+                wanted = _parse_set(args.split()[-1], max(box.messages, default=0))
+                out.append("* SEARCH " + " ".join(str(u) for u in sorted(wanted & set(box.messages))))
+            elif command == "UID FETCH":
+                wanted = _parse_set(args.split(" ", 1)[0], max(box.messages, default=0))
+                for seq, uid in enumerate(sorted(box.messages), start=1):
+                    if uid in wanted:
+                        raw = box.messages[uid]
+                        self.wfile.write(f"* {seq} FETCH (UID {uid} BODY[] {{{len(raw)}}}\r\n".encode() + raw + b")\r\n")
+            elif command == "LOGOUT":
+                self.wfile.write(f"* BYE\r\n{tag} OK bye\r\n".encode())
+                return
+            if not out or not out[-1].startswith(tag):
+                out.append(f"{tag} OK done")
+            self.wfile.write(("\r\n".join(out) + "\r\n").encode())
+
+
+@pytest.fixture
+def imap_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), IMAPHandler)
+    server.daemon_threads = True
+    server.mailbox = FakeMailbox()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _sync(server, db_session, handler, monkeypatch, **overrides):
+    from backend.mail import imap_sync
+    for name, value in {"IMAP_FETCH_BATCH": 2, "IMAP_QUEUE_SIZE": 1, "IMAP_WORKERS": 2, **overrides}.items():
+        monkeypatch.setattr(imap_sync.settings, name, value)
+
+    def connect():
+        imap = imaplib.IMAP4(*server.server_address)
+        imap.login("bob", "secret")
+        return imap
+
+    return MailboxSync(lambda: db_session, handler=handler, connect=connect, folder="INBOX")
+
+
+def test_uid_set():
+    assert uid_set([1, 2, 3, 5, 7, 8]) == "1:3,5,7:8"
+
+
+def test_incremental_sync(imap_server, db_session, monkeypatch):
+    box = imap_server.mailbox
+    for i in range(5):
+        box.deliver(f"Message {i}")
+    received = []
+    sync = _sync(imap_server, db_session, lambda data: received.append(data["subject"]), monkeypatch)
+
+    assert sync.sync_once() == 5
+    assert sorted(received) == [f"Message {i}" for i in range(5)]
+    # Batches of two: three FETCH round trips
+    assert box.commands.count("UID FETCH") == 3
+    state = db_session.query(MailboxSyncState).one()
+    assert state.last_uid == 5 and state.uidvalidity == 7
+
+    # Nothing new: no SEARCH and no FETCH
+    box.commands.clear()
+    assert sync.sync_once() == 0
+    assert "UID SEARCH" not in box.commands and "UID FETCH" not in box.commands
+
+    # Only the new message is fetched
+    box.deliver("Late arrival")
+    box.commands.clear()
+    assert sync.sync_once() == 1
+    assert received[-1] == "Late arrival"
+    assert box.commands.count("UID FETCH") == 1
+
+
+def test_uidvalidity_change_resyncs(imap_server, db_session, monkeypatch):
+    box = imap_server.mailbox
+    box.deliver("One")
+    received = []
+    sync = _sync(imap_server, db_session, lambda data: received.append(data["message_id"]), monkeypatch)
+    sync.sync_once()
+
+    box.uidvalidity = 8
+    assert sync.sync_once() == 1
+    assert db_session.query(MailboxSyncState).one().uidvalidity == 8
+
+
+def test_slow_consumers_apply_backpressure(imap_server, db_session, monkeypatch):
+    box = imap_server.mailbox
+    for i in range(6):
+        box.deliver(f"Message {i}")
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(_):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+
+    sync = _sync(imap_server, db_session, slow, monkeypatch, IMAP_WORKERS=2, IMAP_QUEUE_SIZE=1)
+    assert sync.sync_once() == 6
+    assert peak[0] <= 2
+
+
+def test_failing_message_does_not_stall(imap_server, db_session, monkeypatch):
+    box = imap_server.mailbox
+    box.deliver("Good")
+    box.deliver("Bad")
+
+    def handler(data):
+        if data["subject"] == "Bad":
+            raise RuntimeError("boom")
+
+    sync = _sync(imap_server, db_session, handler, monkeypatch)
+    assert sync.sync_once() == 2
+    assert db_session.query(MailboxSyncState).one().last_uid == 2
+
+
+def test_sync_stores_mail_and_queues_summaries_during_llm_outage(imap_server, db_session, monkeypatch):
+    box = imap_server.mailbox
+    box.deliver("Order 1")
+    box.deliver("Order 2")
+    outage = openai.APIConnectionError(request=httpx.Request("POST", "http://llm/v1/chat/completions"))
+    # The consumer gets its own sessions, as in production
+    Session = sessionmaker(bind=db_session.get_bind())
+    handler = lambda data: process_message(data, session_factory=Session)
+    sync = _sync(imap_server, db_session, handler, monkeypatch, IMAP_WORKERS=1)
+
+    with patch.object(EmailProcessor, "_generate_summary", side_effect=outage):
+        assert sync.sync_once() == 2
+
+    assert sorted(e.subject for e in db_session.query(Email)) == ["Order 1", "Order 2"]
+    assert db_session.query(PendingSummary).filter_by(status="pending").count() == 2
+    assert db_session.query(MailboxSyncState).one().last_uid == 2
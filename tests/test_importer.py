@@ -0,0 +1,126 @@
+import base64
+import os
+
+from backend.db.models import Attachment, Email, ImportCheckpoint
+from backend.mail.importer import MailImporter, detect_format, iter_mbox, parse_message
+
+
+def _message(n, subject, sender="ann@example.com", to="bob@example.com", extra="", body=None):
+    return (
+        f"From {sender} Mon Jan  5 10:0{n}:00 2026\n"
+        f"From: {sender}\nTo: {to}\nSubject: {subject}\n"
+        f"Date: Mon, 05 Jan 2026 10:0{n}:00 +0000\nMessage-ID: <m{n}@example.com>\n{extra}"
+        f"\n{body or f'Message {n}.'}\n\n"
+    )
+
+
+MBOX = (
+    _message(1, "Invoice 42", body="Please pay.\n>From the accounts team.")
+    + _message(2, "Re: Invoice 42", sender="bob@example.com", to="ann@example.com",
+               extra="In-Reply-To: <m1@example.com>\nReferences: <m1@example.com>\n")
+    + _message(3, "You have won", body="Send bitcoin now.")
+    + _message(4, "RE: Invoice 42", sender="ann@example.com")
+    + _message(5, "Lunch?", sender="carol@example.com")
+)
+
+
+def _write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content)
+    return str(path)
+
+
+def test_mbox_stream_and_parse(tmp_path):
+    path = _write(tmp_path, "inbox.mbox", MBOX)
+    messages = list(iter_mbox(path))
+    assert len(messages) == 5
+    assert messages[-1][0] == os.path.getsize(path)
+
+    first = parse_message(messages[0][1])
+    assert first["body"] == "Please pay.\nFrom the accounts team."
+    assert first["message_id"] == "<m1@example.com>"
+    assert first["received_at"].year == 2026
+
+    # Resuming at a saved offset yields the remaining messages only
+    assert [parse_message(raw)["subject"] for _, raw in iter_mbox(path, messages[2][0])] == ["RE: Invoice 42", "Lunch?"]
+
+
+def test_import_threads_and_filters(tmp_path, db_session):
+    path = _write(tmp_path, "inbox.mbox", MBOX)
+    report = MailImporter(lambda: db_session, batch_size=2).run(path)
+
+    assert report["read"] == 5 and report["imported"] == 4 and report["unsafe"] == 1
+    assert report["threads"] == 2
+    emails = {e.message_id: e for e in db_session.query(Email).all()}
+    # Header match, then a subject-only reply within the same batch
+    assert emails["<m2@example.com>"].thread_id == emails["<m1@example.com>"].thread_id
+    assert emails["<m4@example.com>"].thread_id == emails["<m1@example.com>"].thread_id
+    assert emails["<m5@example.com>"].thread_id != emails["<m1@example.com>"].thread_id
+    assert db_session.get(ImportCheckpoint, f"mbox:{path}").completed
+
+
+def test_import_resumes_from_checkpoint(tmp_path, db_session):
+    path = _write(tmp_path, "inbox.mbox", MBOX)
+    first = MailImporter(lambda: db_session, batch_size=1).run(path, limit=2)
+    assert first["imported"] == 2
+    checkpoint = db_session.get(ImportCheckpoint, f"mbox:{path}")
+    assert not checkpoint.completed
+
+    second = MailImporter(lambda: db_session, batch_size=1).run(path)
+    assert second["read"] == 3 and second["imported"] == 2
+    assert db_session.query(Email).count() == 4
+    # The reply in the second run still joins the thread started in the first
+    assert len({e.thread_id for e in db_session.query(Email).filter(Email.subject.like("%Invoice%"))}) == 1
+
+    # A forced re-import does not duplicate stored messages
+    again = MailImporter(lambda: db_session).run(path, restart=True)
+    assert again["duplicate"] == 4 and db_session.query(Email).count() == 4
+
+
+def test_maildir_and_eml_directories(tmp_path, db_session):
+    maildir = tmp_path / "Maildir"
+    for sub in ("cur", "new", "tmp"):
+        (maildir / sub).mkdir(parents=True)
+    (maildir / "cur" / "1:2,S").write_text(_message(1, "Invoice 42").split("\n", 1)[1])
+    (maildir / "new" / "2").write_text(_message(5, "Lunch?").split("\n", 1)[1])
+    eml_dir = tmp_path / "export"
+    eml_dir.mkdir()
+    (eml_dir / "a.eml").write_text(_message(6, "Other").split("\n", 1)[1])
+
+    assert detect_format(str(maildir)) == "maildir"
+    assert detect_format(str(eml_dir)) == "eml"
+    assert MailImporter(lambda: db_session).run(str(maildir))["imported"] == 2
+    assert MailImporter(lambda: db_session).run(str(eml_dir))["imported"] == 1
+
+
+def _with_attachment(n, subject, body, message_id=None):
+    pdf = base64.encodebytes(b"%PDF-1.4 " + os.urandom(2000)).decode()
+    return (
+        f"From: ann@example.com\nTo: bob@example.com\nSubject: {subject}\n"
+        f"Message-ID: <{message_id or f'a{n}'}@example.com>\nMIME-Version: 1.0\n"
+        'Content-Type: multipart/mixed; boundary="b"\n\n'
+        f"--b\nContent-Type: text/plain\n\n{body}\n"
+        '--b\nContent-Type: application/pdf\nContent-Transfer-Encoding: base64\n'
+        f'Content-Disposition: attachment; filename="{n}.pdf"\n\n{pdf}--b--\n'
+    )
+
+
+def test_skipped_messages_leave_no_attachment_blobs(tmp_path, db_session, monkeypatch):
+    from backend.mail import mime
+    blobs = tmp_path / "attachments"
+    monkeypatch.setattr(mime.settings, "ATTACHMENT_DIR", str(blobs))
+    export = tmp_path / "export"
+    export.mkdir()
+    (export / "1.eml").write_text(_with_attachment(1, "Invoice", "Please pay."))
+    (export / "2.eml").write_text(_with_attachment(2, "You have won", "Send bitcoin now."))
+    (export / "3.eml").write_text(_with_attachment(3, "Invoice", "Please pay.", message_id="a1"))
+
+    batches = []
+    importer = MailImporter(lambda: db_session, batch_size=2)
+    report = importer.run(str(export), on_batch=batches.append)
+
+    assert (report["imported"], report["unsafe"], report["duplicate"]) == (1, 1, 1)
+    stored = [name for _, _, names in os.walk(blobs) for name in names]
+    assert len(stored) == 1 and db_session.query(Attachment).one().sha256 in stored[0]
+    # Touched threads are handed over per batch rather than kept for the whole import
+    assert [len(ids) for ids in batches] == [1, 0] and not importer.touched_threads
@@ -0,0 +1,68 @@
+import uuid
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from backend.ai.llm import ModelRouter, UsageTracker, estimate_cost, TASK_PARSE, TASK_REPLY, TASK_SUMMARY
+from backend.core.metrics import metrics
+
+
+def _routing_settings(mock_settings):
+    mock_settings.PARSE_MODEL = "gpt-4o-mini"
+    mock_settings.SUMMARY_MODEL = "gpt-4o-mini"
+    mock_settings.REPLY_MODEL = "gpt-4o-mini"
+    mock_settings.ESCALATION_MODEL = "gpt-4o"
+    mock_settings.ESCALATE_URGENCY_LEVELS = ["high", "critical"]
+    mock_settings.ESCALATE_THREAD_LENGTH = 15
+    mock_settings.ESCALATE_ON_VALIDATION_FAILURE = True
+
+
+def test_router_escalation_rules():
+    router = ModelRouter()
+    with patch("backend.ai.llm.settings") as mock_settings:
+        _routing_settings(mock_settings)
+        assert router.select(TASK_PARSE) == "gpt-4o-mini"
+        assert router.select(TASK_REPLY, urgency="low", thread_length=3) == "gpt-4o-mini"
+        assert router.select(TASK_REPLY, urgency="Critical") == "gpt-4o"
+        assert router.select(TASK_REPLY, thread_length=20) == "gpt-4o"
+        assert router.select(TASK_REPLY, failed_validation=True) == "gpt-4o"
+
+        mock_settings.ESCALATE_THREAD_LENGTH = 0
+        assert router.select(TASK_REPLY, thread_length=200) == "gpt-4o-mini"
+
+
+def test_usage_tracker_records_latency_and_cost():
+    metrics.reset()
+    tracker = UsageTracker(TASK_REPLY, "gpt-4o")
+    run_id = uuid.uuid4()
+    message = AIMessage(content="hi", usage_metadata={"input_tokens": 1000, "output_tokens": 100, "total_tokens": 1100})
+
+    tracker.on_chat_model_start({}, [], run_id=run_id)
+    tracker.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["llm_input_tokens{model=gpt-4o,task=reply}"] == 1000
+    assert snapshot["timings"]["llm_latency_seconds{model=gpt-4o,task=reply}"]["count"] == 1
+    assert snapshot["timings"]["llm_cost_usd{model=gpt-4o,task=reply}"]["sum"] == estimate_cost("gpt-4o", 1000, 100)
+    assert estimate_cost("unknown-model", 1000, 100) == 0.0
+
+
+def test_usage_tracker_records_cached_prompt_tokens():
+    metrics.reset()
+    tracker = UsageTracker(TASK_SUMMARY, "gpt-4o")
+    run_id = uuid.uuid4()
+    message = AIMessage(content="hi", usage_metadata={
+        "input_tokens": 1000, "output_tokens": 100, "total_tokens": 1100,
+        "input_token_details": {"cache_read": 768},
+    })
+
+    tracker.on_chat_model_start({}, [], run_id=run_id)
+    tracker.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["llm_cached_input_tokens{model=gpt-4o,task=summary}"] == 768
+    assert snapshot["counters"]["llm_uncached_input_tokens{model=gpt-4o,task=summary}"] == 232
+    assert snapshot["timings"]["llm_prompt_cache_hit_ratio{model=gpt-4o,task=summary}"]["sum"] == 0.768
+    # Cached prompt tokens are billed at the cached rate
+    assert estimate_cost("gpt-4o", 1000, 100, 768) < estimate_cost("gpt-4o", 1000, 100)
@@ -0,0 +1,107 @@
+import base64
+import os
+from unittest.mock import patch
+
+import pytest
+
+from backend.db.models import Attachment
+from backend.mail.mime import AttachmentStore, MimeSizeError, MimeStreamParser, parse_bytes
+
+PDF = b"%PDF-1.4 " + os.urandom(3000)
+
+
+def _multipart(body="Please see the attached invoice.", pdf=PDF):
+    encoded = base64.encodebytes(pdf).decode()
+    return (
+        "From: Ann <ann@example.com>\r\nTo: bob@example.com\r\nSubject: Invoice\r\n"
+        "Message-ID: <inv1@example.com>\r\nMIME-Version: 1.0\r\n"
+        'Content-Type: multipart/mixed; boundary="outer"\r\n\r\n'
+        "preamble\r\n--outer\r\n"
+        'Content-Type: multipart/alternative; boundary="inner"\r\n\r\n'
+        "--inner\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n"
+        f"{body}\r\nTotal: 100=E2=82=AC, due Friday.=\r\n\r\n"
+        "--inner\r\nContent-Type: text/html\r\n\r\n<p>HTML version</p>\r\n--inner--\r\n"
+        "--outer\r\nContent-Type: application/pdf\r\nContent-Transfer-Encoding: base64\r\n"
+        'Content-Disposition: attachment; filename="invoice.pdf"\r\n\r\n'
+        f"{encoded}\r\n--outer--\r\nepilogue\r\n"
+    ).encode()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    from backend.mail import mime
+    monkeypatch.setattr(mime.settings, "ATTACHMENT_DIR", str(tmp_path / "attachments"))
+    return AttachmentStore(str(tmp_path / "attachments"))
+
+
+def test_text_and_attachments_are_separated(store):
+    parsed = parse_bytes(_multipart(), store)
+
+    assert parsed.text == "Please see the attached invoice.\r\nTotal: 100€, due Friday."
+    assert parsed.header("Subject") == "Invoice"
+    assert parsed.threading_headers()["message_id"] == "<inv1@example.com>"
+    [attachment] = parsed.attachments
+    assert attachment["filename"] == "invoice.pdf" and attachment["status"] == "stored"
+    assert attachment["size"] == len(PDF)
+    with open(store.path(attachment["sha256"]), "rb") as f:
+        assert f.read() == PDF
+    # Neither the payload nor its base64 reaches the prompt
+    assert "invoice.pdf" in parsed.prompt_text()
+    assert base64.encodebytes(PDF).decode()[:40] not in parsed.prompt_text()
+
+
+def test_identical_attachments_are_stored_once(store):
+    first = parse_bytes(_multipart(), store).attachments[0]
+    second = parse_bytes(_multipart(body="Resending."), store).attachments[0]
+    assert first["sha256"] == second["sha256"]
+    files = [name for _, _, names in os.walk(store.root) for name in names]
+    assert files == [first["sha256"]]
+
+
+def test_limits_are_enforced_while_streaming(store, monkeypatch):
+    from backend.mail import mime
+    monkeypatch.setattr(mime.settings, "MIME_MAX_PART_BYTES", 1000)
+    monkeypatch.setattr(mime.settings, "MIME_MAX_TEXT_BYTES", 10)
+    parsed = parse_bytes(_multipart(), store)
+    assert parsed.attachments[0]["status"] == "too_large" and parsed.attachments[0]["sha256"] is None
+    assert parsed.text == "Please see" and parsed.truncated
+    assert not os.path.exists(os.path.join(store.root, "tmp")) or not os.listdir(os.path.join(store.root, "tmp"))
+
+    monkeypatch.setattr(mime.settings, "MIME_MAX_TOTAL_BYTES", 2000)
+    parser = MimeStreamParser(store)
+    raw = _multipart()
+    with pytest.raises(MimeSizeError):
+        for i in range(0, len(raw), 512):
+            parser.feed(raw[i:i + 512])
+    # Rejected after ~2000 bytes, not after buffering the whole message
+    assert parser._size <= 2000 + 512
+
+
+def test_webhook_keeps_attachments_out_of_the_prompt(client, db_session, store):
+    raw = _multipart().decode()
+    with patch("backend.ai.email_processor.EmailProcessor.summarize_email") as summarize, \
+         patch("backend.ai.llm.GovernedChatOpenAI._generate", side_effect=RuntimeError("offline")):
+        summarize.side_effect = lambda email: type("S", (), {"email_id": email.id, "summary_json": {}})()
+        response = client.post("/api/v1/email/webhook", json={"raw_content": raw})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["parsed_data"]["sender"] == "Ann <ann@example.com>"
+    assert data["parsed_data"]["body_preview"].startswith("Please see the attached invoice.")
+    assert data["attachments"] == [
+        {"filename": "invoice.pdf", "content_type": "application/pdf", "size": len(PDF), "status": "stored"}
+    ]
+    assert db_session.query(Attachment).one().email_id == data["email_id"]
+    with open(store.path(db_session.query(Attachment).one().sha256), "rb") as f:
+        assert f.read() == PDF
+
+
+def test_rejected_webhook_leaves_no_attachment_blobs(client, store):
+    raw = _multipart(body="Urgent: send bitcoin to release the invoice.").decode()
+    response = client.post("/api/v1/email/webhook", json={"raw_content": raw})
+    assert response.status_code == 400
+
+    response = client.post("/api/v1/email/webhook/raw", content=_multipart(body="send bitcoin now"),
+                           headers={"content-type": "message/rfc822"})
+    assert response.status_code == 400
+    assert [name for _, _, names in os.walk(store.root) for name in names] == []
@@ -0,0 +1,163 @@
+import email
+import socket
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from backend.db.models import Email, EmailSummary, GeneratedReply, OutboxMessage, Thread
+from backend.mail.outbound import OutboxWorker, ReplyAlreadySent, SMTPConnectionPool, enqueue_reply
+
+
+class Recorder:
+    def __init__(self, reject=0):
+        self.messages = []
+        self.sessions = set()
+        self.reject = reject
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            self.reject -= 1
+            return "451 Try again later"
+        self.sessions.add(id(session))
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Recorder()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, "127.0.0.1", port
+    controller.stop()
+
+
+@pytest.fixture
+def smtp_settings(monkeypatch):
+    from backend.mail import outbound
+    monkeypatch.setattr(outbound.settings, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(outbound.settings, "SMTP_USERNAME", "")
+    monkeypatch.setattr(outbound.settings, "SMTP_FROM_ADDRESS", "assistant@example.com")
+    monkeypatch.setattr(outbound.settings, "OUTBOX_RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(outbound.settings, "OUTBOX_MAX_ATTEMPTS", 3)
+
+
+def _seed_thread(db):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    db.add(Thread(id="t1"))
+    for i in range(3):
+        db.add(Email(
+            id=f"e{i}", thread_id="t1", sender="Ann <ann@example.com>", subject="Re: Invoice",
+            body="b", message_id=f"<m{i}@example.com>", received_at=start + timedelta(minutes=i),
+        ))
+    db.add(EmailSummary(email_id="e2", summary_json={"thread_info": {"thread_id": "t1"}}))
+    db.commit()
+
+
+def test_enqueue_builds_threading_headers(db_session, smtp_settings):
+    _seed_thread(db_session)
+    reply = GeneratedReply(email_id="e2", reply_text="Thanks, paid.", tone="professional")
+    db_session.add(reply)
+    outbox = enqueue_reply(db_session, reply)
+    db_session.commit()
+
+    assert reply.delivery_status == "queued"
+    assert outbox.to_address == "ann@example.com"
+    assert outbox.subject == "Re: Invoice"
+    assert outbox.in_reply_to == "<m2@example.com>"
+    assert outbox.references == "<m0@example.com> <m1@example.com> <m2@example.com>"
+
+
+def test_worker_reuses_connections_and_updates_status(db_session, smtp_server, smtp_settings):
+    handler, host, port = smtp_server
+    _seed_thread(db_session)
+    for i in range(3):
+        reply = GeneratedReply(email_id=f"e{i}", reply_text=f"reply {i}", tone="professional")
+        db_session.add(reply)
+        enqueue_reply(db_session, reply)
+    db_session.commit()
+
+    pool = SMTPConnectionPool(host, port, size=2)
+    worker = OutboxWorker(lambda: db_session, pool=pool)
+    assert worker.run_once() == 3
+    assert worker.run_once() == 0
+    pool.close()
+
+    assert len(handler.messages) == 3
+    assert pool.connections_opened <= 2
+    sent = {m["In-Reply-To"]: m for m in handler.messages}
+    assert sent["<m1@example.com>"]["References"] == "<m0@example.com> <m1@example.com>"
+    assert all(r.delivery_status == "sent" and r.sent_at for r in db_session.query(GeneratedReply).all())
+
+
+def test_transient_failure_is_retried(db_session, smtp_server, smtp_settings):
+    handler, host, port = smtp_server
+    handler.reject = 1
+    _seed_thread(db_session)
+    reply = GeneratedReply(email_id="e2", reply_text="r", tone="professional")
+    db_session.add(reply)
+    enqueue_reply(db_session, reply)
+    db_session.commit()
+
+    pool = SMTPConnectionPool(host, port, size=1)
+    worker = OutboxWorker(lambda: db_session, pool=pool)
+    worker.run_once()
+    item = db_session.query(OutboxMessage).one()
+    assert item.status == "queued" and item.attempts == 1 and "451" in item.last_error
+
+    worker.run_once()
+    pool.close()
+    item = db_session.query(OutboxMessage).one()
+    assert item.status == "sent" and item.attempts == 2
+    assert pool.connections_opened == 1
+    assert len(handler.messages) == 1
+
+
+def test_auto_send_queues_reply(client, db_session, smtp_settings):
+    _seed_thread(db_session)
+    with patch("backend.ai.reply_generator.ReplyGenerator.generate") as mock_generate:
+        mock_generate.return_value = {"status": "success", "reply": "On it."}
+        response = client.post("/api/v1/email/e2/generate-reply", json={"auto_send": True})
+        # A client retry does not queue a second email to the customer
+        retry = client.post("/api/v1/email/e2/generate-reply", json={"auto_send": True})
+
+    assert response.status_code == retry.status_code == 200
+    assert response.json()["delivery_status"] == "queued"
+    assert db_session.query(OutboxMessage).one().in_reply_to == "<m2@example.com>"
+
+    db_session.query(OutboxMessage).update({"status": "sent"})
+    db_session.commit()
+    with patch("backend.ai.reply_generator.ReplyGenerator.generate") as mock_generate:
+        mock_generate.return_value = {"status": "success", "reply": "On it, again."}
+        response = client.post("/api/v1/email/e2/generate-reply", json={"auto_send": True})
+    assert response.status_code == 409
+    assert db_session.query(GeneratedReply).one().reply_text == "On it."
+
+
+def test_queuing_a_reply_twice_sends_it_once(db_session, smtp_server, smtp_settings):
+    handler, host, port = smtp_server
+    _seed_thread(db_session)
+    reply = GeneratedReply(email_id="e2", reply_text="First draft.", tone="professional")
+    db_session.add(reply)
+    enqueue_reply(db_session, reply)
+    db_session.commit()
+
+    # A retry or a regenerated reply rewrites the queued row instead of adding a second one
+    reply.reply_text = "Final answer."
+    enqueue_reply(db_session, reply)
+    db_session.commit()
+    assert db_session.query(OutboxMessage).count() == 1
+
+    pool = SMTPConnectionPool(host, port, size=1)
+    assert OutboxWorker(lambda: db_session, pool=pool).run_once() == 1
+    pool.close()
+    assert [m.get_payload(decode=True).decode() for m in handler.messages] == ["Final answer."]
+
+    # Delivered: queuing it again is refused
+    with pytest.raises(ReplyAlreadySent):
+        enqueue_reply(db_session, db_session.query(GeneratedReply).one())
@@ -0,0 +1,73 @@
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+import openai
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from backend.ai.llm import GovernedChatOpenAI
+from backend.ai.rate_limiter import TokenBucketLimiter, parse_reset_duration
+from backend.core.metrics import metrics
+
+
+def test_parse_reset_duration():
+    assert parse_reset_duration("20ms") == 0.02
+    assert parse_reset_duration("6m0s") == 360
+    assert parse_reset_duration("1.5") == 1.5
+    assert parse_reset_duration(None) is None
+
+
+def test_requests_bucket_delays_excess_calls():
+    limiter = TokenBucketLimiter("m", rpm=600, tpm=0, max_concurrency=0)
+    limiter._requests = 1
+    assert limiter.acquire(10) < 0.05
+    limiter.release(10)
+    # Bucket empty: the next call waits ~0.1s for one request to refill at 600/min
+    assert 0.05 < limiter.acquire(10) < 0.5
+
+
+def test_callers_are_served_in_arrival_order():
+    limiter = TokenBucketLimiter("m", rpm=0, tpm=0, max_concurrency=1)
+    order = []
+    limiter.acquire(1)
+
+    def worker(i):
+        limiter.acquire(1)
+        order.append(i)
+        limiter.release(1)
+
+    threads = []
+    for i in range(5):
+        t = threading.Thread(target=worker, args=(i,))
+        t.start()
+        threads.append(t)
+        while len(limiter._queue) < i + 1:
+            time.sleep(0.001)
+    limiter.release(1)
+    for t in threads:
+        t.join(5)
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_headers_adjust_local_buckets():
+    limiter = TokenBucketLimiter("m", rpm=500, tpm=10000, max_concurrency=0)
+    limiter.update_from_headers({"X-RateLimit-Remaining-Tokens": "0", "X-RateLimit-Reset-Tokens": "2s"})
+    assert limiter._tokens <= 1
+    assert limiter._wait_time(10) > 1.5
+
+
+def _rate_limit_error():
+    response = httpx.Response(429, headers={"retry-after": "0.01"}, request=httpx.Request("POST", "http://llm/v1"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_governed_model_retries_rate_limits():
+    metrics.reset()
+    ok = ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+    llm = GovernedChatOpenAI(model="limiter-test", api_key="test", max_retries=0)
+    with patch("langchain_openai.ChatOpenAI._generate", side_effect=[_rate_limit_error(), ok]) as mock_generate:
+        assert llm.invoke([HumanMessage(content="hi")]).content == "ok"
+    assert mock_generate.call_count == 2
+    assert metrics.snapshot()["counters"]["llm_retries{model=limiter-test,status=429}"] == 1
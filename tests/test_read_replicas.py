@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import database
+from backend.db.database import Base
+from backend.db.models import Thread
+from backend.db.routing import ReplicaRouter
+
+
+def _replica(tmp_path, name):
+    # A file-backed SQLite database stands in for a replica; its one thread identifies it
+    engine = create_engine(f"sqlite:///{tmp_path / name}.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Thread(id=f"from-{name}"))
+    db.commit()
+    db.close()
+    return engine
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    router = ReplicaRouter({"a": _replica(tmp_path, "a"), "b": _replica(tmp_path, "b")}, check_interval=3600)
+    monkeypatch.setattr(database, "read_router", router)
+    return router
+
+
+def _thread_ids(client):
+    return [t["id"] for t in client.get("/api/v1/threads/").json()]
+
+
+def test_reads_are_balanced_across_replicas(client, db_session, router):
+    db_session.add(Thread(id="from-primary"))
+    db_session.commit()
+    seen = {tuple(_thread_ids(client)) for _ in range(4)}
+    assert seen == {("from-a",), ("from-b",)}
+
+
+def test_unhealthy_replicas_fall_back_to_primary(client, db_session, router, tmp_path):
+    db_session.add(Thread(id="from-primary"))
+    db_session.commit()
+    router.replicas["b"] = create_engine(f"sqlite:///{tmp_path}/missing/b.db")
+    router.check()
+    assert router.healthy == ["a"]
+    assert {tuple(_thread_ids(client)) for _ in range(3)} == {("from-a",)}
+
+    # A replica failing mid-request is taken out of rotation straight away
+    router.replicas["a"] = create_engine(f"sqlite:///{tmp_path}/missing/a.db")
+    with pytest.raises(OperationalError):
+        client.get("/api/v1/threads/")
+    assert router.healthy == []
+    assert _thread_ids(client) == ["from-primary"]
+
+
+def test_read_your_writes_go_to_primary(client, db_session, router):
+    stub = lambda self, email: type("S", (), {"email_id": email.id, "summary_json": {"ok": True}})()
+    with patch("backend.ai.email_processor.EmailProcessor.summarize_email", stub):
+        response = client.post("/api/v1/email/submit", json={
+            "subject": "Hello", "body": "First message", "sender": "ann@example.com", "thread_id": "fresh-thread"
+        })
+    assert response.status_code == 200
+
+    # The replicas have never seen this thread, but the reads right after the write are served by the primary
+    thread = client.get("/api/v1/threads/fresh-thread")
+    assert thread.status_code == 200 and thread.json()["emails"][0]["subject"] == "Hello"
+    # Reads that don't name the new rows keep going to the replicas
+    assert tuple(_thread_ids(client)) in {("from-a",), ("from-b",)}
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.ai.resummarize import Resummarizer, current_stamp
+from backend.db.models import Email, EmailSummary, GeneratedReply, Thread
+
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+def _seed(db, summary_json):
+    prompt_version, model = current_stamp()
+    db.add_all([Thread(id="t1"), Thread(id="t2")])
+    stamps = {
+        "e1": ("summary-v1", "gpt-3.5-turbo"),
+        "e2": (None, None),  # written before summaries were stamped
+        "e3": (prompt_version, model),
+        "e4": ("summary-v1", "gpt-3.5-turbo"),
+    }
+    for i, (email_id, (version, stamp_model)) in enumerate(stamps.items()):
+        db.add(Email(id=email_id, thread_id="t1" if i < 3 else "t2", sender="a@example.com", subject="Pricing",
+                     body=f"Message {i}", received_at=START + timedelta(days=i)))
+        db.add(EmailSummary(email_id=email_id, summary_json={**summary_json, "email_id": email_id},
+                            prompt_version=version, model=stamp_model))
+    db.add(GeneratedReply(email_id="e4", reply_text="Thanks", tone="friendly"))
+    db.commit()
+
+
+def test_stale_summaries_are_rewritten_in_priority_order_and_resume(db_session, summary_json, fake_summaries):
+    _seed(db_session, summary_json)
+    fake_summaries.fields["context_summary"] = "rewritten"
+    resummarizer = Resummarizer(lambda: db_session, priority="unreplied", concurrency=1, batch_size=2)
+    assert resummarizer.count_stale() == 3
+
+    report = resummarizer.run(limit=1)
+    assert report["resummarized"] == 1 and report["remaining"] == 2
+    # The next run continues with what is still stale
+    report = Resummarizer(lambda: db_session, priority="unreplied", concurrency=1, batch_size=2).run()
+
+    assert report == {**report, "stale": 2, "resummarized": 2, "failed": 0, "remaining": 0}
+    # Unreplied emails first (newest first), the replied one last; each with the thread as it was then
+    assert fake_summaries.calls == [("e2", 2), ("e1", 1), ("e4", 1)]
+
+    db_session.expire_all()
+    summaries = {s.email_id: s for s in db_session.query(EmailSummary)}
+    assert {(s.prompt_version, s.model) for s in summaries.values()} == {current_stamp()}
+    assert summaries["e3"].version == 1 and summaries["e3"].updated_at is None
+    assert summaries["e1"].version == 2 and summaries["e1"].summary_json["context_summary"] == "rewritten"
+    assert Resummarizer(lambda: db_session).count_stale() == 0
+
+
+def test_concurrent_rewrite_is_not_overwritten(db_session, summary_json, fake_summaries):
+    _seed(db_session, summary_json)
+
+    def rewrite_elsewhere(email):
+        # Someone else rewrites the summary while the LLM call is in flight
+        db_session.query(EmailSummary).filter_by(email_id=email.id).update({"version": 5})
+        db_session.commit()
+
+    fake_summaries.before = rewrite_elsewhere
+    report = Resummarizer(lambda: db_session, priority="oldest", concurrency=1).run(limit=1)
+
+    assert report["skipped"] == 1 and report["resummarized"] == 0
+    assert db_session.query(EmailSummary).filter_by(email_id="e1").one().prompt_version == "summary-v1"
@@ -0,0 +1,49 @@
+import numpy as np
+
+from backend.core.safety import SafetyModel, SafetyScorer, get_scorer, normalize, train_model
+from backend.core.security import UNSAFE_KEYWORDS, check_safety
+from benchmarks import safety_corpus
+
+
+def test_obfuscation_is_undone_before_matching():
+    assert normalize("S3nd B1tc0in") == "send bitcoin"
+    assert normalize("Ѕеnd bіtсоіn") == "send bitcoin"  # Cyrillic lookalikes
+    assert normalize("sen​d bit­coin") == "send bitcoin"
+    assert normalize("s e n d  b-i-t-c-o-i-n") == "send bitcoin"
+    assert normalize("Ｗｉｒｅ ｔｒａｎｓｆｅｒ $500 in 24 hours") == "wire transfer 500 in 24 hours"
+
+    assert check_safety("Please s3nd b1tc0in to this wallet") == (False, "Content contains unsafe keyword 'send bitcoin'")
+    assert check_safety("please se​nd bitcoin")[0] is False
+
+
+def test_ordinary_words_inside_or_alongside_keywords_do_not_block():
+    rules_only = SafetyScorer(UNSAFE_KEYWORDS, None, 0.9)
+    for text in ["cp the file to the shared drive", "Quote for die casting parts",
+                 "Please act now to keep your booking", "Skipping the scamper scheduling call"]:
+        assert rules_only.check(text) == (True, "")
+    assert get_scorer().check("Can you cp the report to the backup folder before Friday?") == (True, "")
+
+
+def test_batch_scores_match_single_and_chunked_checks():
+    items = list(safety_corpus.generate(600, seed=3))
+    train = [item for item in items if item["split"] == "train"]
+    model = train_model([i["text"] for i in train], [i["label"] for i in train], n_features=2 ** 14)
+    scorer = SafetyScorer(UNSAFE_KEYWORDS, model, 0.5)
+
+    texts = [item["text"] for item in items if item["split"] == "eval"]
+    scores = scorer.score_batch(texts)
+    for text, score in zip(texts, scores):
+        assert scorer.check(text)[0] == (score < 0.5)
+        # Cut mid-word: pieces are re-aligned on whitespace, so the score is unchanged
+        pieces = [text[i:i + 7] for i in range(0, len(text), 7)]
+        assert scorer.check_chunks(pieces)[0] == (score < 0.5)
+    labels = np.array([item["label"] for item in items if item["split"] == "eval"])
+    substring = np.array([any(k in text.lower() for k in UNSAFE_KEYWORDS) for text in texts])
+    assert ((scores >= 0.5) == labels).mean() > (substring == labels).mean() + 0.1
+
+
+def test_model_round_trips_sparse(tmp_path):
+    model = SafetyModel(np.array([0.0, 1.5, 0.0, -2.25], dtype=np.float32), bias=-0.5)
+    model.save(tmp_path / "model.npz")
+    loaded = SafetyModel.load(tmp_path / "model.npz")
+    assert np.array_equal(loaded.weights, model.weights) and loaded.bias == -0.5
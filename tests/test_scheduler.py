@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from backend.ai.rate_limiter import TokenBucketLimiter
+from backend.ai.scheduler import (
+    LANE_BULK,
+    LANE_INTERACTIVE,
+    LANE_URGENT,
+    LaneQueue,
+    lane_for_urgency,
+)
+
+WEIGHTS = {LANE_INTERACTIVE: 8, LANE_URGENT: 4, LANE_BULK: 1}
+
+
+def _drain(queue, lanes):
+    order = []
+    while len(queue):
+        ticket = queue.head()
+        lane = lanes[ticket]
+        queue.remove(ticket, lane, dispatched=True)
+        order.append(lane)
+    return order
+
+
+def test_interactive_jumps_bulk_backlog():
+    queue = LaneQueue(WEIGHTS, max_wait=0)
+    for _ in range(50):
+        queue.push(object(), LANE_BULK)
+    for _ in range(10):
+        queue.remove(queue.head(), LANE_BULK, dispatched=True)
+
+    # The idle interactive lane enters at the current virtual time, ahead of the backlog
+    ticket = object()
+    queue.push(ticket, LANE_INTERACTIVE)
+    assert queue.head() is ticket
+
+
+def test_weighted_share_without_starvation():
+    queue = LaneQueue(WEIGHTS, max_wait=0)
+    lanes = {}
+    for lane in (LANE_INTERACTIVE, LANE_BULK):
+        for _ in range(40):
+            ticket = object()
+            lanes[ticket] = queue.push(ticket, lane)
+    first = _drain(queue, lanes)[:27]
+    # 8:1 weights: bulk still gets roughly one slot in nine
+    assert first.count(LANE_BULK) == 3
+    assert first.count(LANE_INTERACTIVE) == 24
+
+
+def test_zero_lane_weight_is_rejected():
+    with pytest.raises(ValueError, match="bulk"):
+        LaneQueue({**WEIGHTS, LANE_BULK: 0}, max_wait=0)
+
+
+def test_aging_serves_long_waiting_callers():
+    queue = LaneQueue(WEIGHTS, max_wait=0.05)
+    old = object()
+    queue.push(old, LANE_BULK)
+    for _ in range(5):
+        queue.push(object(), LANE_INTERACTIVE)
+    queue._pass[LANE_BULK] = 100.0
+    assert queue.head() is not old
+    time.sleep(0.06)
+    assert queue.head() is old
+
+
+def test_lane_for_urgency():
+    assert lane_for_urgency("Critical", LANE_BULK) == LANE_URGENT
+    assert lane_for_urgency("low", LANE_BULK) == LANE_BULK
+    assert lane_for_urgency("critical", LANE_INTERACTIVE) == LANE_INTERACTIVE
+
+
+def test_limiter_dispatches_interactive_before_queued_bulk():
+    limiter = TokenBucketLimiter("m", rpm=0, tpm=0, max_concurrency=1)
+    limiter.acquire(1, LANE_BULK)
+    order = []
+
+    def worker(lane):
+        limiter.acquire(1, lane)
+        order.append(lane)
+        limiter.release(1)
+
+    threads = [threading.Thread(target=worker, args=(LANE_BULK,)) for _ in range(3)]
+    threads.append(threading.Thread(target=worker, args=(LANE_INTERACTIVE,)))
+    for i, t in enumerate(threads):
+        t.start()
+        while len(limiter._queue) < i + 1:
+            time.sleep(0.001)
+    limiter.release(1)
+    for t in threads:
+        t.join(5)
+    assert order[0] == LANE_INTERACTIVE
+
+
+def test_limiter_finishes_when_aging_changes_the_head():
+    # 10 tokens/s: the interactive head waits ~1 s for its tokens while bulk callers age past max_wait
+    limiter = TokenBucketLimiter("m", rpm=0, tpm=600, max_concurrency=0)
+    limiter._queue = LaneQueue(WEIGHTS, max_wait=0.3)
+    limiter._tokens = 0
+    done = []
+
+    def worker(lane, tokens):
+        limiter.acquire(tokens, lane)
+        done.append(lane)
+        limiter.release(tokens)
+
+    threads = [threading.Thread(target=worker, args=args, daemon=True)
+               for args in ((LANE_BULK, 1), (LANE_BULK, 1), (LANE_INTERACTIVE, 10))]
+    for i, t in enumerate(threads):
+        t.start()
+        while len(limiter._queue) < i + 1:
+            time.sleep(0.001)
+    for t in threads:
+        t.join(5)
+    assert [t.is_alive() for t in threads] == [False, False, False]
+    # The aged bulk callers went ahead of the interactive one
+    assert done == [LANE_BULK, LANE_BULK, LANE_INTERACTIVE]
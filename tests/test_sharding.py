@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.ai.email_processor import EmailProcessor
+from backend.core.sharding import ShardedExecutor
+from backend.db.database import Base
+from backend.db.models import Email, EmailSummary, Thread
+
+
+def test_interleaved_bursts_keep_per_key_order_and_run_keys_in_parallel():
+    executor = ShardedExecutor(shards=8, rebalance_depth=4)
+    seen, running, overlaps = {}, set(), []
+    lock = threading.Lock()
+
+    def job(key, n):
+        with lock:
+            if key in running:
+                overlaps.append(key)
+            running.add(key)
+        time.sleep(0.001)
+        with lock:
+            running.discard(key)
+            seen.setdefault(key, []).append(n)
+
+    keys = [f"thread-{i}" for i in range(1000)]
+    rng = random.Random(3)
+    start = time.perf_counter()
+    futures = []
+    for n in range(3):
+        # Each burst reaches every thread once, in a different order
+        for key in rng.sample(keys, len(keys)):
+            futures.append(executor.submit(key, job, key, n))
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    executor.shutdown()
+
+    assert not overlaps
+    assert all(seen[key] == [0, 1, 2] for key in keys)
+    assert executor.depths() == [0] * 8
+    # 3,000 jobs of at least 1 ms each; one worker would need at least 3 s
+    assert elapsed < 3000 * 0.001 / 3
+
+
+def test_idle_keys_move_off_a_backed_up_shard():
+    executor = ShardedExecutor(shards=2, rebalance_depth=2)
+    keys = [f"thread-{i}" for i in range(40)]
+    hot = [key for key in keys if executor.shard_for(key) == 0]
+    release = threading.Event()
+    ran_on = {}
+
+    def job(key):
+        ran_on.setdefault(key, []).append(threading.current_thread().name)
+
+    executor.submit(hot[0], release.wait)
+    for _ in range(2):
+        executor.submit(hot[0], job, hot[0])
+    # Shard 0 is 3 deep and shard 1 idle: a new key homed on shard 0 is placed on shard 1
+    moved = executor.submit(hot[1], job, hot[1])
+    moved.result(timeout=5)
+    assert ran_on[hot[1]] == ["shard-1"]
+    # A key with pending work stays put, so its order holds
+    executor.submit(hot[0], job, hot[0])
+    release.set()
+    executor.shutdown()
+    assert ran_on[hot[0]] == ["shard-0"] * 3
+
+
+def test_emails_of_a_thread_are_stored_and_summarised_in_arrival_order(tmp_path, fake_summaries):
+    engine = create_engine(f"sqlite:///{tmp_path / 'shards.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    def process(email_data):
+        db = Session()
+        try:
+            return EmailProcessor(db).process_email_in_order(email_data).email_id
+        finally:
+            db.close()
+
+    executor = ShardedExecutor(shards=8)
+    threads = [f"thread-{i}" for i in range(100)]
+    with patch("backend.ai.email_processor.processing_shards", executor):
+        # Bursts of three back-to-back emails to threads that do not exist yet
+        futures = [executor.submit(thread_id, process, {
+            "thread_id": thread_id, "sender": "c@example.com", "subject": "Order", "body": f"{thread_id}/{n}",
+        }) for thread_id in threads for n in range(3)]
+        for future in futures:
+            future.result()
+    executor.shutdown()
+
+    db = Session()
+    assert db.query(Thread).count() == 100
+    assert db.query(Email).count() == db.query(EmailSummary).count() == 300
+    bodies = dict(db.query(Email.id, Email.body))
+    db.close()
+    engine.dispose()
+    # Each summary saw exactly the emails that arrived before it
+    context_sizes = {bodies[email_id]: email_count for email_id, email_count in fake_summaries.calls}
+    assert all(context_sizes[f"{thread_id}/{n}"] == n + 1 for thread_id in threads for n in range(3))
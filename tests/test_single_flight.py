@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+
+from backend.ai.single_flight import SingleFlight, cache_key
+from backend.core.config import settings
+from backend.core.metrics import metrics
+from backend.db.database import Base
+
+
+def test_cache_key_is_stable_and_order_insensitive_for_dicts():
+    assert cache_key("reply", {"a": 1, "b": 2}, "formal") == cache_key("reply", {"b": 2, "a": 1}, "formal")
+    assert cache_key("reply", {"a": 1}, "formal") != cache_key("reply", {"a": 1}, "casual")
+
+
+def test_concurrent_callers_share_one_call():
+    metrics.reset()
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return {"reply": "hello"}
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(flight.do, "reply:k", slow_call) for _ in range(5)]
+        while metrics.snapshot()["counters"].get("llm_coalesced_calls{scope=process,task=reply}", 0) < 4:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert all(r == {"reply": "hello"} for r in results)
+    assert flight.in_flight() == 0
+
+    # Once the call has finished, the next caller runs again
+    flight.do("reply:k", slow_call)
+    assert len(calls) == 2
+
+
+def test_errors_propagate_to_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing_call():
+        release.wait(5)
+        raise RuntimeError("provider down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(flight.do, "summary:k", failing_call)
+        while not flight.in_flight():
+            time.sleep(0.01)
+        second = pool.submit(flight.do, "summary:k", failing_call)
+        time.sleep(0.05)
+        release.set()
+        for future in (first, second):
+            with pytest.raises(RuntimeError):
+                future.result()
+
+
+@pytest.fixture
+def shared_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'flight.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr("backend.db.database.engine", engine)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ADVISORY_LOCK", True)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_POLL_INTERVAL", 0.01)
+    yield engine
+    engine.dispose()
+
+
+def test_processes_share_one_call_without_holding_a_connection(shared_engine):
+    metrics.reset()
+    # Two instances stand in for two processes sharing the database
+    leader, follower = SingleFlight(), SingleFlight()
+    calls, checked_out = [], []
+    started, release = threading.Event(), threading.Event()
+
+    def slow_call():
+        calls.append(1)
+        checked_out.append(shared_engine.pool.checkedout())
+        started.set()
+        release.wait(5)
+        return {"reply": "hello"}
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(leader.do, "reply:k", slow_call)
+        assert started.wait(5)
+        second = pool.submit(follower.do, "reply:k", slow_call)
+        time.sleep(0.1)
+        release.set()
+        results = [first.result(), second.result()]
+
+    assert len(calls) == 1
+    assert checked_out == [0]
+    assert results == [{"reply": "hello"}, {"reply": "hello"}]
+    assert metrics.snapshot()["counters"]["llm_coalesced_calls{scope=cluster,task=reply}"] == 1
+
+
+def test_failed_leader_releases_its_claim(shared_engine):
+    flight = SingleFlight()
+
+    def failing_call():
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("summary:k", failing_call)
+    # The next process runs the call itself instead of waiting for the claim to time out
+    assert SingleFlight().do("summary:k", lambda: {"summary": "ok"}) == {"summary": "ok"}
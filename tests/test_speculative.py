@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+from backend.ai.speculative import invalidate_thread_drafts, pre_generate_reply, should_pre_generate
+from backend.db.models import DraftReply, Email, EmailSummary, Thread
+
+SUMMARY_JSON = {
+    "thread_info": {"thread_id": "t1"},
+    "classification": {"intent": "inquiry"},
+    "sentiment": {"label": "neutral"},
+    "urgency": {"level": "high"},
+    "content_analysis": {"main_topic": "topic", "questions": [], "action_items": []},
+    "recommended_tone": "friendly",
+}
+
+
+def _seed(db):
+    db.add(Thread(id="t1"))
+    db.add(Email(id="e1", thread_id="t1", sender="a@example.com", subject="s", body="b"))
+    db.add(EmailSummary(email_id="e1", summary_json=SUMMARY_JSON))
+    db.commit()
+
+
+def test_policy(monkeypatch):
+    from backend.ai import speculative
+    monkeypatch.setattr(speculative.settings, "SPECULATIVE_REPLIES", True)
+    monkeypatch.setattr(speculative.settings, "SPECULATIVE_URGENCY_LEVELS", ["critical"])
+    monkeypatch.setattr(speculative.settings, "SPECULATIVE_INTENTS", [])
+    monkeypatch.setattr(speculative.settings, "SPECULATIVE_SENDERS", ["@vip.example.com"])
+
+    assert should_pre_generate({"urgency": {"level": "critical"}}, "x@example.com")
+    assert should_pre_generate({"urgency": {"level": "low"}}, "Boss <boss@vip.example.com>")
+    assert not should_pre_generate({"urgency": {"level": "low"}}, "x@example.com")
+
+    monkeypatch.setattr(speculative.settings, "SPECULATIVE_REPLIES", False)
+    assert not should_pre_generate({"urgency": {"level": "critical"}}, "x@example.com")
+
+
+def test_pre_generated_draft_is_served(client, db_session):
+    _seed(db_session)
+    with patch("backend.ai.reply_generator.ReplyGenerator.generate") as mock_generate:
+        mock_generate.return_value = {"status": "success", "reply": "Drafted ahead of time."}
+        pre_generate_reply("e1", session_factory=lambda: db_session)
+        assert mock_generate.call_args.kwargs["tone"] == "friendly"
+
+        # Different tone: generated live
+        mock_generate.return_value = {"status": "success", "reply": "Live reply."}
+        response = client.post("/api/v1/email/e1/generate-reply", json={"tone": "formal"})
+        assert response.json()["pre_generated"] is False
+
+        response = client.post("/api/v1/email/e1/generate-reply", json={"tone": "friendly"})
+        assert response.json()["reply"] == "Drafted ahead of time."
+        assert response.json()["pre_generated"] is True
+        assert mock_generate.call_count == 2
+
+
+def test_new_email_invalidates_pending_drafts(db_session):
+    _seed(db_session)
+    db_session.add(DraftReply(email_id="e1", thread_id="t1", tone="friendly", reply_text="r"))
+    db_session.commit()
+
+    invalidate_thread_drafts(db_session, "t1")
+    db_session.commit()
+    assert db_session.query(DraftReply).one().status == "invalidated"
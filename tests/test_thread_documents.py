@@ -0,0 +1,103 @@
+import gzip
+import json
+import threading
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.ai.email_processor import EmailProcessor
+from backend.core.thread_documents import render_thread
+from backend.db.database import Base
+from backend.db.models import EmailSummary, ThreadDocument
+
+
+def _store(db, subject="Pricing", body="How much?", thread_id=None):
+    email_data = {"sender": "a@example.com", "subject": subject, "body": body}
+    if thread_id:
+        email_data["thread_id"] = thread_id
+    return EmailProcessor(db).store_email(email_data)
+
+
+def test_document_is_written_with_the_email(client, db_session):
+    first = _store(db_session)
+    second = _store(db_session, subject="Re: Pricing", body="x" * 2000, thread_id=first.thread_id)
+
+    document = db_session.get(ThreadDocument, first.thread_id)
+    assert document.version == 2
+    assert document.body == render_thread(db_session, first.thread_id)
+
+    response = client.get(f"/api/v1/threads/{first.thread_id}", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["etag"] == document.etag
+    assert [e["id"] for e in response.json()["emails"]] == [first.id, second.id]
+
+    # Unchanged document: 304 without a body
+    response = client.get(f"/api/v1/threads/{first.thread_id}", headers={"If-None-Match": document.etag})
+    assert response.status_code == 304 and response.content == b""
+
+    # Large documents are stored pre-compressed and served as is
+    assert gzip.decompress(document.body_gzip) == document.body
+    response = client.get(f"/api/v1/threads/{first.thread_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == document.body
+
+
+def test_document_shows_generated_reply(client, db_session):
+    email = _store(db_session)
+    db_session.add(EmailSummary(email_id=email.id, summary_json={"thread_info": {"thread_id": email.thread_id}}))
+    db_session.commit()
+    etag = db_session.get(ThreadDocument, email.thread_id).etag
+
+    with patch("backend.ai.reply_generator.ReplyGenerator.generate") as mock_generate:
+        mock_generate.return_value = {"status": "success", "reply": "Here is our pricing."}
+        assert client.post(f"/api/v1/email/{email.id}/generate-reply", json={"tone": "professional"}).status_code == 200
+
+    response = client.get(f"/api/v1/threads/{email.thread_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["emails"][0]["reply"]["reply_text"] == "Here is our pricing."
+
+
+def test_thread_without_document_is_rendered(client, db_session):
+    email = _store(db_session)
+    db_session.query(ThreadDocument).delete()
+    db_session.commit()
+
+    response = client.get(f"/api/v1/threads/{email.thread_id}")
+    assert response.status_code == 200
+    assert response.json()["emails"][0]["id"] == email.id
+    assert client.get("/api/v1/threads/missing").status_code == 404
+
+
+def test_concurrent_writes_to_a_thread_all_reach_its_document(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'docs.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    start = threading.Barrier(4)
+    errors = []
+
+    def write(n):
+        db = Session()
+        try:
+            start.wait()
+            for i in range(5):
+                # None of them finds a document yet on the first round
+                _store(db, subject="Re: Pricing", body=f"{n}/{i}", thread_id="t1")
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    writers = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+
+    db = Session()
+    document = db.get(ThreadDocument, "t1")
+    assert not errors
+    assert len(json.loads(document.body)["emails"]) == 20
+    assert document.body == render_thread(db, "t1")
+    db.close()
+    engine.dispose()
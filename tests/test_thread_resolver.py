@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.core.thread_resolver import (
+    ThreadResolver,
+    extract_threading_headers,
+    normalize_subject,
+)
+from backend.db.models import Email, Thread
+
+
+def _add_email(db, email_id, thread_id, **fields):
+    if not db.get(Thread, thread_id):
+        db.add(Thread(id=thread_id))
+    fields.setdefault("sender", "alice@example.com")
+    fields.setdefault("subject", "Pricing")
+    fields.setdefault("body", "b")
+    fields["normalized_subject"] = normalize_subject(fields["subject"])
+    db.add(Email(id=email_id, thread_id=thread_id, **fields))
+    db.commit()
+
+
+def test_normalize_subject_strips_prefixes():
+    assert normalize_subject("RE: Fwd:  Re[2]: Pricing   Inquiry") == "pricing inquiry"
+    assert normalize_subject("AW: Pricing") == "pricing"
+    assert normalize_subject(None) == ""
+
+
+def test_extract_threading_headers():
+    raw = (
+        "From: Bob <bob@example.com>\n"
+        "To: Alice <alice@example.com>, carol@example.com\n"
+        "Subject: Re: Pricing\n"
+        "Message-ID: <m2@example.com>\n"
+        "In-Reply-To: <m1@example.com>\n"
+        "References: <m0@example.com>\n"
+        "  <m1@example.com>\n"
+        "\n"
+        "Sounds good."
+    )
+    headers = extract_threading_headers(raw)
+    assert headers["message_id"] == "<m2@example.com>"
+    assert headers["in_reply_to"] == "<m1@example.com>"
+    assert headers["references"] == "<m0@example.com> <m1@example.com>"
+    assert headers["recipients"] == "alice@example.com, carol@example.com"
+    assert extract_threading_headers("Hi there,\nplain pasted text") == {}
+
+
+def test_resolve_by_references(db_session):
+    _add_email(db_session, "e1", "t1", message_id="<m1@example.com>")
+    resolver = ThreadResolver(db_session)
+    thread_id = resolver.resolve({
+        "sender": "bob@example.com",
+        "subject": "Something else",
+        "references": "<m0@example.com> <m1@example.com>",
+    })
+    assert thread_id == "t1"
+
+
+def test_resolve_by_subject_requires_participant_overlap(db_session):
+    _add_email(db_session, "e1", "t1", recipients="bob@example.com")
+    resolver = ThreadResolver(db_session)
+
+    assert resolver.resolve({"sender": "Bob <bob@example.com>", "subject": "Re: pricing"}) == "t1"
+    assert resolver.resolve({"sender": "mallory@example.com", "subject": "Re: Pricing"}) is None
+    # Without a reply prefix or headers, equal subjects start a new thread
+    assert resolver.resolve({"sender": "bob@example.com", "subject": "Pricing"}) is None
+
+
+def test_resolve_by_subject_respects_window(db_session):
+    old = datetime.now(timezone.utc) - timedelta(days=90)
+    _add_email(db_session, "e1", "t1", received_at=old)
+    resolver = ThreadResolver(db_session, window_days=30)
+    assert resolver.resolve({"sender": "alice@example.com", "subject": "Re: Pricing"}) is None
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from backend.ai.thread_summarizer import ThreadSummarizer
+from backend.db.models import ChunkSummary, Email, Thread
+
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+        self.runnable = RunnableLambda(self._respond)
+
+    def _respond(self, prompt_value):
+        self.calls += 1
+        return AIMessage(content=f"summary {self.calls}")
+
+
+def _thread(db, count):
+    db.add(Thread(id="t1"))
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    emails = []
+    for i in range(count):
+        email = Email(id=f"e{i:04d}", thread_id="t1", sender="a@example.com", subject="s",
+                      body=f"message {i}", received_at=start + timedelta(minutes=i))
+        db.add(email)
+        emails.append(email)
+    db.commit()
+    return emails
+
+
+def test_short_thread_is_passed_through(db_session):
+    emails = _thread(db_session, 3)
+    llm = CountingLLM()
+    context = ThreadSummarizer(db_session, llm.runnable).build_context(emails)
+    assert "message 0" in context and "message 2" in context
+    assert llm.calls == 0
+
+
+def test_long_thread_summarises_new_chunks_only(db_session):
+    emails = _thread(db_session, 31)
+    llm = CountingLLM()
+    with patch("backend.ai.thread_summarizer.settings") as mock_settings:
+        mock_settings.SUMMARY_HIERARCHICAL_THRESHOLD = 5
+        mock_settings.SUMMARY_CHUNK_SIZE = 5
+        mock_settings.SUMMARY_MAP_CONCURRENCY = 2
+        summarizer = ThreadSummarizer(db_session, llm.runnable)
+
+        context = summarizer.build_context(emails[:21])
+        # 4 map calls for the full chunks; the newest email stays verbatim
+        assert llm.calls == 4
+        assert "message 20" in context and "message 3\n" not in context
+
+        # One more email completes no new chunk: nothing to re-summarise
+        summarizer.build_context(emails[:22])
+        assert llm.calls == 4
+
+        # Two more chunks: two map calls, then one reduce over the first 5 chunks
+        summarizer.build_context(emails[:31])
+        assert llm.calls == 7
+
+    assert db_session.query(ChunkSummary).filter(ChunkSummary.level == 1).count() == 1